@@ -0,0 +1,155 @@
+"""剪贴板内容压缩基准测试
+
+对代码、日志、CSV三类典型文本比较不同gzip压缩级别的传输字节数、压缩耗时，
+并按给定带宽估算端到端耗时（压缩 + 传输 + 解压）。指定--url时还会对运行中的服务端
+实际提交内容，对比压缩与不压缩请求的往返延迟。
+
+    python benchmarks/bench_compression.py --size 2097152 --bandwidth 4
+    python benchmarks/bench_compression.py --url http://localhost:5000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+
+LEVELS = (1, 6, 9)
+
+
+def sample_code(size):
+    # 使用仓库中的Python源码作为代码样本
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sources = []
+    for directory, _, files in os.walk(root):
+        sources.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith('.py'))
+    text = ''.join(open(path, encoding='utf-8').read() for path in sorted(sources))
+    return repeat_to_size(text, size)
+
+
+def sample_log(size):
+    rng = random.Random(1)
+    levels = ['INFO', 'INFO', 'INFO', 'DEBUG', 'WARNING', 'ERROR']
+    paths = ['/api/clipboard', '/api/clipboard/latest', '/api/clipboard/stream', '/api/login']
+    lines = []
+    total = 0
+    while total < size:
+        line = (
+            f"2024-05-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:"
+            f"{rng.randint(0, 59):02d},{rng.randint(0, 999):03d} {rng.choice(levels)} "
+            f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)} {rng.choice(['GET', 'POST'])} "
+            f"{rng.choice(paths)} {rng.choice([200, 200, 201, 304, 401, 404])} "
+            f"{rng.randint(1, 900)}ms user={rng.randint(1, 500)} request_id={uuid.UUID(int=rng.getrandbits(128))}\n"
+        )
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)[:size]
+
+
+def sample_csv(size):
+    rng = random.Random(2)
+    rows = ['id,date,region,product,quantity,unit_price,total\n']
+    total = len(rows[0])
+    row_id = 0
+    while total < size:
+        row_id += 1
+        quantity = rng.randint(1, 500)
+        price = round(rng.uniform(0.5, 999), 2)
+        row = (
+            f"{row_id},2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},"
+            f"{rng.choice(['华东', '华南', '华北', '西南', '东北'])},SKU-{rng.randint(1000, 9999)},"
+            f"{quantity},{price},{round(quantity * price, 2)}\n"
+        )
+        rows.append(row)
+        total += len(row)
+    return ''.join(rows)[:size]
+
+
+def repeat_to_size(text, size):
+    return (text * (size // max(len(text), 1) + 1))[:size]
+
+
+SAMPLES = {'code': sample_code, 'log': sample_log, 'csv': sample_csv}
+
+
+def measure(text, bandwidth_mbit, repeat):
+    """返回每个压缩级别的(级别, 传输字节数, 压缩耗时, 解压耗时, 估算端到端耗时)，级别0表示不压缩"""
+    body = json.dumps({'content': text, 'content_type': 'text'}).encode('utf-8')
+    bytes_per_second = bandwidth_mbit * 1000 * 1000 / 8
+    results = [(0, len(body), 0.0, 0.0, len(body) / bytes_per_second)]
+    for level in LEVELS:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compressed = gzip.compress(body, compresslevel=level)
+        compress_time = (time.perf_counter() - started) / repeat
+        started = time.perf_counter()
+        for _ in range(repeat):
+            gzip.decompress(compressed)
+        decompress_time = (time.perf_counter() - started) / repeat
+        total = compress_time + len(compressed) / bytes_per_second + decompress_time
+        results.append((level, len(compressed), compress_time, decompress_time, total))
+    return results
+
+
+def measure_server(url, texts, repeat):
+    """对运行中的服务端提交内容，返回每类样本不压缩和压缩请求的平均往返耗时"""
+    import requests
+
+    session = requests.Session()
+    username = f"bench-{uuid.uuid4().hex[:8]}"
+    password = 'bench-password'
+    session.post(f"{url}/api/register", json={'username': username, 'password': password}).raise_for_status()
+    response = session.post(f"{url}/api/login", json={'username': username, 'password': password})
+    response.raise_for_status()
+    if 'gzip' not in response.headers.get('Accept-Encoding', ''):
+        print("服务端未启用请求体压缩")
+
+    results = {}
+    for name, text in texts.items():
+        timings = []
+        for encoding in ('identity', 'gzip'):
+            started = time.perf_counter()
+            for i in range(repeat):
+                # 每次内容不同，避免服务端去重影响结果
+                body = json.dumps({'content': f"{i} {uuid.uuid4()}\n{text}", 'content_type': 'text'}).encode('utf-8')
+                headers = {'Content-Type': 'application/json'}
+                if encoding == 'gzip':
+                    body = gzip.compress(body, compresslevel=6)
+                    headers['Content-Encoding'] = 'gzip'
+                session.post(f"{url}/api/clipboard", data=body, headers=headers).raise_for_status()
+            timings.append((time.perf_counter() - started) / repeat)
+        results[name] = timings
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剪贴板内容压缩基准测试')
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024, help='每类样本的大小（字节）')
+    parser.add_argument('--bandwidth', type=float, default=4, help='估算传输耗时使用的带宽（Mbit/s）')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--url', help='运行中的服务端地址，指定时测量实际请求耗时')
+    args = parser.parse_args()
+
+    texts = {name: build(args.size) for name, build in SAMPLES.items()}
+
+    print(f"样本大小 {args.size} 字节，带宽 {args.bandwidth} Mbit/s")
+    print(f"{'样本':<8}{'级别':>6}{'传输字节':>12}{'压缩率':>8}{'压缩(ms)':>10}{'解压(ms)':>10}{'端到端(ms)':>12}")
+    for name, text in texts.items():
+        results = measure(text, args.bandwidth, args.repeat)
+        raw = results[0][1]
+        for level, size, compress_time, decompress_time, total in results:
+            print(
+                f"{name:<8}{level or '-':>6}{size:>12}{size / raw:>8.1%}"
+                f"{compress_time * 1000:>10.1f}{decompress_time * 1000:>10.1f}{total * 1000:>12.1f}"
+            )
+
+    if args.url:
+        print(f"\n服务端 {args.url} 实际提交耗时")
+        print(f"{'样本':<8}{'不压缩(ms)':>12}{'gzip(ms)':>12}")
+        for name, (plain, compressed) in measure_server(args.url, texts, args.repeat).items():
+            print(f"{name:<8}{plain * 1000:>12.1f}{compressed * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""端到端基准测试
+
+在临时目录中以新的SQLite数据库启动服务端（python app.py serve），再在本进程中启动N个无界面的
+ClipboardSyncClient，剪贴板使用内存实现（MemoryWatcher）而不是pyperclip。客户端每--devices个
+登录同一个用户，每组前--senders个客户端按--rate频率复制--size字节的内容，测量内容出现在同组其他
+客户端剪贴板上的传播延迟，并输出各接口的请求数和耗时、数据库大小以及服务端和客户端的内存占用。
+不需要图形界面和外部网络，可以在每次性能相关的修改前后各运行一次对比结果。
+
+    python benchmarks/bench_e2e.py --clients 8 --devices 2 --rate 1 --size 256 --duration 30
+    python benchmarks/bench_e2e.py --transport poll          # 不使用推送，只靠轮询同步
+    python benchmarks/bench_e2e.py --json result.json        # 同时保存结果，便于对比
+
+剪贴板只保留最新内容，接收方在一次同步之前发生多次复制时只会看到最后一次，
+复制频率高于同步频率时送达率低于100%属于正常现象。
+"""
+import argparse
+import json
+import logging
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(BENCH_DIR, '..', 'server')
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'client'))
+
+from clipboard_client import ClipboardSyncClient
+from sync_stats import pad, percentile
+
+SERVER_START_TIMEOUT = 15  # 等待服务端启动的时间（秒）
+PASSWORD = 'bench-password'
+
+
+class PollingClient(ClipboardSyncClient):
+    """不连接推送通道，只按调度间隔轮询服务器，即引入推送之前的同步方式"""
+
+    def listen_server_stream(self):
+        return
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid, field='VmRSS'):
+    """读取/proc中进程的内存占用（KB），进程已退出时返回0"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def process_tree(pid):
+    """返回pid及其全部子进程（gunicorn的主进程和工作进程）"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 进程名可能包含空格，父进程ID在右括号之后的第二个字段
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+
+def start_server(workdir, port, workers, threads):
+    env = dict(os.environ)
+    env.update({
+        'CLIPSYNC_SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'clipboard.db')}",
+        'CLIPSYNC_BLOB_STORE_PATH': os.path.join(workdir, 'blobs'),
+        'CLIPSYNC_STORAGE_SHARD_PATH': os.path.join(workdir, 'shards'),
+        'CLIPSYNC_NOTIFY_SOCKET_PATH': os.path.join(workdir, 'notify.sock'),
+        'CLIPSYNC_SECRET_KEY': f'bench-{secrets.token_hex(16)}',
+        'CLIPSYNC_LOG_LEVEL': 'WARNING',
+    })
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, 'app.py', 'serve', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"服务端启动失败，日志: {log.name}")
+        try:
+            if requests.get(f'{url}/api/ping', timeout=1).status_code == 200:
+                return server, url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"服务端在{SERVER_START_TIMEOUT}秒内未启动，日志: {log.name}")
+
+
+def create_clients(args, url, workdir):
+    client_class = PollingClient if args.transport == 'poll' else ClipboardSyncClient
+    prefix = f'bench-{uuid.uuid4().hex[:8]}'
+    clients = []
+    for index in range(args.clients):
+        group = index // args.devices
+        username = f'{prefix}-{group}'
+        if index % args.devices == 0:
+            response = requests.post(f'{url}/api/register', json={'username': username, 'password': PASSWORD})
+            if response.status_code != 201:
+                raise SystemExit(f"注册测试用户失败: {response.text}")
+        # 离线队列等文件保存在config.json所在目录，每个客户端使用单独的目录
+        client_dir = os.path.join(workdir, f'client{index}')
+        os.makedirs(client_dir)
+        cwd = os.getcwd()
+        os.chdir(client_dir)
+        try:
+            client = client_class(url)
+        finally:
+            os.chdir(cwd)
+        client.config_file = os.path.join(client_dir, 'config.json')
+        client.client_id = f'{username}-{index}'
+        client.sync_interval = args.sync_interval
+        client.index = index
+        client.group = group
+        if not client.login(username, PASSWORD):
+            raise SystemExit(f"客户端{index}登录失败")
+        clients.append(client)
+    return clients
+
+
+class Recorder:
+    """记录每条复制内容的发出时间，以及出现在其他客户端剪贴板上的时间"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}  # 内容标识 -> (发出的客户端, 时间)
+        self.latencies = []
+        self.delivered = 0
+
+    def content(self, client, seq, size):
+        key = f'{client.index}:{seq}:'
+        with self.lock:
+            self.sent[key] = (client.index, time.monotonic())
+        return key + 'x' * max(0, size - len(key))
+
+    def subscribe(self, client):
+        def on_change(content):
+            received = time.monotonic()
+            key = ':'.join((content or '').split(':', 2)[:2]) + ':'
+            with self.lock:
+                entry = self.sent.get(key)
+                if entry is None or entry[0] == client.index:
+                    return
+                self.delivered += 1
+                self.latencies.append(received - entry[1])
+        client.watcher.subscribe(on_change)
+
+
+def copy_loop(client, recorder, args, deadline):
+    interval = 1.0 / args.rate
+    # 各复制客户端错开开始时间，避免同时发出请求
+    next_copy = time.monotonic() + interval * (client.index % 10) / 10
+    seq = 0
+    while next_copy < deadline:
+        time.sleep(max(0, next_copy - time.monotonic()))
+        client.watcher.write(recorder.content(client, seq, args.size))
+        seq += 1
+        next_copy += interval
+
+
+def merge_stats(clients):
+    """合并各客户端的阶段统计，返回 {阶段: 全部样本}"""
+    merged = {}
+    for client in clients:
+        with client.stats.lock:
+            for stage, samples in client.stats.samples.items():
+                merged.setdefault(stage, []).extend(samples)
+    return merged
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50) * 1000,
+        'p95': percentile(values, 95) * 1000,
+        'p99': percentile(values, 99) * 1000,
+        'max': values[-1] * 1000,
+    }
+
+
+def format_row(name, entry, elapsed=None):
+    if not entry['count']:
+        return f"{pad(name, 44)}{0:>8}"
+    rate = f"{entry['count'] / elapsed:>10.1f}" if elapsed else f"{'':>10}"
+    return (
+        f"{pad(name, 44)}{entry['count']:>8}{rate}"
+        f"{entry['p50']:>10.1f}{entry['p95']:>10.1f}{entry['p99']:>10.1f}{entry['max']:>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剪贴板同步端到端基准测试')
+    parser.add_argument('--clients', type=int, default=4, help='客户端总数')
+    parser.add_argument('--devices', type=int, default=2, help='每个用户的客户端数')
+    parser.add_argument('--senders', type=int, default=1, help='每个用户中复制内容的客户端数')
+    parser.add_argument('--rate', type=float, default=1, help='每个复制客户端每秒复制的次数')
+    parser.add_argument('--size', type=int, default=256, help='每次复制内容的大小（字节）')
+    parser.add_argument('--duration', type=float, default=30, help='复制持续时间（秒）')
+    parser.add_argument('--drain', type=float, default=5, help='停止复制后等待同步完成的时间（秒）')
+    parser.add_argument('--transport', choices=('stream', 'poll'), default='stream', help='stream使用推送，poll只轮询')
+    parser.add_argument('--sync-interval', type=float, default=2, help='客户端空闲时轮询服务器的基础间隔（秒）')
+    parser.add_argument('--workers', type=int, default=1, help='服务端工作进程数')
+    parser.add_argument('--threads', type=int, default=0, help='每个工作进程的线程数，默认按客户端数计算')
+    parser.add_argument('--json', metavar='FILE', help='将结果保存为JSON')
+    parser.add_argument('--keep', action='store_true', help='保留临时目录（数据库和服务端日志）')
+    args = parser.parse_args()
+    if args.devices < 2 or args.senders < 1 or args.senders > args.devices:
+        parser.error('--devices至少为2，--senders在1到--devices之间')
+
+    logging.basicConfig(level=logging.WARNING)
+    # 客户端使用内存剪贴板，不访问系统剪贴板
+    os.environ['CLIPSYNC_CLIPBOARD_WATCHER'] = 'memory'
+    workdir = tempfile.mkdtemp(prefix='clipsync-bench-')
+    # 每个推送连接占用一个线程，另外留出处理普通请求的线程
+    threads = args.threads or args.clients + 16
+    server, url = start_server(workdir, free_port(), args.workers, threads)
+    clients = []
+    try:
+        clients = create_clients(args, url, workdir)
+        recorder = Recorder()
+        for client in clients:
+            recorder.subscribe(client)
+            client.start()
+        time.sleep(1)  # 等待推送连接建立
+        for client in clients:
+            client.stats.reset()
+
+        senders = [client for client in clients if client.index % args.devices < args.senders]
+        started = time.monotonic()
+        deadline = started + args.duration
+        copiers = [threading.Thread(target=copy_loop, args=(client, recorder, args, deadline)) for client in senders]
+        for copier in copiers:
+            copier.start()
+        for copier in copiers:
+            copier.join()
+        time.sleep(args.drain)
+        elapsed = time.monotonic() - started
+
+        server_pids = process_tree(server.pid)
+        server_rss = sum(rss_kb(pid) for pid in server_pids)
+        server_peak = sum(rss_kb(pid, 'VmHWM') for pid in server_pids)
+        client_rss = rss_kb(os.getpid())
+    finally:
+        for client in clients:
+            client.stop()
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    # 包括STORAGE_ENGINE=sharded时的分片文件
+    db_size = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(workdir) for name in names if name.endswith(('.db', '.db-wal'))
+    )
+    expected = len(recorder.sent) * (args.devices - 1)
+    stages = merge_stats(clients)
+    http_stages = sorted(stage for stage in stages if stage.startswith('http '))
+    http_requests = sum(len(stages[stage]) for stage in http_stages)
+    result = {
+        'config': vars(args),
+        'elapsed': elapsed,
+        'copies': len(recorder.sent),
+        'delivered': recorder.delivered,
+        'delivery_ratio': recorder.delivered / expected if expected else 0,
+        'propagation_ms': summarize(recorder.latencies),
+        'echo_ms': summarize(stages.get('copy_to_visible', [])),
+        'requests_per_second': http_requests / elapsed,
+        'requests': {stage[5:]: summarize(stages[stage]) for stage in http_stages},
+        'db_bytes': db_size,
+        'server_rss_kb': server_rss,
+        'server_peak_rss_kb': server_peak,
+        'client_rss_kb': client_rss,
+    }
+
+    print(f"{args.clients}个客户端（{len(senders)}个复制），{args.transport}，"
+          f"每秒{args.rate}次 x {args.size}字节，持续{args.duration:.0f}秒")
+    print(f"复制 {result['copies']} 次，送达 {recorder.delivered}/{expected}（{result['delivery_ratio']:.1%}）")
+    print(f"服务端处理 {http_requests} 个请求，{result['requests_per_second']:.1f} 请求/秒")
+    print(f"数据库 {db_size / 1024:.0f} KB，服务端内存 {server_rss / 1024:.1f} MB"
+          f"（峰值 {server_peak / 1024:.1f} MB），客户端进程内存 {client_rss / 1024:.1f} MB")
+    print()
+    print(f"{pad('延迟(ms)', 44)}{'次数':>6}{'每秒':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>8}")
+    print(format_row('传播到其他客户端', result['propagation_ms']))
+    print(format_row('上传到收到回传', result['echo_ms']))
+    for stage, entry in result['requests'].items():
+        print(format_row(stage, entry, elapsed))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.keep:
+        print(f"\n临时目录: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""剪贴板查询性能基准测试
+
+构造一个未加索引的旧版clipboard.db（默认10000个用户，每人20条记录），
+分别在执行迁移前后测量轮询最新内容、获取列表、裁剪历史等查询的耗时。
+
+    python benchmarks/bench_queries.py --users 10000 --clips 20
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from sqlalchemy import create_engine
+from migrations import upgrade
+
+# 与引入索引之前的create_all生成的表结构一致
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(128) NOT NULL,
+    PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE clipboard_item (
+    id INTEGER NOT NULL, content TEXT NOT NULL, content_type VARCHAR(20), timestamp DATETIME,
+    user_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE client_connection (
+    id INTEGER NOT NULL, client_id VARCHAR(100) NOT NULL, user_id INTEGER NOT NULL,
+    last_seen DATETIME, is_online BOOLEAN, name VARCHAR(100),
+    PRIMARY KEY (id), UNIQUE (client_id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+"""
+
+QUERIES = {
+    'latest': 'SELECT * FROM clipboard_item WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1',
+    'list': 'SELECT * FROM clipboard_item WHERE user_id = ? ORDER BY timestamp DESC',
+    # add_clipboard中裁剪语句的查找部分（DELETE会修改数据，这里用等价的SELECT测量）
+    'trim': (
+        'SELECT id FROM clipboard_item WHERE user_id = ?1 AND id NOT IN ('
+        'SELECT id FROM clipboard_item WHERE user_id = ?1 ORDER BY timestamp DESC, id DESC LIMIT 20)'
+    ),
+    'changes': 'SELECT * FROM clipboard_item WHERE user_id = ? AND id > ? ORDER BY id ASC',
+    'online_clients': 'SELECT * FROM client_connection WHERE user_id = ? AND is_online = 1',
+}
+
+
+def build_database(path, users, clips):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        'INSERT INTO user (id, username, password_hash) VALUES (?, ?, ?)',
+        ((user_id, f'user{user_id}', 'x' * 100) for user_id in range(1, users + 1))
+    )
+    conn.executemany(
+        'INSERT INTO client_connection (client_id, user_id, last_seen, is_online) VALUES (?, ?, ?, ?)',
+        ((f'user{user_id}-{n}', user_id, datetime.now(), n == 0) for user_id in range(1, users + 1) for n in range(2))
+    )
+    # 按时间轮流为每个用户写入，模拟真实数据中同一用户的记录分散在整张表里
+    start = datetime.now() - timedelta(days=1)
+    rows = (
+        (f'clip {n} of user {user_id} ' + 'x' * 40, 'text', start + timedelta(milliseconds=n * users + user_id), user_id)
+        for n in range(clips) for user_id in range(1, users + 1)
+    )
+    conn.executemany('INSERT INTO clipboard_item (content, content_type, timestamp, user_id) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def measure(path, users, samples):
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    user_ids = [rng.randint(1, users) for _ in range(samples)]
+    results = {}
+    for name, sql in QUERIES.items():
+        args = (lambda user_id: (user_id, 0)) if name == 'changes' else (lambda user_id: (user_id,))
+        plan = ' / '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, args(1)))
+        started = time.perf_counter()
+        for user_id in user_ids:
+            conn.execute(sql, args(user_id)).fetchall()
+        elapsed = time.perf_counter() - started
+        results[name] = (elapsed / samples * 1e6, plan)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剪贴板查询性能基准测试')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--clips', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=200, help='每种查询执行的次数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='clipsync-bench-')
+    try:
+        before_path = os.path.join(workdir, 'before.db')
+        after_path = os.path.join(workdir, 'after.db')
+        print(f"生成测试数据: {args.users} 个用户 x {args.clips} 条记录 ...")
+        build_database(before_path, args.users, args.clips)
+        shutil.copy(before_path, after_path)
+
+        started = time.perf_counter()
+        engine = create_engine(f'sqlite:///{after_path}')
+        # 只执行添加索引的迁移1，后续迁移改变了表结构，与测量的查询无关
+        upgrade(engine, target=1)
+        engine.dispose()
+        print(f"迁移耗时: {time.perf_counter() - started:.2f}s")
+
+        before = measure(before_path, args.users, args.samples)
+        after = measure(after_path, args.users, args.samples)
+
+        print(f"\n{'查询':<16}{'迁移前(us)':>14}{'迁移后(us)':>14}{'加速':>10}")
+        for name in QUERIES:
+            speedup = before[name][0] / after[name][0] if after[name][0] else float('inf')
+            print(f"{name:<16}{before[name][0]:>14.1f}{after[name][0]:>14.1f}{speedup:>9.1f}x")
+        print("\n迁移后的查询计划:")
+        for name in QUERIES:
+            print(f"  {name:<16}{after[name][1]}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""存储引擎写入吞吐量基准测试
+
+每个存储引擎在单独的子进程中创建应用（create_app每个进程只初始化一次），
+多个线程各自以不同用户登录，通过Flask测试客户端并发添加剪贴板内容，
+比较每秒写入数和单次写入的延迟。sharded:N表示N个分片，sharded:1即单个SQLite文件。
+
+    python benchmarks/bench_storage.py --threads 8 --writes 500
+    python benchmarks/bench_storage.py --engines sqlalchemy sharded:1 sharded:8
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server')
+DEFAULT_ENGINES = ('sqlalchemy', 'memory', 'sharded:1', 'sharded:4')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def run_engine(args):
+    """子进程：按环境变量中的配置创建应用并测量写入"""
+    sys.path.insert(0, SERVER_DIR)
+    from app import create_app
+    app = create_app()
+
+    clients = []
+    for index in range(args.threads):
+        client = app.test_client()
+        credentials = {'username': f'bench{index}', 'password': 'bench'}
+        client.post('/api/register', json=credentials)
+        client.post('/api/login', json={**credentials, 'client_id': f'bench{index}-0'})
+        clients.append(client)
+
+    latencies = [[] for _ in clients]
+    errors = [0] * len(clients)
+    barrier = threading.Barrier(len(clients) + 1)
+
+    def writer(index):
+        client = clients[index]
+        padding = 'x' * max(0, args.size - 32)
+        barrier.wait()
+        for n in range(args.writes):
+            started = time.perf_counter()
+            response = client.post('/api/clipboard', json={'content': f'{index}-{n}-{padding}'})
+            latencies[index].append(time.perf_counter() - started)
+            if response.status_code != 201:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = sorted(value for values in latencies for value in values)
+    result = {
+        'writes': len(values),
+        'errors': sum(errors),
+        'elapsed': elapsed,
+        'throughput': len(values) / elapsed,
+    }
+    for p in PERCENTILES:
+        result[f'p{p}'] = percentile(values, p)
+    print(json.dumps(result))
+
+
+def bench_engine(spec, args, workdir):
+    engine, _, shards = spec.partition(':')
+    directory = tempfile.mkdtemp(prefix=spec.replace(':', '-') + '-', dir=workdir)
+    env = dict(
+        os.environ,
+        CLIPSYNC_STORAGE_ENGINE=engine,
+        CLIPSYNC_SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(directory, 'clipboard.db')}",
+        CLIPSYNC_STORAGE_SHARD_PATH=os.path.join(directory, 'shards'),
+        CLIPSYNC_BLOB_STORE_PATH=os.path.join(directory, 'blobs'),
+        CLIPSYNC_SECRET_KEY='bench',
+        CLIPSYNC_LOG_LEVEL='WARNING',
+        CLIPSYNC_CLIPBOARD_HISTORY_LIMIT=str(args.history),
+    )
+    if shards:
+        env['CLIPSYNC_STORAGE_SHARDS'] = shards
+    command = [
+        sys.executable, os.path.abspath(__file__), '--run',
+        '--threads', str(args.threads), '--writes', str(args.writes), '--size', str(args.size)
+    ]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='存储引擎写入吞吐量基准测试')
+    parser.add_argument('--engines', nargs='+', default=list(DEFAULT_ENGINES),
+                        help='sqlalchemy、memory或sharded:分片数')
+    parser.add_argument('--threads', type=int, default=8, help='并发写入的线程数，每个线程一个用户')
+    parser.add_argument('--writes', type=int, default=300, help='每个线程的写入次数')
+    parser.add_argument('--size', type=int, default=200, help='每条内容的大小（字节）')
+    parser.add_argument('--history', type=int, default=20, help='每个用户保留的历史条数')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_engine(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='clipsync-bench-')
+    results = {}
+    try:
+        for spec in args.engines:
+            if not args.json:
+                print(f"测试 {spec} ...", flush=True)
+            results[spec] = bench_engine(spec, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    headers = ''.join(f"{f'p{p}(ms)':>10}" for p in PERCENTILES)
+    print(f"\n{args.threads} 个线程 x {args.writes} 次写入，每条 {args.size} 字节")
+    print(f"{'引擎':<12}{'写入/秒':>10}{headers}{'失败':>8}")
+    for spec, result in results.items():
+        values = ''.join(f"{result[f'p{p}'] * 1000:>10.2f}" for p in PERCENTILES)
+        print(f"{spec:<14}{result['throughput']:>12.0f}{values}{result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
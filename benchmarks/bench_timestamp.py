@@ -0,0 +1,105 @@
+"""时间戳解析基准测试
+
+对比客户端旧的parse_timestamp（依次尝试多种strptime格式并打印调试信息）、一次fromisoformat解析
+ISO字符串、直接读取服务器返回的timestamp_ms三种方式得到时间的耗时。旧实现的调试输出写入
+/dev/null，计入格式化开销但不计终端输出开销。客户端现在不再解析条目时间，需要时间的地方应读取
+timestamp_ms。
+
+    python benchmarks/bench_timestamp.py --count 100000
+"""
+import argparse
+import contextlib
+import os
+import time
+from datetime import datetime, timezone
+
+
+def legacy_parse_timestamp(timestamp_str):
+    # 旧版客户端的实现
+    try:
+        print(f"[DEBUG] 原始时间戳: {timestamp_str}")
+        formats = [
+            '%Y-%m-%dT%H:%M:%S.%fZ',
+            '%Y-%m-%dT%H:%M:%SZ',
+            '%Y-%m-%dT%H:%M:%S.%f',
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%d %H:%M:%S.%f',
+            '%Y-%m-%d %H:%M:%S',
+        ]
+        for fmt in formats:
+            try:
+                if 'Z' in fmt:
+                    dt = datetime.strptime(timestamp_str, fmt)
+                    dt = dt.replace(tzinfo=timezone.utc)
+                    local_dt = dt.astimezone()
+                    print(f"[DEBUG] UTC时间转换为本地时间: {dt} -> {local_dt}")
+                    return local_dt
+                else:
+                    dt = datetime.strptime(timestamp_str, fmt)
+                    print(f"[DEBUG] 解析为本地时间: {dt}")
+                    return dt
+            except ValueError:
+                continue
+        try:
+            if 'Z' in timestamp_str:
+                dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                return dt.astimezone()
+            return datetime.fromisoformat(timestamp_str)
+        except ValueError:
+            pass
+        return None
+    except Exception:
+        return None
+
+
+def parse_iso(timestamp_str):
+    # 一次fromisoformat解析服务端返回的ISO字符串，不带时区时按UTC处理
+    parsed = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def read_timestamp_ms(data):
+    # 读取服务端返回的毫秒时间戳，不解析字符串
+    return datetime.fromtimestamp(data['timestamp_ms'] / 1000, timezone.utc)
+
+
+def bench(func, values, count):
+    started = time.perf_counter()
+    for i in range(count):
+        func(values[i % len(values)])
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='时间戳解析基准测试')
+    parser.add_argument('--count', type=int, default=100000, help='每种情况的解析次数')
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    naive = now.replace(tzinfo=None).isoformat()
+    aware = now.isoformat()
+    millis = int(now.timestamp() * 1000)
+
+    cases = [
+        # 旧版服务端返回不带时区的本地时间，旧实现要尝试到第3种格式
+        ('旧实现 不带时区ISO', legacy_parse_timestamp, [naive]),
+        # 带时区的时间所有strptime格式都失败，最后才由fromisoformat解析
+        ('旧实现 带时区ISO', legacy_parse_timestamp, [aware]),
+        ('fromisoformat 不带时区', parse_iso, [naive]),
+        ('fromisoformat 带时区', parse_iso, [aware]),
+        ('读取毫秒时间戳', read_timestamp_ms, [{'timestamp': aware, 'timestamp_ms': millis}]),
+    ]
+
+    print(f"{'情况':<16}{'每次(us)':>12}{'相对':>10}")
+    baseline = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results = [(name, bench(func, values, args.count)) for name, func, values in cases]
+    for name, seconds in results:
+        baseline = baseline or seconds
+        print(f"{name:<16}{seconds * 1e6:>12.2f}{baseline / seconds:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
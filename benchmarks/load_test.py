@@ -0,0 +1,143 @@
+"""服务端压力测试
+
+对运行中的服务端并发执行登录、提交剪贴板、轮询最新内容三种请求，输出每秒请求数和延迟分位数。
+
+    python app.py serve --workers 4            # 在server目录启动服务端
+    python benchmarks/load_test.py --url http://localhost:5000 --concurrency 32
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+
+import requests
+
+SCENARIOS = ('login', 'post', 'latest')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+class Worker(threading.Thread):
+    def __init__(self, url, username, password, scenario, payload):
+        super().__init__(daemon=True)
+        self.url = url
+        self.username = username
+        self.password = password
+        self.scenario = scenario
+        self.deadline = None
+        self.payload = payload
+        self.latencies = []
+        self.errors = 0
+        self.session = requests.Session()
+        self.etag = None
+
+    def login(self):
+        return self.session.post(
+            f"{self.url}/api/login",
+            json={'username': self.username, 'password': self.password}
+        )
+
+    def request(self):
+        if self.scenario == 'login':
+            return self.login()
+        if self.scenario == 'post':
+            return self.session.post(
+                f"{self.url}/api/clipboard",
+                json={'content': f"{self.payload} {uuid.uuid4()}", 'content_type': 'text'}
+            )
+        # 与客户端相同，携带If-None-Match轮询
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.session.get(f"{self.url}/api/clipboard/latest", headers=headers)
+        if response.status_code == 200:
+            self.etag = response.headers.get('ETag')
+        return response
+
+    def prepare(self):
+        # 登录不计入post和latest场景的耗时
+        if self.scenario != 'login':
+            self.login()
+
+    def run(self):
+        while time.time() < self.deadline:
+            started = time.perf_counter()
+            try:
+                response = self.request()
+                ok = response.status_code < 400 or response.status_code == 404
+            except requests.exceptions.RequestException:
+                ok = False
+            if ok:
+                self.latencies.append(time.perf_counter() - started)
+            else:
+                self.errors += 1
+
+
+def register_users(url, count, password):
+    prefix = f"load-{uuid.uuid4().hex[:8]}"
+    usernames = [f"{prefix}-{i}" for i in range(count)]
+    for username in usernames:
+        response = requests.post(f"{url}/api/register", json={'username': username, 'password': password})
+        if response.status_code != 201:
+            raise SystemExit(f"注册测试用户失败: {response.text}")
+    return usernames
+
+
+def run_scenario(args, usernames, scenario):
+    payload = 'x' * args.payload_size
+    workers = [
+        Worker(args.url, usernames[i % len(usernames)], args.password, scenario, payload)
+        for i in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.prepare()
+    started = time.time()
+    for worker in workers:
+        worker.deadline = started + args.duration
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - started
+
+    latencies = [latency for worker in workers for latency in worker.latencies]
+    errors = sum(worker.errors for worker in workers)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剪贴板同步服务端压力测试')
+    parser.add_argument('--url', default=os.environ.get('CLIPSYNC_URL', 'http://localhost:5000'))
+    parser.add_argument('--users', type=int, default=50, help='测试用户数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发线程数')
+    parser.add_argument('--duration', type=float, default=10, help='每个场景持续时间（秒）')
+    parser.add_argument('--payload-size', type=int, default=256, help='提交内容的大小（字节）')
+    parser.add_argument('--password', default='load-test-password')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='要运行的场景，逗号分隔')
+    args = parser.parse_args()
+
+    requests.get(f"{args.url}/api/ping", timeout=3).raise_for_status()
+    usernames = register_users(args.url, args.users, args.password)
+
+    print(f"{'场景':<10}{'请求数':>10}{'错误':>8}{'请求/秒':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for scenario in args.scenarios.split(','):
+        result = run_scenario(args, usernames, scenario)
+        print(
+            f"{scenario:<10}{result['requests']:>10}{result['errors']:>8}{result['rps']:>12.1f}"
+            f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,109 @@
-import pyperclip
 import time
 import requests
 import json
 import os
 import sys
 import threading
-from datetime import datetime, timezone
+import socket
+import hashlib
+import gzip
+import logging
+import argparse
+import cProfile
+from clipboard_watcher import create_watcher
+from sync_scheduler import SyncScheduler, parse_retry_after
+from offline_queue import OfflineQueue
+from processed_commands import ProcessedCommands
+from typing_worker import TypingWorker, COMPLETED, FINISHED_STATES, STATE_NAMES
+from sync_stats import SyncStats, request_stage
+# 日志配置与服务端共用，位于仓库根目录的common目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+STREAM_CONNECT_TIMEOUT = 5  # 推送连接建立超时（秒）
+STREAM_READ_TIMEOUT = 45  # 推送连接读取超时，需大于服务端心跳间隔（秒）
+STREAM_RETRY_INTERVAL = 3  # 推送连接断开后的基础重连间隔（秒），连续失败时指数退避
+HASH_FIRST_MIN_SIZE = 4096  # 超过该大小（字节）的内容先只发送哈希，服务器已有时无需上传
+COMPRESS_MIN_SIZE = 1024  # 超过该大小（字节）的请求体在服务器支持时gzip压缩
+COMPRESS_LEVEL = 6
+UPLOAD_MIN_SIZE = 1024 * 1024  # 超过该大小（字节）的内容分块上传
+TRANSFER_RETRY_COUNT = 5  # 分块上传和下载中断后的重试次数
+TRANSFER_RETRY_INTERVAL = 2  # 重试间隔（秒）
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+OFFLINE_QUEUE_FILE = 'pending_clips.db'  # 未发送内容的队列，保存在config.json所在目录
+PROCESSED_COMMANDS_FILE = 'processed_commands.json'  # 已执行指令的ID，重启后不再重复执行
+REPLAY_BATCH_SIZE = 50  # 恢复连接后每个批量请求补发的条数
+RETRYABLE_STATUS = (401, 408, 409, 429)  # 除5xx外可以稍后重试的状态码，409为分块上传未完成
+HEADLESS_TYPING_DELAY = 3  # 无界面时开始模拟输入前留给用户切换窗口的时间（秒）
+STATS_DUMP_INTERVAL = 60  # 命令行指定--stats时输出统计的间隔（秒）
+
+def content_digest(content):
+    """计算内容的SHA-256摘要，与服务端内容块的哈希一致"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def retryable_status(status):
+    """请求失败后是否应保留内容稍后重试，其余4xx表示服务器拒绝该内容"""
+    return status >= 500 or status in RETRYABLE_STATUS
 
 class ClipboardSyncClient:
     def __init__(self, server_url="http://localhost:5000"):
         self.server_url = server_url
-        self.last_clipboard = ""
+        # 只记录最近一次同步内容的摘要和长度，不保存内容本身
+        self.last_clipboard_hash = None
+        self.last_clipboard_length = -1
         self.user_id = None
         self.username = None
-        self.password = None
+        self.password = None  # 只在换取令牌前使用，不保存到配置文件
+        # 登录后请求通过Authorization: Bearer携带令牌，配置文件只保存令牌
+        self.token = None
+        self.token_refresh_at = None  # 应刷新令牌的毫秒时间戳
+        self.token_rejected = threading.Event()  # 服务器拒绝令牌（401）后由监控线程刷新
         self.session = requests.Session()
+        # 服务器通过响应头Accept-Encoding告知支持的请求体压缩编码
+        self.server_encodings = set()
+        self.session.hooks['response'].append(self.record_server_encodings)
+        self.session.hooks['response'].append(self.record_retry_after)
+        self.session.hooks['response'].append(self.record_unauthorized)
+        # 各阶段耗时，包括每个HTTP请求的往返时间
+        self.stats = SyncStats()
+        self.session.hooks['response'].append(self.record_request_time)
+        # 设置后监控循环在cProfile下运行，停止时把结果写入该文件
+        self.profile_path = os.environ.get('CLIPSYNC_PROFILE')
+        # 同步循环和推送重连各自计算等待时间
+        self.scheduler = SyncScheduler()
+        self.stream_scheduler = SyncScheduler()
+        self.stopped = threading.Event()
         self.sync_thread = None
         self.running = False
         self.config_file = "config.json"
         self.client_id = None
         self.typing_speed = 100  # 默认模拟输入速度为100ms
-        self.processed_commands = set()  # 用于跟踪已处理的命令ID
-        self.start_time = None  # 记录客户端启动时间
+        self.sync_interval = 2  # 空闲时轮询服务器的基础间隔（秒）
+        self.stream_thread = None
+        self.stream_connected = False  # 推送通道可用时暂停轮询服务器
+        self.stream_response = None
+        self.last_event_id = None  # 最近收到的服务器剪贴板ID，用于断线补发
+        self.latest_etag = None  # 最新内容的ETag，未变化时服务器返回304
+        self.pending_commands = None  # 轮询响应中的待执行指令数，旧版服务端不返回时为None
+        self.clipboard_lock = threading.Lock()  # 监控线程与推送线程共享剪贴板状态
+        self.pending_uploads = {}  # 内容摘要 -> 未完成的上传ID，再次同步相同内容时断点续传
+        self.clipboard_watcher = 'auto'  # 剪贴板监听方式: auto, wayland, xfixes, polling
+        self.log_level = 'INFO'  # 日志级别，DEBUG时输出每次剪贴板变化
+        self.log_format = 'text'  # text或json
+        self.local_change = threading.Event()  # 监听器通知本地剪贴板变化
+        self.pending_local_content = None
+        self.pending_local_time = None  # 监听器检测到复制的时间，用于统计复制到可见的延迟
         self.load_config()
+        # GUI可以替换为与界面共用的监听器
+        self.watcher = create_watcher(self.clipboard_watcher)
+        config_dir = os.path.dirname(os.path.abspath(self.config_file))
+        self.offline_queue = OfflineQueue(os.path.join(config_dir, OFFLINE_QUEUE_FILE))
+        self.processed_commands = ProcessedCommands(os.path.join(config_dir, PROCESSED_COMMANDS_FILE))
+        # 模拟输入在独立线程中执行，不阻塞同步循环
+        self.typing_worker = TypingWorker(on_progress=self.on_typing_progress)
+        self.gui = None
 
     def load_config(self):
         """从配置文件加载用户信息"""
@@ -31,70 +112,129 @@ class ClipboardSyncClient:
                 with open(self.config_file, 'r') as f:
                     config = json.load(f)
                     self.username = config.get('username')
+                    # 旧版配置保存的密码只用于换取一次令牌，之后不再保存
                     self.password = config.get('password')
+                    self.set_token(config.get('token'), config.get('token_refresh_at'))
                     self.server_url = config.get('server_url', self.server_url)
                     self.client_id = config.get('client_id')
                     self.typing_speed = config.get('typing_speed', 100)
-                    print(f"已加载配置，用户名: {self.username}")
+                    self.sync_interval = config.get('sync_interval', 2)
+                    self.clipboard_watcher = config.get('clipboard_watcher', 'auto')
+                    self.log_level = config.get('log_level', 'INFO')
+                    self.log_format = config.get('log_format', 'text')
+                    logger.info("已加载配置，用户名: %s", self.username)
             except Exception as e:
-                print(f"加载配置失败: {e}")
+                logger.error("加载配置失败: %s", e)
 
     def save_config(self):
         """保存用户信息到配置文件"""
         config = {
             'username': self.username,
-            'password': self.password,
+            'token': self.token,
+            'token_refresh_at': self.token_refresh_at,
             'server_url': self.server_url,
             'client_id': self.client_id,
-            'typing_speed': self.typing_speed
+            'typing_speed': self.typing_speed,
+            'sync_interval': self.sync_interval,
+            'clipboard_watcher': self.clipboard_watcher,
+            'log_level': self.log_level,
+            'log_format': self.log_format
         }
         try:
             with open(self.config_file, 'w') as f:
                 json.dump(config, f)
-            print("配置已保存")
+            logger.debug("配置已保存")
         except Exception as e:
-            print(f"保存配置失败: {e}")
+            logger.error("保存配置失败: %s", e)
 
     def login(self, username=None, password=None):
-        """登录到服务器"""
+        """登录到服务器：有密码时换取新令牌，否则刷新已保存的令牌"""
         # 检查是否是切换账号
         is_account_change = False
         if username and username != self.username:
             is_account_change = True
-            print(f"检测到账号切换: {self.username} -> {username}")
+            logger.info("检测到账号切换: %s -> %s", self.username, username)
         
         if username:
             self.username = username
         if password:
             self.password = password
 
+        if not self.password and self.token and not is_account_change:
+            return self.refresh_token()
+
         if not self.username or not self.password:
-            print("请提供用户名和密码")
+            logger.warning("请提供用户名和密码")
             return False
 
         # 如果是切换账号或者没有客户端ID，生成新的客户端标识
         if not self.client_id or is_account_change:
             self.client_id = f"{self.username}-{os.getpid()}-{int(time.time())}"
-            print(f"生成新的客户端ID: {self.client_id}")
+            logger.info("生成新的客户端ID: %s", self.client_id)
 
         try:
-            response = self.session.post(
-                f"{self.server_url}/api/login",
-                json={"username": self.username, "password": self.password, "client_id": self.client_id}
-            )
-            if response.status_code == 200:
+            credentials = {"username": self.username, "password": self.password, "client_id": self.client_id}
+            response = self.session.post(f"{self.server_url}/api/tokens", json=credentials)
+            if response.status_code == 404:
+                # 旧版服务端不支持令牌，使用会话Cookie登录，重启后需要重新输入密码
+                response = self.session.post(f"{self.server_url}/api/login", json=credentials)
+            if response.status_code in (200, 201):
                 data = response.json()
                 self.user_id = data.get('user_id')
-                print(f"登录成功，用户ID: {self.user_id}")
+                self.set_token(data.get('token'), data.get('refresh_at_ms'))
+                self.password = None
+                self.latest_etag = None
+                logger.info("登录成功，用户ID: %s", self.user_id)
                 self.save_config()
                 return True
             else:
-                print(f"登录失败: {response.json().get('error')}")
+                logger.error("登录失败: %s", response.json().get('error'))
                 return False
         except Exception as e:
-            print(f"登录请求失败: {e}")
+            logger.error("登录请求失败: %s", e)
             return False
 
+    def set_token(self, token, refresh_at=None):
+        """使用新的访问令牌，token为None时清除"""
+        self.token = token
+        self.token_refresh_at = refresh_at if token else None
+        self.token_rejected.clear()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+        else:
+            self.session.headers.pop('Authorization', None)
+
+    def refresh_token(self):
+        """用已保存的令牌换取新令牌，令牌失效时清除并返回False，需要重新输入密码登录"""
+        try:
+            response = self.session.post(f"{self.server_url}/api/tokens/refresh", timeout=10)
+        except requests.exceptions.RequestException as e:
+            logger.warning("刷新令牌失败: %s", e)
+            return False
+        if response.status_code == 401:
+            logger.error("登录已失效，请重新登录")
+            self.set_token(None)
+            self.user_id = None
+            self.save_config()
+            return False
+        if response.status_code != 201:
+            logger.warning("刷新令牌失败，状态码: %s", response.status_code)
+            return False
+        data = response.json()
+        self.user_id = data.get('user_id')
+        self.set_token(data.get('token'), data.get('refresh_at_ms'))
+        self.save_config()
+        logger.debug("令牌已刷新")
+        return True
+
+    def refresh_token_if_needed(self):
+        """令牌被服务器拒绝或有效期过半时刷新"""
+        if not self.token:
+            return
+        due = self.token_refresh_at is not None and time.time() * 1000 >= self.token_refresh_at
+        if due or self.token_rejected.is_set():
+            self.refresh_token()
+
     def register(self, username, password):
         """注册新用户"""
         try:
@@ -103,230 +243,567 @@ class ClipboardSyncClient:
                 json={"username": username, "password": password}
             )
             if response.status_code == 201:
-                print("注册成功，请登录")
+                logger.info("注册成功，请登录")
                 self.username = username
-                self.password = password
                 return True
             else:
-                print(f"注册失败: {response.json().get('error')}")
+                logger.error("注册失败: %s", response.json().get('error'))
                 return False
         except Exception as e:
-            print(f"注册请求失败: {e}")
+            logger.error("注册请求失败: %s", e)
             return False
 
-    def sync_clipboard_to_server(self, content):
-        """将剪贴板内容同步到服务器"""
+    def sync_clipboard_to_server(self, content, digest=None, copied_at=None):
+        """将剪贴板内容同步到服务器，copied_at为检测到复制的time.monotonic()，用于统计延迟"""
         try:
-            response = self.session.post(
-                f"{self.server_url}/api/clipboard",
-                json={"content": content, "content_type": "text"}
-            )
+            response = None
+            # 较大的内容先只发送哈希，服务器已有相同内容时省去上传
+            if len(content.encode('utf-8')) >= HASH_FIRST_MIN_SIZE:
+                response = self.post_json(
+                    "/api/clipboard",
+                    {"content_hash": digest or content_digest(content), "content_type": "text"}
+                )
+                if response.status_code != 201:
+                    response = None
+            if response is None:
+                encoded = content.encode('utf-8')
+                if len(encoded) >= UPLOAD_MIN_SIZE:
+                    response = self.upload_content(encoded, "text", digest or content_digest(content))
+                else:
+                    response = self.post_json("/api/clipboard", {"content": content, "content_type": "text"})
             if response.status_code == 201:
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 剪贴板内容已同步到服务器")
+                logger.info("剪贴板内容已同步到服务器")
+                self.stats.expect_echo(response.json().get('id'), copied_at)
                 return True
             else:
-                print(f"同步失败: {response.json().get('error')}")
+                logger.warning("同步失败: %s", response.json().get('error'))
+                if retryable_status(response.status_code):
+                    self.queue_offline(content, digest)
                 return False
         except Exception as e:
-            print(f"同步请求失败: {e}")
+            logger.warning("同步请求失败: %s", e)
+            self.queue_offline(content, digest)
             return False
 
-    def parse_timestamp(self, timestamp_str):
-        """解析时间戳字符串为datetime对象"""
-        try:
-            print(f"[DEBUG] 原始时间戳: {timestamp_str}")
-            
-            # 尝试不同的时间戳格式
-            formats = [
-                '%Y-%m-%dT%H:%M:%S.%fZ',  # ISO格式带毫秒和Z
-                '%Y-%m-%dT%H:%M:%SZ',     # ISO格式不带毫秒和Z
-                '%Y-%m-%dT%H:%M:%S.%f',   # ISO格式带毫秒不带Z
-                '%Y-%m-%dT%H:%M:%S',      # ISO格式不带毫秒不带Z
-                '%Y-%m-%d %H:%M:%S.%f',   # 标准格式带毫秒
-                '%Y-%m-%d %H:%M:%S',      # 标准格式不带毫秒
-            ]
+    def queue_offline(self, content, digest=None):
+        """记录未能发送的内容，连接恢复后批量补发"""
+        self.offline_queue.push(content, digest or content_digest(content))
+        logger.info("内容已保存到离线队列，待发送 %d 条", len(self.offline_queue))
+
+    def replay_offline_queue(self):
+        """按复制顺序补发离线队列中的内容，小内容合并为一个批量请求，队列清空时返回True"""
+        while True:
+            rows = self.offline_queue.peek(REPLAY_BATCH_SIZE)
+            if not rows:
+                return True
             
-            for fmt in formats:
-                try:
-                    if 'Z' in fmt:
-                        # 如果格式包含Z，说明是UTC时间
-                        dt = datetime.strptime(timestamp_str, fmt)
-                        dt = dt.replace(tzinfo=timezone.utc)
-                        local_dt = dt.astimezone()  # 转换为本地时区
-                        print(f"[DEBUG] UTC时间转换为本地时间: {dt} -> {local_dt}")
-                        return local_dt
-                    else:
-                        # 假设是本地时间
-                        dt = datetime.strptime(timestamp_str, fmt)
-                        print(f"[DEBUG] 解析为本地时间: {dt}")
-                        return dt
-                except ValueError:
+            batch = []
+            for row_id, content, digest, content_type in rows:
+                encoded = content.encode('utf-8')
+                if len(encoded) < UPLOAD_MIN_SIZE:
+                    batch.append((row_id, content, content_type))
                     continue
+                if batch:
+                    break  # 先发送排在前面的小内容
+                # 大内容单独分块上传
+                response = self.upload_content(encoded, content_type, digest)
+                if not self.finish_offline_item(row_id, response):
+                    return False
+                break
             
-            # 如果所有格式都失败，尝试ISO解析
+            if batch:
+                response = self.post_json("/api/clipboard/batch", {
+                    "inserts": [{"content": content, "content_type": content_type} for _, content, content_type in batch]
+                })
+                if retryable_status(response.status_code):
+                    logger.warning("补发离线内容失败，状态码: %s", response.status_code)
+                    return False
+                if response.status_code in (200, 201):
+                    self.offline_queue.remove([row_id for row_id, _, _ in batch])
+                    logger.info("已补发 %d 条离线内容", len(batch))
+                    continue
+                # 旧版服务器没有批量接口（404）或拒绝了整个批量请求（如请求体过大）时逐条发送
+                logger.warning("批量补发失败，状态码: %s，改为逐条发送", response.status_code)
+                for row_id, content, content_type in batch:
+                    response = self.post_json("/api/clipboard", {"content": content, "content_type": content_type})
+                    if not self.finish_offline_item(row_id, response):
+                        return False
+
+    def finish_offline_item(self, row_id, response):
+        """发送成功或被服务器拒绝（4xx）时移出离线队列，避免队列永远卡住；需要稍后重试时返回False"""
+        if response.status_code == 201:
+            self.offline_queue.remove([row_id])
+            return True
+        if retryable_status(response.status_code):
+            logger.warning("补发离线内容失败，状态码: %s", response.status_code)
+            return False
+        logger.warning("服务器拒绝了离线内容，已丢弃，状态码: %s", response.status_code)
+        self.offline_queue.remove([row_id])
+        return True
+
+    def upload_content(self, data, content_type, digest, mimetype=None):
+        """分块上传内容，网络中断后从服务器记录的偏移量继续，返回提交请求的响应"""
+        upload_id = self.pending_uploads.get(digest)
+        status = self.upload_status(upload_id) if upload_id else None
+        if status is None:
+            response = self.post_json("/api/uploads", {
+                "size": len(data),
+                "content_type": content_type,
+                "content_hash": digest,
+                "mimetype": mimetype
+            })
+            if response.status_code != 201 or 'upload_id' not in response.json():
+                return response  # 服务器已有该内容时直接完成
+            status = response.json()
+            upload_id = status['upload_id']
+            self.pending_uploads[digest] = upload_id
+        offset = status['offset']
+        chunk_size = status['chunk_size']
+
+        retries = 0
+        while offset < len(data):
             try:
-                if 'Z' in timestamp_str:
-                    dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    local_dt = dt.astimezone()
-                    print(f"[DEBUG] ISO解析UTC时间: {dt} -> {local_dt}")
-                    return local_dt
-                else:
-                    dt = datetime.fromisoformat(timestamp_str)
-                    print(f"[DEBUG] ISO解析本地时间: {dt}")
-                    return dt
-            except:
-                pass
-            
-            print(f"[DEBUG] 所有解析方法都失败")
-            return None
-            
-        except Exception as e:
-            print(f"解析时间戳失败: {timestamp_str}, 错误: {e}")
+                response = self.session.put(
+                    f"{self.server_url}/api/uploads/{upload_id}",
+                    params={'offset': offset},
+                    data=data[offset:offset + chunk_size],
+                    headers={'Content-Type': 'application/octet-stream'}
+                )
+                if response.status_code not in (200, 409):
+                    return response
+                offset = response.json()['offset']
+            except requests.exceptions.RequestException as e:
+                retries += 1
+                if retries > TRANSFER_RETRY_COUNT:
+                    raise
+                logger.warning("上传中断，%s秒后从断点继续: %s", TRANSFER_RETRY_INTERVAL, e)
+                time.sleep(TRANSFER_RETRY_INTERVAL)
+                status = self.upload_status(upload_id)
+                if status is None:
+                    # 上传已过期，下次同步时重新开始
+                    self.pending_uploads.pop(digest, None)
+                    raise
+                offset = status['offset']
+
+        response = self.session.post(f"{self.server_url}/api/uploads/{upload_id}/commit")
+        if response.status_code != 409:
+            self.pending_uploads.pop(digest, None)
+        return response
+
+    def upload_status(self, upload_id):
+        """查询服务器已收到的字节数和分块大小，上传不存在时返回None"""
+        response = self.session.get(f"{self.server_url}/api/uploads/{upload_id}")
+        if response.status_code != 200:
             return None
+        return response.json()
+
+    def record_server_encodings(self, response, *args, **kwargs):
+        """记录服务器支持的请求体压缩编码"""
+        if 'Accept-Encoding' in response.headers:
+            self.server_encodings = {
+                value.strip().lower() for value in response.headers['Accept-Encoding'].split(',') if value.strip()
+            }
+
+    def record_retry_after(self, response, *args, **kwargs):
+        """服务器繁忙（429/503）并返回Retry-After时，在指定时间之前不再请求"""
+        if response.status_code in (429, 503):
+            seconds = parse_retry_after(response.headers.get('Retry-After'))
+            if seconds is not None and '/api/clipboard/stream' in response.request.url:
+                # 推送连接已满：只推迟重新连接推送，期间继续轮询
+                self.stream_scheduler.retry_after(seconds)
+            elif seconds is not None:
+                logger.warning("服务器繁忙，%.0f秒后重试", seconds)
+                self.scheduler.retry_after(seconds)
+                self.stream_scheduler.retry_after(seconds)
+
+    def record_unauthorized(self, response, *args, **kwargs):
+        """携带令牌的请求返回401时，令牌可能已过期或被撤销"""
+        if response.status_code == 401 and 'Authorization' in response.request.headers \
+                and not response.request.url.endswith('/api/tokens/refresh'):
+            self.token_rejected.set()
+
+    def record_request_time(self, response, *args, **kwargs):
+        """按请求路径记录从发送到收到响应头的耗时"""
+        self.stats.record(request_stage(response.request.method, response.request.url), response.elapsed.total_seconds())
+
+    def post_json(self, path, payload):
+        """发送JSON请求，请求体较大且服务器支持时使用gzip压缩"""
+        url = f"{self.server_url}{path}"
+        body = json.dumps(payload).encode('utf-8')
+        if len(body) < COMPRESS_MIN_SIZE or 'gzip' not in self.server_encodings:
+            return self.session.post(url, data=body, headers={'Content-Type': 'application/json'})
+        
+        response = self.session.post(url, data=gzip.compress(body, compresslevel=COMPRESS_LEVEL), headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip'
+        })
+        if response.status_code == 415:
+            # 服务器不再支持压缩（例如已回滚到旧版本），以原始请求体重试
+            self.server_encodings.discard('gzip')
+            response = self.session.post(url, data=body, headers={'Content-Type': 'application/json'})
+        return response
 
     def get_latest_from_server(self):
         """从服务器获取最新的剪贴板内容"""
+        self.pending_commands = 0
         try:
-            response = self.session.get(f"{self.server_url}/api/clipboard/latest")
+            headers = {}
+            if self.latest_etag:
+                headers['If-None-Match'] = self.latest_etag
+            # 只获取摘要，内容变化时再下载；带上客户端ID时服务器在响应头中返回待执行的指令数
+            params = {'meta': 1}
+            if self.client_id:
+                params['client_id'] = self.client_id
+            response = self.session.get(
+                f"{self.server_url}/api/clipboard/latest",
+                params=params,
+                headers=headers
+            )
+            pending = response.headers.get('X-Pending-Commands')
+            self.pending_commands = int(pending) if pending and pending.isdigit() else None
+            if response.status_code == 304:
+                return None  # 内容未变化
             if response.status_code == 200:
-                data = response.json()
-                content = data.get('content')
-                content_type = data.get('content_type')
-                timestamp_str = data.get('timestamp')
-                
-                # 检查是否是模拟输入指令
-                if content_type == 'typing_command':
-                    try:
-                        command = json.loads(content)
-                        if command.get('action') == 'simulate_typing':
-                            command_id = command.get('command_id', 'unknown')
-                            
-                            # 检查是否已经处理过这个命令
-                            if command_id in self.processed_commands:
-                                return None  # 已处理过，忽略
-                            
-                            # 检查命令是否是在客户端启动之前创建的
-                            if self.start_time and timestamp_str:
-                                command_time = self.parse_timestamp(timestamp_str)
-                                if command_time:
-                                    # 确保两个时间都是同一时区的
-                                    if command_time.tzinfo is None:
-                                        # 如果命令时间没有时区信息，假设是UTC时间
-                                        command_time = command_time.replace(tzinfo=timezone.utc).astimezone()
-                                    
-                                    start_time = self.start_time
-                                    if start_time.tzinfo is None:
-                                        # 如果启动时间没有时区信息，添加本地时区
-                                        start_time = start_time.replace(tzinfo=datetime.now().astimezone().tzinfo)
-                                    
-                                    # 添加一些调试信息
-                                    print(f"[DEBUG] 命令时间: {command_time}, 启动时间: {start_time}")
-                                    
-                                    # 如果命令时间早于客户端启动时间超过10秒，则认为是旧命令
-                                    time_diff = (start_time - command_time).total_seconds()
-                                    if time_diff > 10:
-                                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 忽略启动前的旧命令: {command_id} (时间差: {time_diff:.2f}秒)")
-                                        self.processed_commands.add(command_id)  # 标记为已处理
-                                        return None
-                                    else:
-                                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 接受新命令: {command_id} (时间差: {time_diff:.2f}秒)")
-                            
-                            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 收到模拟输入指令")
-                            # 返回特殊格式以便在monitor_clipboard中处理
-                            return {'type': 'typing_command', 'command': command}
-                    except json.JSONDecodeError:
-                        print("解析模拟输入指令失败")
-                
-                return content
+                self.latest_etag = response.headers.get('ETag')
+                with self.stats.timer('json_decode'):
+                    data = response.json()
+                return self.process_server_item(data)
             else:
                 # 如果是404错误（没有剪贴板内容），不打印错误信息
                 if response.status_code != 404:
-                    print(f"获取最新内容失败: {response.json().get('error')}")
+                    logger.warning("获取最新内容失败: %s", response.json().get('error'))
+                    self.scheduler.record_failure()
                 return None
         except Exception as e:
-            print(f"获取请求失败: {e}")
+            logger.warning("获取请求失败: %s", e)
+            self.scheduler.record_failure()
+            return None
+
+    def process_server_item(self, data):
+        """解析服务器返回的剪贴板条目，返回剪贴板内容摘要"""
+        content = data.get('content')
+        content_type = data.get('content_type')
+        if data.get('id') is not None:
+            self.last_event_id = max(self.last_event_id or 0, data['id'])
+            self.stats.receive_echo(data['id'])
+        
+        # 旧版服务端不返回摘要时在本地计算
+        digest = data.get('content_hash')
+        if digest is None and content:
+            digest = content_digest(content)
+        return {
+            'type': 'clip',
+            'content_hash': digest,
+            'content': content,
+            'content_type': content_type
+        }
+
+    def apply_server_update(self, latest_content):
+        """将服务器的新内容应用到本地，返回是否有更新"""
+        # 处理普通剪贴板内容：摘要相同说明内容未变化，不需要下载
+        if not latest_content or not latest_content.get('content_hash'):
+            return False
+        if latest_content.get('content_type', 'text') != 'text':
+            return False  # 图片等内容暂不写入本地剪贴板
+        digest = latest_content['content_hash']
+        if digest == self.last_clipboard_hash:
+            return False
+        content = latest_content.get('content')
+        if content is None:
+            with self.stats.timer('download'):
+                content = self.fetch_blob(digest)
+            if content is None:
+                return False
+        
+        with self.clipboard_lock:
+            if digest == self.last_clipboard_hash:
+                return False
+            logger.info("从服务器获取到新内容")
+            self.remember_clipboard(content, digest)
+            with self.stats.timer('clipboard_write'):
+                self.watcher.write(content)
+            return True
+
+    def fetch_blob(self, digest):
+        """按摘要从服务器流式下载内容，中断后用Range请求从断点继续"""
+        chunks = []
+        received = 0
+        retries = 0
+        while True:
+            headers = {'Range': f'bytes={received}-'} if received else {}
+            try:
+                with self.session.get(f"{self.server_url}/api/blobs/{digest}", headers=headers, stream=True) as response:
+                    if response.status_code == 200:
+                        chunks, received = [], 0  # 服务器不支持Range时重新下载
+                    elif response.status_code != 206:
+                        logger.warning("下载内容失败，状态码: %s", response.status_code)
+                        return None
+                    for chunk in response.iter_content(DOWNLOAD_BLOCK_SIZE):
+                        chunks.append(chunk)
+                        received += len(chunk)
+                break
+            except requests.exceptions.RequestException as e:
+                retries += 1
+                if retries > TRANSFER_RETRY_COUNT:
+                    logger.warning("下载内容失败: %s", e)
+                    return None
+                logger.warning("下载中断，%s秒后从断点继续: %s", TRANSFER_RETRY_INTERVAL, e)
+                time.sleep(TRANSFER_RETRY_INTERVAL)
+
+        data = b''.join(chunks)
+        if hashlib.sha256(data).hexdigest() != digest:
+            logger.warning("下载的内容与摘要不一致，已忽略")
             return None
+        return data.decode('utf-8')
+
+    def remember_clipboard(self, content, digest=None):
+        """记录最近一次同步内容的摘要和长度"""
+        self.last_clipboard_length = len(content)
+        self.last_clipboard_hash = digest or content_digest(content)
+
+    def clipboard_changed(self, content):
+        """判断内容是否与最近一次同步的不同，返回(是否变化, 摘要)；长度不同时无需计算摘要"""
+        if len(content) != self.last_clipboard_length:
+            return True, None
+        digest = content_digest(content)
+        return digest != self.last_clipboard_hash, digest
+
+    def listen_server_stream(self):
+        """通过服务器推送（SSE）接收剪贴板变更，连接不可用时由监控线程轮询"""
+        while self.running:
+            try:
+                headers = {'Accept': 'text/event-stream'}
+                if self.last_event_id is not None:
+                    headers['Last-Event-ID'] = str(self.last_event_id)
+                with self.session.get(
+                    f"{self.server_url}/api/clipboard/stream",
+                    params={'meta': 1},
+                    headers=headers,
+                    stream=True,
+                    timeout=(STREAM_CONNECT_TIMEOUT, STREAM_READ_TIMEOUT)
+                ) as response:
+                    if response.status_code == 404:
+                        logger.info("服务器不支持推送，继续使用轮询同步")
+                        return
+                    if response.status_code == 503:
+                        logger.info("服务器推送连接已满，暂时使用轮询同步")
+                    elif response.status_code != 200:
+                        logger.warning("推送连接失败，状态码: %s", response.status_code)
+                    else:
+                        self.stream_response = response
+                        self.stream_connected = True
+                        self.stream_scheduler.reset()
+                        logger.info("已连接服务器推送")
+                        # 断线期间的指令没有推送通知，连接后先获取一次
+                        self.fetch_commands()
+                        self.read_stream_events(response)
+            except requests.exceptions.RequestException as e:
+                if self.running:
+                    logger.warning("推送连接中断: %s", e)
+            except Exception as e:
+                if self.running:
+                    logger.error("处理推送内容时出错: %s", e)
+            finally:
+                self.stream_connected = False
+                self.stream_response = None
+            
+            # 连续重连失败时指数退避并加入随机抖动，避免服务器恢复后所有客户端同时重连
+            if self.running:
+                self.stream_scheduler.record_failure()
+                self.stopped.wait(self.stream_scheduler.next_delay(STREAM_RETRY_INTERVAL))
+
+    def read_stream_events(self, response):
+        """逐行解析SSE事件流"""
+        event, data_lines = 'message', []
+        for line in response.iter_lines(chunk_size=8192):
+            if not self.running:
+                break
+            line = line.decode('utf-8')
+            if not line:
+                # 空行表示一个事件结束
+                if data_lines:
+                    self.handle_stream_event(event, '\n'.join(data_lines))
+                event, data_lines = 'message', []
+                continue
+            if line.startswith(':'):
+                continue  # 心跳注释
+            field, _, value = line.partition(':')
+            if value.startswith(' '):
+                value = value[1:]
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data_lines.append(value)
+
+    def handle_stream_event(self, event, data):
+        """处理推送事件"""
+        if event == 'command':
+            # 推送只通知有新指令，指令本身通过指令接口获取
+            if json.loads(data).get('client_id') == self.client_id:
+                self.fetch_commands()
+            return
+        if event != 'clip':
+            return
+        with self.stats.timer('json_decode'):
+            data = json.loads(data)
+        latest_content = self.process_server_item(data)
+        self.apply_server_update(latest_content)
+
+    def fetch_commands(self):
+        """获取服务器发给本客户端的指令，确认后执行，返回执行的指令数"""
+        if not self.client_id:
+            return 0
+        try:
+            response = self.session.get(f"{self.server_url}/api/clients/{self.client_id}/commands")
+            if response.status_code != 200:
+                # 旧版服务端没有指令接口
+                if response.status_code != 404:
+                    logger.warning("获取指令失败: %s", response.json().get('error'))
+                    self.scheduler.record_failure()
+                return 0
+            executed = 0
+            for command in response.json():
+                command_id = command['command_id']
+                # 先确认再执行，服务器判定已过期的指令不再执行
+                ack = self.session.post(f"{self.server_url}/api/clients/{self.client_id}/commands/{command_id}/ack")
+                if command_id in self.processed_commands:
+                    continue  # 确认请求丢失后重新下发的指令
+                if ack.status_code == 410:
+                    logger.info("忽略已过期的指令: %s", command_id)
+                    self.processed_commands.add(command_id)
+                    continue
+                if ack.status_code != 200:
+                    logger.warning("确认指令失败: %s", ack.json().get('error'))
+                    continue
+                if command.get('action') == 'simulate_typing':
+                    logger.info("收到模拟输入指令: %s", command_id)
+                    self.execute_typing_command(command)
+                    executed += 1
+            return executed
+        except Exception as e:
+            logger.warning("获取指令失败: %s", e)
+            self.scheduler.record_failure()
+            return 0
 
     def monitor_clipboard(self):
         """监控剪贴板变化并同步到服务器"""
-        print("开始监控剪贴板...")
-        self.last_clipboard = pyperclip.paste()
+        logger.info("开始监控剪贴板（%s）", self.watcher.name)
+        self.remember_clipboard(self.watcher.read())
         connection_error_count = 0
         max_retry_count = 3
+        delay = 0
         
         while self.running:
+            # 等待监听器通知本地剪贴板变化，超时后按调度间隔轮询服务器
+            woken = self.local_change.wait(delay)
+            tick_started = time.monotonic()
             try:
-                # 检查本地剪贴板是否有变化
-                current_clipboard = pyperclip.paste()
-                if current_clipboard != self.last_clipboard and current_clipboard.strip():
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 检测到剪贴板变化")
-                    self.last_clipboard = current_clipboard
-                    if not self.sync_clipboard_to_server(current_clipboard):
-                        print("同步到服务器失败，可能是网络连接问题")
-                        connection_error_count += 1
+                self.refresh_token_if_needed()
+                changed = False
+                if woken and self.running:
+                    self.local_change.clear()
+                    content, self.pending_local_content = self.pending_local_content, None
+                    copied_at, self.pending_local_time = self.pending_local_time, None
+                    with self.clipboard_lock:
+                        if content is None:
+                            with self.stats.timer('clipboard_read'):
+                                content = self.watcher.read()
+                        current_clipboard = content
+                        changed, digest = self.clipboard_changed(current_clipboard)
+                        changed = changed and current_clipboard.strip()
+                        if changed:
+                            digest = digest or content_digest(current_clipboard)
+                            self.remember_clipboard(current_clipboard, digest)
+                if changed:
+                    logger.debug("检测到剪贴板变化")
+                    self.scheduler.record_activity()
+                    if len(self.offline_queue):
+                        # 还有未补发的内容时排到队尾，保证服务器上的顺序与复制顺序一致
+                        self.queue_offline(current_clipboard, digest)
                     else:
-                        connection_error_count = 0  # 成功同步后重置错误计数
+                        with self.stats.timer('upload'):
+                            synced = self.sync_clipboard_to_server(current_clipboard, digest, copied_at or tick_started)
+                        if synced:
+                            connection_error_count = 0  # 成功同步后重置错误计数
+                        else:
+                            logger.warning("同步到服务器失败，可能是网络连接问题")
+                            self.scheduler.record_failure()
+                            connection_error_count += 1
                 
-                # 检查服务器是否有新内容
-                latest_content = self.get_latest_from_server()
-                
-                # 处理模拟输入指令
-                if isinstance(latest_content, dict) and latest_content.get('type') == 'typing_command':
-                    command = latest_content.get('command')
-                    if command and 'content' in command:
-                        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 执行模拟输入指令")
-                        self.execute_typing_command(command)
+                # 有离线期间未发送的内容时，确认服务器可用后一次补发
+                if len(self.offline_queue):
+                    with self.stats.timer('replay'):
+                        replayed = self.test_server_connection() and self.replay_offline_queue()
+                    if replayed:
                         connection_error_count = 0
-                # 处理普通剪贴板内容
-                elif latest_content and latest_content != self.last_clipboard:
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 从服务器获取到新内容")
-                    self.last_clipboard = latest_content
-                    pyperclip.copy(latest_content)
-                    connection_error_count = 0  # 成功获取后重置错误计数
+                    else:
+                        self.scheduler.record_failure()
+                
+                # 推送通道断开时才轮询服务器，作为后备方案
+                if not self.stream_connected:
+                    with self.stats.timer('poll'):
+                        latest_content = self.get_latest_from_server()
+                        updated = self.apply_server_update(latest_content)
+                    if updated:
+                        self.scheduler.record_activity()
+                        connection_error_count = 0  # 成功获取后重置错误计数
+                    # 只在服务器提示有指令（或旧版服务端不提示）时获取，空闲时每次轮询只有一个请求
+                    if self.pending_commands is None or self.pending_commands > 0:
+                        with self.stats.timer('commands'):
+                            executed = self.fetch_commands()
+                        if executed:
+                            self.scheduler.record_activity()
                 
                 # 如果连续错误次数过多，尝试重新测试连接
                 if connection_error_count >= max_retry_count:
-                    print("检测到多次连接错误，正在尝试重新连接服务器...")
+                    logger.warning("检测到多次连接错误，正在尝试重新连接服务器")
                     if self.test_server_connection():
-                        print("服务器连接恢复正常")
+                        logger.info("服务器连接恢复正常")
                         connection_error_count = 0
                     else:
-                        print("服务器连接仍然异常，将继续尝试")
-                
-                time.sleep(2)  # 每2秒检查一次
+                        logger.warning("服务器连接仍然异常，将继续尝试")
             except requests.exceptions.RequestException as e:
-                print(f"网络请求错误: {e}")
+                logger.warning("网络请求错误: %s", e)
                 connection_error_count += 1
-                time.sleep(5)  # 网络错误后等待5秒再继续
+                self.scheduler.record_failure()
             except Exception as e:
-                print(f"监控过程中出错: {e}")
-                time.sleep(5)  # 出错后等待5秒再继续
+                logger.exception("监控过程中出错: %s", e)
+                self.scheduler.record_failure()
+            self.stats.record('tick', time.monotonic() - tick_started)
+            # 有变化后快速轮询，空闲时逐渐放慢，出错时指数退避
+            delay = self.scheduler.next_delay(self.sync_interval)
+
+    def on_clipboard_change(self, content):
+        """监听器回调，可能在Qt主线程中执行，只唤醒监控线程"""
+        self.pending_local_content = content
+        self.pending_local_time = time.monotonic()
+        self.local_change.set()
 
     def test_server_connection(self):
         """测试与服务器的连接"""
         try:
-            response = requests.get(f"{self.server_url}/api/ping", timeout=3)
+            response = self.session.get(f"{self.server_url}/api/ping", timeout=3)
             if response.status_code == 200:
-                print(f"服务器连接成功: {self.server_url}")
+                logger.debug("服务器连接成功: %s", self.server_url)
                 return True
             else:
-                print(f"服务器连接失败，状态码: {response.status_code}，响应: {response.text if hasattr(response, 'text') else '无响应内容'}")
+                logger.warning("服务器连接失败，状态码: %s，响应: %s", response.status_code, response.text)
                 return False
         except requests.exceptions.ConnectionError:
-            print(f"服务器连接错误: 无法连接到 {self.server_url}，请检查服务器地址是否正确或服务器是否已启动")
+            logger.warning("服务器连接错误: 无法连接到 %s，请检查服务器地址是否正确或服务器是否已启动", self.server_url)
             return False
         except requests.exceptions.Timeout:
-            print(f"服务器连接超时: {self.server_url} 响应超时，请检查网络连接")
+            logger.warning("服务器连接超时: %s 响应超时，请检查网络连接", self.server_url)
             return False
         except requests.exceptions.RequestException as e:
-            print(f"服务器连接错误: {e}")
+            logger.warning("服务器连接错误: %s", e)
             return False
     
     def start(self):
         """启动剪贴板同步"""
         # 先测试服务器连接
         if not self.test_server_connection():
-            print("无法连接到服务器，请检查服务器地址和网络连接")
+            logger.error("无法连接到服务器，请检查服务器地址和网络连接")
             return False
             
         if not self.user_id:
@@ -335,78 +812,120 @@ class ClipboardSyncClient:
         
         if not self.running:
             self.running = True
-            # 记录启动时间，用于忽略启动前的旧命令
-            self.start_time = datetime.now()
-            print(f"[DEBUG] 客户端启动时间: {self.start_time}")
-            # 清空已处理的命令记录
-            self.processed_commands.clear()
-            self.sync_thread = threading.Thread(target=self.monitor_clipboard)
+            self.local_change.clear()
+            self.stopped.clear()
+            self.watcher.subscribe(self.on_clipboard_change)
+            self.watcher.stats = self.stats
+            self.watcher.start()
+            self.sync_thread = threading.Thread(target=self.run_monitor)
             self.sync_thread.daemon = True
             self.sync_thread.start()
+            # 推送线程负责接收服务器变更
+            self.stream_thread = threading.Thread(target=self.listen_server_stream)
+            self.stream_thread.daemon = True
+            self.stream_thread.start()
             return True
         return False
 
+    def run_monitor(self):
+        """运行监控循环，设置了profile_path时在cProfile下运行，停止后保存结果"""
+        if not self.profile_path:
+            self.monitor_clipboard()
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(self.monitor_clipboard)
+        finally:
+            profiler.dump_stats(self.profile_path)
+            logger.info("性能分析结果已保存到 %s，可用 python -m pstats 查看", self.profile_path)
+
     def execute_typing_command(self, command):
-        """执行模拟输入指令"""
+        """将模拟输入指令加入输入队列，立即返回"""
+        content = command.get('content')
+        typing_speed = command.get('typing_speed', self.typing_speed)
+        command_id = command.get('command_id', 'unknown')
+        
+        # 记录这个命令已被处理，重新下发时不再执行
+        if not self.processed_commands.add(command_id):
+            return
+        
+        if not content:
+            logger.warning("模拟输入内容为空")
+            return
+        
+        # 确保typing_speed不为None且为正数
+        if typing_speed is None or typing_speed <= 0:
+            typing_speed = self.typing_speed
+        
+        logger.info("模拟输入已加入队列，命令ID: %s", command_id)
+        if self.gui is None:
+            logger.info("将在%s秒后开始模拟输入，请切换到目标窗口", HEADLESS_TYPING_DELAY)
+        delay = HEADLESS_TYPING_DELAY if self.gui is None else None
+        self.typing_worker.submit(content, typing_speed, command_id, delay=delay, source='server')
+    
+    def on_typing_progress(self, job):
+        """模拟输入状态变化或定期报告进度，在输入线程中调用"""
+        if self.gui is not None:
+            self.gui.handle_typing_progress(job)
+        elif job.state in FINISHED_STATES:
+            logger.info("模拟输入%s: %d/%d，命令ID: %s", STATE_NAMES[job.state], job.typed, job.total, job.command_id)
+        if job.state == COMPLETED and job.started is not None and job.finished is not None:
+            self.stats.record('typing', job.finished - job.started)
+        if job.source != 'server':
+            return
+        # 报告给服务器，网页端请求取消时在这里停止
         try:
-            content = command.get('content')
-            typing_speed = command.get('typing_speed', self.typing_speed)
-            command_id = command.get('command_id', 'unknown')
-            
-            # 记录这个命令已被处理
-            self.processed_commands.add(command_id)
-            
-            # 清理旧的命令记录（保留最近100个）
-            if len(self.processed_commands) > 100:
-                # 转换为列表并保留最新的100个
-                commands_list = list(self.processed_commands)
-                self.processed_commands = set(commands_list[-100:])
-            
-            if not content:
-                print("模拟输入内容为空")
-                return
-                
-            print(f"开始执行模拟输入，命令ID: {command_id}")
-            
-            # 确保typing_speed不为None且为正数
-            if typing_speed is None or typing_speed <= 0:
-                typing_speed = self.typing_speed
-            
-            # 如果GUI界面存在，则调用其模拟输入方法
-            if hasattr(self, 'gui') and self.gui:
-                self.gui.handle_simulate_typing(content, typing_speed)
-            else:
-                # 直接执行模拟输入
-                try:
-                    import pyautogui
-                    import time
-                    
-                    # 给用户一点时间切换到目标窗口
-                    print("将在3秒后开始模拟输入，请切换到目标窗口...")
-                    time.sleep(3)
-                    
-                    # 执行模拟输入
-                    pyautogui.write(content, interval=typing_speed/1000.0)
-                    print("模拟输入完成")
-                except ImportError:
-                    print("未安装pyautogui模块，无法执行模拟输入")
-                except Exception as e:
-                    print(f"模拟输入过程中出错: {e}")
+            response = self.session.post(
+                f"{self.server_url}/api/simulate_typing/{job.command_id}/progress",
+                json={'state': job.state, 'typed': job.typed, 'total': job.total, 'error': job.error},
+                timeout=5
+            )
+            if response.status_code == 200 and response.json().get('cancel'):
+                job.cancel()
         except Exception as e:
-            print(f"执行模拟输入指令失败: {e}")
+            logger.warning("报告模拟输入进度失败: %s", e)
     
     def stop(self):
         """停止剪贴板同步"""
         self.running = False
+        self.stopped.set()
+        self.typing_worker.cancel()
+        self.watcher.unsubscribe(self.on_clipboard_change)
+        # 监听器由GUI共用时继续运行
+        if not self.watcher.callbacks:
+            self.watcher.stop()
+        self.local_change.set()
         if self.sync_thread:
             self.sync_thread.join(timeout=5)
-            print("剪贴板同步已停止")
+            logger.info("剪贴板同步已停止")
+        # 关闭推送连接以唤醒阻塞在读取上的推送线程
+        stream_response = self.stream_response
+        if stream_response is not None:
+            try:
+                # 推送线程读取时持有连接，直接close要等到下一次心跳才返回，先关闭套接字
+                connection = getattr(stream_response.raw, 'connection', None)
+                if connection is not None and connection.sock is not None:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                stream_response.close()
+            except Exception:
+                pass
+        if self.stream_thread:
+            self.stream_thread.join(timeout=5)
 
 def main():
+    parser = argparse.ArgumentParser(description='剪贴板同步客户端')
+    parser.add_argument('--stats', action='store_true', help=f'每{STATS_DUMP_INTERVAL}秒及退出时输出各阶段耗时统计')
+    parser.add_argument('--profile', metavar='FILE', help='在cProfile下运行同步循环，退出时将结果写入FILE')
+    args = parser.parse_args()
+    
+    setup_logging()
     client = ClipboardSyncClient()
+    setup_logging(client.log_level, client.log_format)
+    if args.profile:
+        client.profile_path = args.profile
     
     # 简单的命令行界面
-    if not client.username or not client.password:
+    if not client.token and not client.password:
         print("首次使用，请注册或登录")
         choice = input("1. 登录\n2. 注册\n请选择: ")
         
@@ -426,16 +945,22 @@ def main():
             print("无效选择")
             return
     
+    if not client.start():
+        print("启动同步失败，请检查服务器连接或重新登录")
+        return
     print(f"已登录为: {client.username}")
-    client.start()
     
     print("剪贴板同步客户端已启动，按Ctrl+C退出")
     try:
         while True:
-            time.sleep(1)
+            time.sleep(STATS_DUMP_INTERVAL if args.stats else 1)
+            if args.stats:
+                print(client.stats.format_summary())
     except KeyboardInterrupt:
         print("正在停止服务...")
         client.stop()
+        if args.stats:
+            print(client.stats.format_summary())
         print("已退出")
 
 if __name__ == "__main__":
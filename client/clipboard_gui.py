@@ -1,15 +1,25 @@
 import sys
-import pyperclip
+import logging
 import pyautogui
-import time
 import keyboard
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QTextEdit, QStatusBar, QMessageBox, QShortcut, QInputDialog, QDialog, QSpinBox)
-from PyQt5.QtCore import QTimer, Qt, pyqtSlot
-from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QTimer
+from PyQt5.QtGui import QKeySequence, QFontDatabase
 from clipboard_client import ClipboardSyncClient
+from clipboard_watcher import QtWatcher
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+STATS_REFRESH_INTERVAL = 1000  # 统计面板刷新间隔（毫秒）
 
 class ClipboardGUI(QMainWindow):
+    # 监听器回调可能来自后台线程，通过信号切换到Qt主线程更新界面
+    clipboard_content_changed = pyqtSignal(object)
+    # 模拟输入进度在输入线程中报告
+    typing_progress_changed = pyqtSignal(object)
+    
     def __init__(self):
         super().__init__()
         self.client = ClipboardSyncClient()
@@ -22,7 +32,7 @@ class ClipboardGUI(QMainWindow):
         self.stop_shortcut_text = "Ctrl+Shift+S"
         
         self.init_ui()
-        self.setup_timer()
+        self.setup_clipboard_watcher()
         self.setup_shortcuts()
         # 初始化时加载并应用设置
         if hasattr(self.client, 'typing_speed'):
@@ -79,8 +89,9 @@ class ClipboardGUI(QMainWindow):
         pass_layout.addWidget(QLabel('密码:'))
         self.password_input = QLineEdit()
         self.password_input.setEchoMode(QLineEdit.Password)
-        if self.client.password:
-            self.password_input.setText(self.client.password)
+        # 配置文件只保存令牌，密码只在重新登录时输入
+        if self.client.token:
+            self.password_input.setPlaceholderText('已保存登录状态')
         pass_layout.addWidget(self.password_input)
         auth_layout.addLayout(pass_layout)
         
@@ -110,17 +121,29 @@ class ClipboardGUI(QMainWindow):
         self.stop_typing_btn.setEnabled(False)
         button_layout.addWidget(self.stop_typing_btn)
         
+        # 添加统计按钮
+        self.stats_btn = QPushButton('统计')
+        self.stats_btn.clicked.connect(self.open_stats)
+        button_layout.addWidget(self.stats_btn)
+        
         auth_layout.addLayout(button_layout)
         layout.addLayout(auth_layout)
     
-    def setup_timer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_clipboard_display)
-        self.timer.start(1000)  # 每秒更新一次
+    def setup_clipboard_watcher(self):
+        # 界面和同步线程共用一个基于dataChanged信号的监听器，不再定时读取剪贴板
+        self.watcher = QtWatcher(QApplication.clipboard())
+        self.client.watcher = self.watcher
+        self.clipboard_content_changed.connect(self.update_clipboard_display)
+        self.watcher.subscribe(self.clipboard_content_changed.emit)
+        self.watcher.start()
+        self.typing_progress_changed.connect(self.update_typing_status)
+        self.update_clipboard_display(QApplication.clipboard().text())
     
-    def update_clipboard_display(self):
-        current_content = pyperclip.paste()
-        self.clipboard_display.setPlainText(current_content)
+    @pyqtSlot(object)
+    def update_clipboard_display(self, content):
+        if content is None:
+            content = QApplication.clipboard().text()
+        self.clipboard_display.setPlainText(content)
     
     def update_status(self, message):
         self.status_bar.showMessage(message)
@@ -166,6 +189,8 @@ class ClipboardGUI(QMainWindow):
             if self.client.start():
                 self.sync_btn.setText('停止同步')
                 self.update_status('正在同步剪贴板...')
+            else:
+                self.update_status('启动同步失败，请检查服务器连接或重新登录')
         else:
             self.client.stop()
             self.sync_btn.setText('开始同步')
@@ -182,77 +207,87 @@ class ClipboardGUI(QMainWindow):
             keyboard.add_hotkey(self.paste_shortcut_text, self.paste_from_clipboard)
             keyboard.add_hotkey(self.simulate_shortcut_text, self.paste_from_clipboard)
             keyboard.add_hotkey(self.stop_shortcut_text, self.stop_simulate_typing)
-            print(f"快捷键已设置: {self.paste_shortcut_text}, {self.simulate_shortcut_text}, {self.stop_shortcut_text}")
+            logger.info("快捷键已设置: %s, %s, %s", self.paste_shortcut_text, self.simulate_shortcut_text, self.stop_shortcut_text)
         except Exception as e:
-            print(f"设置快捷键失败: {e}")
+            logger.error("设置快捷键失败: %s", e)
         
     def paste_from_clipboard(self):
         """模拟键盘输入粘贴剪贴板内容"""
         if not self.client.running:
             return
             
-        clipboard_content = pyperclip.paste()
+        clipboard_content = self.watcher.read()
         if clipboard_content:
             self.simulate_typing(clipboard_content, self.client.typing_speed)
             
     def simulate_typing(self, content, speed=100):
-        """执行模拟输入"""
-        try:
-            # 启用PyAutoGUI的失败保护
-            pyautogui.FAILSAFE = True
-            
-            # 确保speed不为None且为正数
-            if speed is None or speed <= 0:
-                speed = 100
-            
-            # 重置keyboard监听状态
-            keyboard.unhook_all()
-            self.setup_shortcuts()
-            
-            # 添加1秒延迟确保有足够时间切换窗口
-            time.sleep(1)
-            
-            # 直接使用PyAutoGUI模拟键盘输入
-            pyautogui.write(content, interval=speed/1000.0)
-            
-            self.stop_typing_btn.setEnabled(True)
-            
-        except pyautogui.FailSafeException:
-            pass
-        except Exception as e:
-            print(f"模拟输入异常: {str(e)}")
-            
-    def handle_simulate_typing(self, content, speed):
-        """处理来自服务端的模拟输入指令"""
-        # 在主线程中执行模拟输入
-        try:
-            # 显示通知
-            self.update_status(f'正在执行模拟输入，速度: {speed}ms')
-            
-            # 执行模拟输入
-            self.simulate_typing(content, speed)
+        """将内容加入模拟输入队列，由输入线程执行，不阻塞界面"""
+        # 启用PyAutoGUI的失败保护
+        pyautogui.FAILSAFE = True
+        
+        # 确保speed不为None且为正数
+        if speed is None or speed <= 0:
+            speed = 100
+        
+        # 重置keyboard监听状态
+        keyboard.unhook_all()
+        self.setup_shortcuts()
+        
+        self.client.typing_worker.submit(content, speed)
             
-            # 恢复状态
+    def handle_typing_progress(self, job):
+        """输入线程报告进度，切换到主线程更新界面"""
+        self.typing_progress_changed.emit(job)
+        
+    @pyqtSlot(object)
+    def update_typing_status(self, job):
+        """显示模拟输入进度"""
+        self.stop_typing_btn.setEnabled(self.client.typing_worker.busy)
+        if job.state == 'queued':
+            self.update_status(f'模拟输入已排队，速度: {job.speed}ms')
+        elif job.state == 'running':
+            self.update_status(f'正在执行模拟输入: {job.typed}/{job.total}')
+        elif job.state == 'completed':
             self.update_status('模拟输入完成')
-            
-        except Exception as e:
-            print(f"处理模拟输入失败: {str(e)}")
-            self.update_status(f'模拟输入失败: {str(e)}')
+        elif job.state == 'cancelled':
+            self.update_status(f'模拟输入已停止: {job.typed}/{job.total}')
+        else:
+            self.update_status(f'模拟输入失败: {job.error}')
                 
     def stop_simulate_typing(self):
-        """停止模拟输入"""
-        if not self.client.running:
-            QMessageBox.warning(self, '警告', '请先启动同步功能')
-            return
-            
-        try:
-            # 按下ESC键停止当前输入
-            pyautogui.press('esc')
-            QMessageBox.information(self, '成功', '模拟输入已停止')
-            self.stop_typing_btn.setEnabled(False)
-        except Exception as e:
-            QMessageBox.warning(self, '错误', f"停止模拟输入失败: {str(e)}")
+        """停止正在执行和排队中的模拟输入"""
+        # 快捷键回调在keyboard线程中执行，只设置取消令牌，界面由进度回调更新
+        if not self.client.typing_worker.cancel():
+            logger.info("当前没有模拟输入")
             
+    def open_stats(self):
+        """显示各阶段耗时的p50/p95/p99，定时刷新"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle('同步统计')
+        dialog.resize(640, 360)
+        
+        layout = QVBoxLayout()
+        stats_display = QTextEdit()
+        stats_display.setReadOnly(True)
+        stats_display.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        layout.addWidget(stats_display)
+        
+        reset_btn = QPushButton('重置')
+        reset_btn.clicked.connect(self.client.stats.reset)
+        layout.addWidget(reset_btn)
+        
+        def refresh():
+            stats_display.setPlainText(self.client.stats.format_summary())
+        
+        timer = QTimer(dialog)
+        timer.timeout.connect(refresh)
+        timer.start(STATS_REFRESH_INTERVAL)
+        refresh()
+        
+        dialog.setLayout(layout)
+        dialog.exec_()
+        timer.stop()
+    
     def open_settings(self):
         """打开设置对话框"""
         dialog = QDialog(self)
@@ -266,7 +301,7 @@ class ClipboardGUI(QMainWindow):
         sync_interval_layout.addWidget(QLabel('同步间隔(秒):'))
         self.sync_interval_input = QSpinBox()
         self.sync_interval_input.setRange(1, 60)
-        self.sync_interval_input.setValue(2)
+        self.sync_interval_input.setValue(self.client.sync_interval)
         sync_interval_layout.addWidget(self.sync_interval_input)
         layout.addLayout(sync_interval_layout)
         
@@ -321,7 +356,6 @@ class ClipboardGUI(QMainWindow):
         """保存设置"""
         sync_interval = self.sync_interval_input.value()
         self.client.sync_interval = sync_interval
-        self.timer.setInterval(sync_interval * 1000)
         
         # 保存模拟输入速度设置
         self.client.typing_speed = self.typing_speed_input.value()
@@ -339,8 +373,10 @@ class ClipboardGUI(QMainWindow):
         dialog.close()
 
 def main():
+    setup_logging()
     app = QApplication(sys.argv)
     gui = ClipboardGUI()
+    setup_logging(gui.client.log_level, gui.client.log_format)
     gui.show()
     sys.exit(app.exec_())
 
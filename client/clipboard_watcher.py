@@ -0,0 +1,299 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import shutil
+import subprocess
+import threading
+import time
+import pyperclip
+
+logger = logging.getLogger(__name__)
+
+POLL_MIN_INTERVAL = 0.25  # 剪贴板刚变化后的轮询间隔（秒）
+POLL_MAX_INTERVAL = 2.0  # 长时间无变化时的最大轮询间隔（秒）
+
+
+class ClipboardWatcher:
+    """剪贴板变化监听器基类
+
+    检测到变化时调用所有订阅的回调，回调参数为新内容，监听方式无法直接取得内容时为None，
+    由订阅者调用read()读取。回调可能在后台线程或Qt主线程中执行，不应在其中做耗时操作。
+    """
+    name = 'base'
+
+    def __init__(self):
+        self.callbacks = []
+        self.running = False
+        self.thread = None
+        self.stats = None  # 设置为SyncStats时，轮询方式记录每次读取剪贴板的耗时
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def subscribe(self, callback):
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def notify(self, content=None):
+        for callback in list(self.callbacks):
+            try:
+                callback(content)
+            except Exception as e:
+                logger.exception("处理剪贴板变化失败: %s", e)
+
+    def read(self):
+        return pyperclip.paste()
+
+    def write(self, content):
+        pyperclip.copy(content)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=3)
+        self.thread = None
+
+    def run(self):
+        raise NotImplementedError
+
+
+class PollingWatcher(ClipboardWatcher):
+    """自适应轮询：变化后短间隔检查，无变化时逐渐放慢到最大间隔"""
+    name = 'polling'
+
+    def __init__(self, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL):
+        super().__init__()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.wakeup = threading.Event()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        super().stop()
+
+    def run(self):
+        self.wakeup.clear()
+        last = self.read()
+        interval = self.min_interval
+        while self.running:
+            self.wakeup.wait(interval)
+            if not self.running:
+                break
+            started = time.monotonic()
+            try:
+                current = self.read()
+            except Exception as e:
+                logger.warning("读取剪贴板失败: %s", e)
+                interval = self.max_interval
+                continue
+            finally:
+                if self.stats is not None:
+                    self.stats.record('clipboard_poll', time.monotonic() - started)
+            if current != last:
+                last = current
+                interval = self.min_interval
+                self.notify(current)
+            else:
+                interval = min(self.max_interval, interval * 1.5)
+
+
+class WaylandWatcher(ClipboardWatcher):
+    """Wayland下由wl-paste --watch在剪贴板变化时执行命令，每次变化输出一行"""
+    name = 'wayland'
+
+    def __init__(self):
+        super().__init__()
+        self.process = None
+
+    @classmethod
+    def available(cls):
+        return bool(os.environ.get('WAYLAND_DISPLAY')) and shutil.which('wl-paste') is not None
+
+    def stop(self):
+        self.running = False
+        if self.process is not None:
+            self.process.terminate()
+        super().stop()
+
+    def run(self):
+        self.process = subprocess.Popen(
+            ['wl-paste', '--watch', 'echo', 'changed'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            for _ in iter(self.process.stdout.readline, b''):
+                if not self.running:
+                    break
+                self.notify(None)
+        finally:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+class XEvent(ctypes.Union):
+    _fields_ = [('type', ctypes.c_int), ('pad', ctypes.c_long * 24)]
+
+
+class XFixesWatcher(ClipboardWatcher):
+    """X11下通过XFixes扩展订阅CLIPBOARD所有者变化事件，无需启动xclip子进程"""
+    name = 'xfixes'
+    SET_SELECTION_OWNER_NOTIFY_MASK = 1
+    SELECTION_NOTIFY = 0
+
+    def __init__(self):
+        super().__init__()
+        self.poller = None
+
+    @classmethod
+    def available(cls):
+        return (
+            bool(os.environ.get('DISPLAY'))
+            and ctypes.util.find_library('X11') is not None
+            and ctypes.util.find_library('Xfixes') is not None
+        )
+
+    def run(self):
+        xlib = ctypes.cdll.LoadLibrary(ctypes.util.find_library('X11'))
+        xfixes = ctypes.cdll.LoadLibrary(ctypes.util.find_library('Xfixes'))
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        xlib.XPending.argtypes = [ctypes.c_void_p]
+        xlib.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.POINTER(XEvent)]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xfixes.XFixesQueryExtension.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)
+        ]
+        xfixes.XFixesSelectSelectionInput.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong
+        ]
+
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            logger.warning("无法连接X11显示，改用轮询监听剪贴板")
+            self.fallback()
+            return
+        try:
+            event_base, error_base = ctypes.c_int(), ctypes.c_int()
+            if not xfixes.XFixesQueryExtension(display, ctypes.byref(event_base), ctypes.byref(error_base)):
+                logger.warning("X服务器不支持XFixes扩展，改用轮询监听剪贴板")
+                self.fallback()
+                return
+            clipboard = xlib.XInternAtom(display, b'CLIPBOARD', 0)
+            xfixes.XFixesSelectSelectionInput(
+                display, xlib.XDefaultRootWindow(display), clipboard, self.SET_SELECTION_OWNER_NOTIFY_MASK
+            )
+            fd = xlib.XConnectionNumber(display)
+            event = XEvent()
+            while self.running:
+                # 带超时等待，便于stop()时退出
+                select.select([fd], [], [], 1.0)
+                while xlib.XPending(display):
+                    xlib.XNextEvent(display, ctypes.byref(event))
+                    if event.type == event_base.value + self.SELECTION_NOTIFY:
+                        self.notify(None)
+        finally:
+            xlib.XCloseDisplay(display)
+
+    def stop(self):
+        if self.poller is not None:
+            self.poller.running = False
+            self.poller.wakeup.set()
+        super().stop()
+
+    def fallback(self):
+        # 在当前线程中继续以轮询方式监听，订阅者不受影响
+        self.poller = PollingWatcher()
+        self.poller.callbacks = self.callbacks
+        self.poller.running = self.running
+        self.poller.run()
+
+
+class QtWatcher(ClipboardWatcher):
+    """通过QClipboard.dataChanged信号监听，必须在Qt主线程中创建，回调在Qt主线程中执行"""
+    name = 'qt'
+
+    def __init__(self, clipboard):
+        super().__init__()
+        self.clipboard = clipboard
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.clipboard.dataChanged.connect(self.on_data_changed)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.clipboard.dataChanged.disconnect(self.on_data_changed)
+
+    def on_data_changed(self):
+        # 在信号中直接取得内容，订阅者无需再读取剪贴板
+        self.notify(self.clipboard.text())
+
+
+class MemoryWatcher(ClipboardWatcher):
+    """内存中的剪贴板，写入时同步通知订阅者，用于测试和无图形界面的环境"""
+    name = 'memory'
+
+    def __init__(self, content=''):
+        super().__init__()
+        self.content = content
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            return self.content
+
+    def write(self, content):
+        with self.lock:
+            changed = content != self.content
+            self.content = content
+        if changed and self.running:
+            self.notify(content)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+BACKENDS = {watcher.name: watcher for watcher in (WaylandWatcher, XFixesWatcher, PollingWatcher, MemoryWatcher)}
+
+
+def create_watcher(name='auto'):
+    """按名称创建监听器，auto时依次尝试Wayland、X11 XFixes，都不可用时使用自适应轮询"""
+    name = os.environ.get('CLIPSYNC_CLIPBOARD_WATCHER', name or 'auto')
+    if name != 'auto':
+        backend = BACKENDS.get(name)
+        if backend is not None and backend.available():
+            return backend()
+        logger.warning("剪贴板监听方式 %s 不可用，自动选择", name)
+    for backend in (WaylandWatcher, XFixesWatcher):
+        if backend.available():
+            return backend()
+    return PollingWatcher()
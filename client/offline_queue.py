@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+import time
+
+MAX_PENDING = 100  # 最多保留的未发送条数，超出时丢弃最旧的
+
+
+class OfflineQueue:
+    """离线时未能发送到服务器的剪贴板内容，保存在config.json旁的SQLite文件中，重启后仍会重新发送"""
+
+    def __init__(self, path, max_pending=MAX_PENDING):
+        self.path = path
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pending_clip ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT NOT NULL, content_hash TEXT NOT NULL, '
+            'content_type TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+
+    def push(self, content, digest, content_type='text'):
+        """记录一条未发送的内容，已排队的相同内容移到队尾，服务器上只会出现一次"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute('DELETE FROM pending_clip WHERE content_hash = ?', (digest,))
+            self.conn.execute(
+                'INSERT INTO pending_clip (content, content_hash, content_type, created_at) VALUES (?, ?, ?, ?)',
+                (content, digest, content_type, now)
+            )
+            self.conn.execute(
+                'DELETE FROM pending_clip WHERE id NOT IN '
+                '(SELECT id FROM pending_clip ORDER BY id DESC LIMIT ?)',
+                (self.max_pending,)
+            )
+
+    def peek(self, limit):
+        """按复制顺序返回最早的limit条，元素为(id, 内容, 摘要, 类型)"""
+        with self.lock:
+            return self.conn.execute(
+                'SELECT id, content, content_hash, content_type FROM pending_clip ORDER BY id LIMIT ?',
+                (limit,)
+            ).fetchall()
+
+    def remove(self, ids):
+        """删除已发送成功的条目"""
+        if not ids:
+            return
+        with self.lock:
+            self.conn.executemany('DELETE FROM pending_clip WHERE id = ?', [(row_id,) for row_id in ids])
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM pending_clip').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
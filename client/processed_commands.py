@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_PROCESSED = 1000  # 最多记住的已处理指令数，超出时淘汰最早处理的
+
+
+class ProcessedCommands:
+    """已处理指令ID的有序集合，按处理顺序淘汰，保存在config.json旁的文件中，重启后仍能去重
+
+    判断和记录都是O(1)，只保留最近max_size条，不会因为集合无序而让旧ID重新出现。
+    """
+
+    def __init__(self, path, max_size=MAX_PROCESSED):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.ids = OrderedDict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                ids = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("加载已处理指令记录失败: %s", e)
+            return
+        for command_id in ids[-self.max_size:]:
+            self.ids[command_id] = None
+
+    def save(self):
+        # 先写临时文件再替换，中途退出不会留下损坏的记录
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(list(self.ids), f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("保存已处理指令记录失败: %s", e)
+
+    def __contains__(self, command_id):
+        with self.lock:
+            return command_id in self.ids
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ids)
+
+    def add(self, command_id):
+        """记录已处理的指令，返回是否为新指令"""
+        with self.lock:
+            if command_id in self.ids:
+                self.ids.move_to_end(command_id)
+                return False
+            self.ids[command_id] = None
+            while len(self.ids) > self.max_size:
+                self.ids.popitem(last=False)
+            self.save()
+            return True
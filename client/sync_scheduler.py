@@ -0,0 +1,89 @@
+import math
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+FAST_INTERVAL = 0.5  # 刚有内容变化时的轮询间隔（秒）
+FAST_ROUNDS = 5  # 变化后保持快速轮询的次数
+IDLE_GROWTH = 1.5  # 空闲时每轮间隔的增长倍数
+IDLE_MAX_FACTOR = 8  # 空闲时最大间隔为同步间隔的倍数
+MAX_BACKOFF = 300  # 出错后的最大等待时间（秒）
+JITTER = 0.2  # 正常轮询间隔的随机浮动比例
+# 达到最大间隔或最大退避后不再累加轮数，长时间空闲或离线时指数不会溢出
+MAX_IDLE_ROUNDS = FAST_ROUNDS + math.ceil(math.log(IDLE_MAX_FACTOR, IDLE_GROWTH))
+MAX_ERROR_ROUNDS = 32
+
+
+class SyncScheduler:
+    """计算同步循环每一轮的等待时间
+
+    有内容变化后短时间内快速轮询，空闲时按倍数逐渐放慢，出错时指数退避，
+    所有间隔都加入随机抖动，避免大量客户端在服务器恢复后同时请求。
+    服务器返回Retry-After时至少等待到指定时间。
+    """
+
+    def __init__(self, rng=None):
+        self.rng = rng or random.random
+        self.errors = 0  # 连续出错的轮数
+        self.idle_rounds = FAST_ROUNDS - 1  # 启动时从同步间隔开始
+        self.active = False
+        self.failed = False
+        self.not_before = 0.0
+
+    def record_activity(self):
+        """本轮有内容上传或下载"""
+        self.active = True
+
+    def record_failure(self):
+        """本轮请求失败"""
+        self.failed = True
+
+    def retry_after(self, seconds):
+        """服务器要求至少等待seconds秒后再请求"""
+        self.not_before = max(self.not_before, time.monotonic() + seconds)
+
+    def reset(self):
+        self.errors = 0
+        self.failed = False
+
+    def next_delay(self, base_interval):
+        """结束本轮并返回下一轮之前的等待时间（秒）"""
+        if self.failed:
+            self.errors = min(self.errors + 1, MAX_ERROR_ROUNDS)
+            delay = min(MAX_BACKOFF, base_interval * 2 ** self.errors)
+            # 一半固定一半随机，既保证退避又分散重试时间
+            delay = delay / 2 + self.rng() * delay / 2
+        else:
+            self.errors = 0
+            self.idle_rounds = 0 if self.active else min(self.idle_rounds + 1, MAX_IDLE_ROUNDS)
+            if self.idle_rounds < FAST_ROUNDS:
+                delay = min(FAST_INTERVAL, base_interval)
+            else:
+                delay = min(
+                    base_interval * IDLE_MAX_FACTOR,
+                    base_interval * IDLE_GROWTH ** (self.idle_rounds - FAST_ROUNDS)
+                )
+            delay *= 1 - JITTER + 2 * JITTER * self.rng()
+        self.active = self.failed = False
+
+        wait = self.not_before - time.monotonic()
+        if wait > delay:
+            delay = wait + self.rng() * min(base_interval, wait)
+        return delay
+
+
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），返回需要等待的秒数，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
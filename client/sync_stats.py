@@ -0,0 +1,146 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+MAX_SAMPLES = 1000  # 每个阶段保留的最近样本数，百分位数按这些样本计算
+MAX_PENDING_ECHOES = 100  # 等待服务器回传的已上传条目数，以及先于上传响应收到的回传数
+PERCENTILES = (50, 95, 99)
+# 路径中这些段之后的一段是ID，按同一个请求阶段统计
+ID_PARENTS = ('clients', 'commands', 'blobs', 'uploads', 'simulate_typing')
+
+# 阶段名称，用于输出
+STAGE_NAMES = {
+    'tick': '同步循环一轮',
+    'clipboard_read': '读取剪贴板',
+    'clipboard_poll': '轮询读取剪贴板',
+    'clipboard_write': '写入剪贴板',
+    'upload': '上传内容',
+    'replay': '补发离线内容',
+    'poll': '轮询服务器',
+    'download': '下载内容',
+    'json_decode': 'JSON解析',
+    'commands': '获取指令',
+    'typing': '模拟输入',
+    'copy_to_visible': '复制到可见'
+}
+
+
+def percentile(sorted_values, p):
+    """最近秩法，sorted_values不能为空"""
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def pad(text, width):
+    """左对齐到指定显示宽度，中文字符占两列"""
+    used = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    return text + ' ' * max(1, width - used)
+
+
+def request_stage(method, url):
+    """HTTP请求的阶段名，路径中的ID替换为<id>，例如 http GET /api/blobs/<id>"""
+    parts = urlsplit(url).path.strip('/').split('/')
+    for i, part in enumerate(parts):
+        if part.isdigit() or (i > 0 and parts[i - 1] in ID_PARENTS):
+            parts[i] = '<id>'
+    return f"http {method} /{'/'.join(parts)}"
+
+
+class SyncStats:
+    """客户端各阶段耗时的统计，每个阶段只保留最近max_samples个样本
+
+    复制到可见的延迟不依赖两台设备的时钟：上传成功后记下服务器分配的剪贴板ID，
+    推送或轮询收到同一ID时，从检测到复制到此时的耗时即其他设备最早能看到内容的延迟。
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.samples = {}  # 阶段 -> 最近的耗时（秒）
+        self.counts = {}  # 阶段 -> 累计次数
+        self.pending_echoes = OrderedDict()  # 剪贴板ID -> 检测到复制的时间（time.monotonic）
+        self.early_echoes = OrderedDict()  # 推送先于上传响应到达时：剪贴板ID -> 收到的时间
+        self.started = time.monotonic()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(seconds)
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def timer(self, stage):
+        """记录with块的耗时，块内抛出异常时也记录"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started)
+
+    def expect_echo(self, clip_id, copied_at):
+        """记录上传成功的剪贴板ID，copied_at为检测到复制的time.monotonic()"""
+        if clip_id is None or copied_at is None:
+            return
+        with self.lock:
+            received_at = self.early_echoes.pop(clip_id, None)
+            if received_at is None:
+                self.pending_echoes[clip_id] = copied_at
+                while len(self.pending_echoes) > MAX_PENDING_ECHOES:
+                    self.pending_echoes.popitem(last=False)
+                return
+        self.record('copy_to_visible', received_at - copied_at)
+
+    def receive_echo(self, clip_id):
+        """服务器推送或返回了剪贴板条目，是本机上传的则记录复制到可见的延迟"""
+        now = time.monotonic()
+        with self.lock:
+            copied_at = self.pending_echoes.pop(clip_id, None)
+            if copied_at is None:
+                # 可能是其他设备的内容，也可能推送比上传响应先到
+                self.early_echoes[clip_id] = now
+                while len(self.early_echoes) > MAX_PENDING_ECHOES:
+                    self.early_echoes.popitem(last=False)
+                return
+        self.record('copy_to_visible', now - copied_at)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.pending_echoes.clear()
+            self.early_echoes.clear()
+            self.started = time.monotonic()
+
+    def summary(self):
+        """返回 {阶段: {'count', 'p50', 'p95', 'p99', 'max'}}，耗时单位为秒"""
+        with self.lock:
+            items = [(stage, sorted(samples), self.counts[stage]) for stage, samples in self.samples.items()]
+        result = {}
+        for stage, values, count in sorted(items):
+            entry = {'count': count}
+            for p in PERCENTILES:
+                entry[f'p{p}'] = percentile(values, p)
+            entry['max'] = values[-1]
+            result[stage] = entry
+        return result
+
+    def format_summary(self):
+        """格式化为文本表格，耗时单位为毫秒"""
+        summary = self.summary()
+        if not summary:
+            return '暂无统计数据'
+        headers = ''.join(f"{f'p{p}':>10}" for p in PERCENTILES)
+        lines = [
+            f"统计时长 {time.monotonic() - self.started:.0f} 秒，最近 {self.max_samples} 次样本（毫秒）",
+            f"{pad('阶段', 40)}{'次数':>6}{headers}{'最大':>8}"
+        ]
+        for stage, entry in summary.items():
+            name = STAGE_NAMES.get(stage, stage)
+            values = ''.join(f"{entry[f'p{p}'] * 1000:>10.1f}" for p in PERCENTILES)
+            lines.append(f"{pad(name, 40)}{entry['count']:>8}{values}{entry['max'] * 1000:>10.1f}")
+        return '\n'.join(lines)
@@ -0,0 +1,25 @@
+from sync_scheduler import SyncScheduler, IDLE_MAX_FACTOR, MAX_BACKOFF
+
+
+def test_idle_delay_stays_capped_after_long_idle():
+    # 2秒间隔空闲约8小时以上，间隔停在最大值且不会溢出
+    scheduler = SyncScheduler(rng=lambda: 0.5)
+    for _ in range(20000):
+        delay = scheduler.next_delay(2)
+    assert delay == 2 * IDLE_MAX_FACTOR
+
+
+def test_activity_after_long_idle_polls_fast_again():
+    scheduler = SyncScheduler(rng=lambda: 0.5)
+    for _ in range(5000):
+        scheduler.next_delay(2)
+    scheduler.record_activity()
+    assert scheduler.next_delay(2) == 0.5
+
+
+def test_backoff_stays_capped_after_many_failures():
+    scheduler = SyncScheduler(rng=lambda: 1.0)
+    for _ in range(5000):
+        scheduler.record_failure()
+        delay = scheduler.next_delay(2)
+    assert delay == MAX_BACKOFF
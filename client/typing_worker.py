@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TYPING_CHUNK_SIZE = 20  # 每次连续输入的字符数，两块之间检查是否已取消
+START_DELAY = 1.0  # 开始输入前留给用户切换窗口的时间（秒）
+PROGRESS_INTERVAL = 0.5  # 两次进度报告之间的最小间隔（秒）
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+STATE_NAMES = {QUEUED: '已排队', RUNNING: '正在输入', COMPLETED: '已完成', CANCELLED: '已取消', FAILED: '失败'}
+
+
+class TypingJob:
+    """一次模拟输入任务，cancelled事件即取消令牌；source为server时来自服务器下发的指令"""
+
+    def __init__(self, content, speed, command_id=None, delay=None, source='local'):
+        self.content = content
+        self.speed = speed
+        self.command_id = command_id or str(uuid.uuid4())
+        self.delay = START_DELAY if delay is None else delay
+        self.source = source
+        self.cancelled = threading.Event()
+        self.state = QUEUED
+        self.typed = 0
+        self.error = None
+        self.started = None  # 开始输入和结束的时间（time.monotonic），用于统计耗时
+        self.finished = None
+
+    @property
+    def total(self):
+        return len(self.content)
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+def pyautogui_write(text, interval):
+    import pyautogui
+    pyautogui.write(text, interval=interval)
+
+
+class TypingWorker:
+    """在独立线程中按顺序执行模拟输入任务
+
+    内容按块输入，每块之间检查取消令牌，长内容也能随时停止，且不会阻塞同步线程和Qt主线程。
+    进度通过on_progress(job)回调报告，回调在工作线程中执行，运行中最多每PROGRESS_INTERVAL秒一次，
+    状态变化时总会报告。
+    """
+
+    def __init__(self, on_progress=None, write=pyautogui_write, chunk_size=TYPING_CHUNK_SIZE):
+        self.on_progress = on_progress
+        self.write = write
+        self.chunk_size = chunk_size
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = {}  # 命令ID -> 未完成的任务，用于按ID取消
+        self.thread = None
+
+    def submit(self, content, speed, command_id=None, delay=None, source='local'):
+        """加入输入队列并立即返回任务"""
+        job = TypingJob(content, speed, command_id, delay, source)
+        with self.lock:
+            self.pending[job.command_id] = job
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.report(job)
+        self.jobs.put(job)
+        return job
+
+    def cancel(self, command_id=None):
+        """取消指定任务；未指定时取消正在执行和排队中的全部任务，返回取消的任务数"""
+        with self.lock:
+            if command_id is None:
+                jobs = list(self.pending.values())
+            else:
+                jobs = [self.pending[command_id]] if command_id in self.pending else []
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    @property
+    def busy(self):
+        with self.lock:
+            return bool(self.pending)
+
+    def stop(self):
+        self.cancel()
+        self.jobs.put(None)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=3)
+        self.thread = None
+
+    def report(self, job):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(job)
+        except Exception as e:
+            logger.warning("报告模拟输入进度失败: %s", e)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                self.execute(job)
+            finally:
+                job.finished = time.monotonic()
+                with self.lock:
+                    self.pending.pop(job.command_id, None)
+                self.report(job)
+
+    def execute(self, job):
+        if job.cancelled.is_set():
+            job.state = CANCELLED
+            return
+        job.state = RUNNING
+        self.report(job)
+        # 等待期间也可以取消
+        if job.cancelled.wait(job.delay):
+            job.state = CANCELLED
+            return
+        interval = job.speed / 1000.0
+        job.started = last_report = time.monotonic()
+        try:
+            while job.typed < job.total:
+                if job.cancelled.is_set():
+                    job.state = CANCELLED
+                    return
+                chunk = job.content[job.typed:job.typed + self.chunk_size]
+                self.write(chunk, interval)
+                job.typed += len(chunk)
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    self.report(job)
+        except Exception as e:
+            # pyautogui的FailSafeException（鼠标移到屏幕角落）也在这里结束任务
+            job.state = FAILED
+            job.error = str(e)
+            logger.error("模拟输入过程中出错: %s", e)
+            return
+        job.state = COMPLETED
@@ -0,0 +1,91 @@
+"""客户端和服务端共用的日志配置：日志级别、text或json格式、重复警告限流"""
+import json
+import logging
+import os
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+RATE_LIMIT_INTERVAL = 60  # 相同的警告和错误在该时间内只输出一次（秒）
+
+
+class RateLimitFilter(logging.Filter):
+    """WARNING及以上级别按消息模板限流
+
+    服务器不可用时每轮轮询都会失败，相同模板的消息在interval秒内只输出第一条，
+    之后再输出时由格式化器附带期间省略的条数（record.suppressed）。按未格式化的模板判断，
+    异常内容不同也视为同一条。不修改record.msg，同一条日志的其他处理器不受影响。
+    """
+
+    def __init__(self, interval=RATE_LIMIT_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_emitted = {}  # (日志器, 模板) -> (上次输出时间, 之后省略的条数)
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.interval <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            emitted_at, suppressed = self.last_emitted.get(key, (None, 0))
+            if emitted_at is not None and now - emitted_at < self.interval:
+                self.last_emitted[key] = (emitted_at, suppressed + 1)
+                return False
+            self.last_emitted[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式，消息后附带限流省略的条数"""
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f"（此前省略{suppressed}条相同消息）"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，便于journald等日志系统检索"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_handler = None
+
+
+def setup_logging(level='INFO', fmt='text', rate_limit=RATE_LIMIT_INTERVAL):
+    """配置根日志器，可重复调用以应用新的设置，gunicorn的访问日志不受影响
+
+    环境变量CLIPSYNC_LOG_LEVEL和CLIPSYNC_LOG_FORMAT优先于参数，fmt为text或json。
+    """
+    global _handler
+    level = str(os.environ.get('CLIPSYNC_LOG_LEVEL', level or 'INFO')).upper()
+    fmt = os.environ.get('CLIPSYNC_LOG_FORMAT', fmt or 'text')
+    if not isinstance(logging.getLevelName(level), int):
+        level = 'INFO'
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter(LOG_FORMAT))
+    _handler.addFilter(RateLimitFilter(rate_limit))
+    root.addHandler(_handler)
+    root.setLevel(level)
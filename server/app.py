@@ -1,24 +1,107 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, render_template, session, Response, send_file, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-from datetime import datetime
+import sys
+import argparse
+import time
+from datetime import timedelta
 import json
+import hashlib
+import logging
+from collections import Counter
 import threading
+import itertools
 import uuid
+import queue
+from notifier import ClipboardNotifier
+from clip_cache import ClipCache
+from migrations import init_database, head_version
+from config import load_config, load_secret_key, engine_options, sqlite_pragmas
+from compression import init_compression
+from blob_store import BlobStore
+# 日志配置与客户端共用，位于仓库根目录的common目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from logging_setup import setup_logging
+from metrics import Registry, SIZE_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from storage import (Storage, MemoryStorage, StorageBusy, UserRecord, ClientRecord, BlobRecord, BatchResult,
+                     BLOB_STORAGE_DB, BLOB_STORAGE_FILE, get_current_time, format_time, epoch_ms, blob_content)
+from sqlite_storage import ShardedSQLiteStorage
+from notify_bus import LocalBus, create_bus
+from auth_tokens import TokenCache, TokenSession, TokenSessionInterface, new_token, hash_token
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
-app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///clipboard.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+load_config(app)
 
 CORS(app)
-db = SQLAlchemy(app)
+# 数据库在create_app中绑定，以便在初始化前应用配置
+db = SQLAlchemy()
+
+# 剪贴板变更推送通知器，写请求通过总线发布，各工作进程的总线再交给本进程的缓存和通知器
+notifier = ClipboardNotifier()
+STREAM_HEARTBEAT_INTERVAL = 15  # 推送连接心跳间隔（秒）
+STREAM_RETRY_MS = 3000  # 断线后浏览器重连间隔（毫秒）
+
+# 每个用户最近剪贴板内容的内存缓存，轮询最新内容时无需查询数据库
+clip_cache = ClipCache()
+
+# (用户ID, 客户端ID) -> 是否可能有未完成的指令：False表示没有，轮询时无需查询数据库；
+# 整数表示收到过新指令的通知，未记录的客户端查询一次数据库后记录
+command_hints = {}
+command_hint_lock = threading.Lock()
+command_hint_seq = itertools.count(1)
+# 本进程是否能收到所有工作进程的写入事件，多进程只在进程内分发时为False，不使用上面的缓存
+events_complete = True
+
+# 总线交给本进程的事件：其他工作进程的写入先更新本进程的缓存，再交给推送连接
+def deliver_event(user_id, event, data):
+    if event == 'clip':
+        clip_cache.add(user_id, data)
+    elif event == 'delete':
+        clip_cache.remove(user_id, data['ids'])
+    elif event == 'command':
+        with command_hint_lock:
+            command_hints[(user_id, data['client_id'])] = next(command_hint_seq)
+    notifier.publish(user_id, event, data)
+
+# 连上通知代理时清空依赖总线事件的缓存，断开期间其他进程的写入不会送达
+def reset_shared_caches():
+    clip_cache.clear()
+    with command_hint_lock:
+        command_hints.clear()
+
+bus = LocalBus(deliver_event)
+
+# 客户端访问令牌的查询缓存，带令牌的请求无需每次查询数据库
+token_cache = TokenCache()
+
+# 分块上传的内容保存在磁盘上，目录在create_app中根据配置设置
+blob_store = BlobStore()
+
+# 用户、剪贴板记录和客户端的存储，在create_app中根据STORAGE_ENGINE创建
+storage = None
 
-# 使用本地时间而不是UTC时间
-def get_current_time():
-    return datetime.now()
+# /metrics输出的运行指标，按路由规则统计，路径参数不会产生新的标签值
+metrics = Registry()
+request_count = metrics.counter('clipsync_http_requests_total', '按路由和状态码统计的请求数', ('method', 'route', 'status'))
+request_latency = metrics.histogram('clipsync_http_request_duration_seconds', '请求处理耗时', ('method', 'route'))
+request_size = metrics.histogram('clipsync_http_request_size_bytes', '请求体大小', ('route',), SIZE_BUCKETS)
+response_size = metrics.histogram('clipsync_http_response_size_bytes', '响应体大小（压缩后），流式响应不统计', ('route',), SIZE_BUCKETS)
+query_count = metrics.counter('clipsync_db_queries_total', '数据库语句数', ('operation',))
+query_latency = metrics.histogram('clipsync_db_query_duration_seconds', '数据库语句耗时', ('operation',))
+trimmed_count = metrics.counter('clipsync_clips_trimmed_total', '超出历史条数上限被删除的剪贴板记录数')
+stream_rejected_count = metrics.counter('clipsync_stream_rejected_total', '推送连接数达到上限被拒绝的推送请求数')
+ACTIVE_SESSION_WINDOW = 300  # 最近该时间内有请求的登录用户计为活跃会话（秒）
+active_users = {}  # user_id -> 最近请求时间
+
+_initialized = False
+_init_lock = threading.Lock()
 
 # 添加ping接口用于连接测试
 @app.route('/api/ping', methods=['GET'])
@@ -38,28 +121,691 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# 剪贴板内容块模型，相同内容按SHA-256只保存一份
+class ClipboardBlob(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.Text, nullable=False)  # 内容保存在磁盘上时为空字符串
+    size = db.Column(db.Integer, nullable=False)  # UTF-8编码后的字节数
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=get_current_time)
+    storage = db.Column(db.String(10), nullable=False, default=BLOB_STORAGE_DB)  # db或file
+    mimetype = db.Column(db.String(100))
+
+# 未完成的分块上传，已上传的字节数以磁盘上临时文件的大小为准
+class ClipboardUpload(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content_type = db.Column(db.String(20), default='text')
+    mimetype = db.Column(db.String(100))
+    size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64))  # 客户端声明的哈希，提交时校验
+    created_at = db.Column(db.DateTime, default=get_current_time, index=True)
+
 # 剪贴板内容模型
 class ClipboardItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(db.Text, nullable=False)  # 内容保存在内容块中时为空字符串
     content_type = db.Column(db.String(20), default='text')  # text, image, etc.
-    timestamp = db.Column(db.DateTime, default=get_current_time)  # 使用本地时间
+    timestamp = db.Column(db.DateTime, default=get_current_time)  # UTC时间
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    blob_hash = db.Column(db.String(64), db.ForeignKey('clipboard_blob.hash'))
+    
+    blob = db.relationship('ClipboardBlob', lazy='joined')
+    
+    # 索引名称需与migrations.py中的迁移保持一致；ID只增不减（SQLite的AUTOINCREMENT），
+    # 删除最新记录后新记录不会重用其ID，ETag和since_id游标依赖这一点
+    __table_args__ = (
+        db.Index('ix_clipboard_item_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_clipboard_item_user_id_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
 
 # 客户端连接模型
 class ClientConnection(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.String(100), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    last_seen = db.Column(db.DateTime, default=get_current_time)  # 使用本地时间
+    last_seen = db.Column(db.DateTime, default=get_current_time)  # UTC时间
     is_online = db.Column(db.Boolean, default=True)
     name = db.Column(db.String(100))  # 新增客户端名称字段
     
     user = db.relationship('User', backref=db.backref('clients', lazy=True))
+    
+    # client_id的唯一索引已覆盖按(client_id, user_id)的查询
+    __table_args__ = (
+        db.Index('ix_client_connection_user_online', 'user_id', 'is_online'),
+    )
+
+# 发送给指定客户端的指令，客户端确认后才执行，超过有效期仍未确认的不再下发
+COMMAND_PENDING = 'pending'
+COMMAND_DELIVERED = 'delivered'
+COMMAND_ACKED = 'acked'
+COMMAND_EXPIRED = 'expired'
+# 模拟输入的进度状态：服务端创建指令时记为sent，之后为客户端报告的状态
+TYPING_STATES = ('queued', 'running', 'completed', 'cancelled', 'failed')
+TYPING_FINAL_STATES = ('completed', 'cancelled', 'failed')
+
+class ClientCommand(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    command_id = db.Column(db.String(36), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_id = db.Column(db.String(100), nullable=False)
+    action = db.Column(db.String(30), nullable=False)  # simulate_typing
+    payload = db.Column(db.Text, nullable=False)  # JSON格式的指令参数
+    state = db.Column(db.String(20), nullable=False, default=COMMAND_PENDING)
+    created_at = db.Column(db.DateTime, default=get_current_time)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    delivered_at = db.Column(db.DateTime)
+    acked_at = db.Column(db.DateTime)
+    # 模拟输入进度和取消标记保存在指令中，网页端和客户端的请求落到不同工作进程时也一致
+    progress_state = db.Column(db.String(20), nullable=False, default='sent')
+    typed = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    
+    # 索引名称需与migrations.py中的迁移保持一致
+    __table_args__ = (
+        db.Index('ix_client_command_client_state', 'client_id', 'state'),
+        db.Index('ix_client_command_created_at', 'created_at'),
+    )
+
+# 键值设置：instance_id为sqlalchemy存储数据的标识，active_storage为令牌、指令和上传所属存储数据的标识
+class StorageMeta(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100), nullable=False)
+
+# 客户端访问令牌，只保存令牌的SHA-256，撤销时删除记录
+class AuthToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    client_id = db.Column(db.String(100))  # 删除客户端时撤销该客户端的令牌
+    created_at = db.Column(db.DateTime, default=get_current_time)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    # 索引名称需与migrations.py中的迁移保持一致
+    __table_args__ = (
+        db.Index('ix_auth_token_client_id', 'client_id'),
+        db.Index('ix_auth_token_expires_at', 'expires_at'),
+    )
+
+def create_app(config=None):
+    """应用工厂：合并配置、初始化数据库并返回app，每个进程只初始化一次"""
+    global _initialized, storage, bus, events_complete
+    with _init_lock:
+        if _initialized:
+            return app
+        if config:
+            app.config.update(config)
+        setup_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'], app.config['LOG_RATE_LIMIT'])
+        if not app.config.get('SECRET_KEY'):
+            app.config['SECRET_KEY'] = load_secret_key(app.instance_path)
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+        blob_store.root = app.config['BLOB_STORE_PATH'] or os.path.join(app.instance_path, 'blobs')
+        
+        clip_cache.max_users = app.config['CLIP_CACHE_MAX_USERS']
+        clip_cache.max_bytes = app.config['CLIP_CACHE_MAX_BYTES']
+        clip_cache.window = app.config['CLIPBOARD_HISTORY_LIMIT']
+        token_cache.max_entries = app.config['TOKEN_CACHE_MAX_ENTRIES']
+        token_cache.ttl = app.config['TOKEN_CACHE_TTL']
+        init_compression(app)
+        db.init_app(app)
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                event.listen(db.engine, 'connect', set_sqlite_pragmas)
+            event.listen(db.engine, 'before_cursor_execute', start_query_timer)
+            event.listen(db.engine, 'after_cursor_execute', record_query_metrics)
+            event.listen(db.engine, 'handle_error', discard_query_timer)
+            # 创建数据库表并执行未应用的迁移
+            init_database(db)
+            storage = create_storage(app.config)
+            claim_storage(storage)
+        bus = create_notify_bus(app.config)
+        # 多进程部署时其他进程的写入通过总线更新本进程的缓存，只在进程内分发时无法保持一致，关闭缓存
+        if app.config['MULTIPROCESS'] and bus.name == 'local':
+            app.config['CLIP_CACHE_ENABLED'] = False
+            events_complete = False
+        _initialized = True
+    return app
+
+def create_storage(config):
+    engine = config['STORAGE_ENGINE']
+    limit = config['CLIPBOARD_HISTORY_LIMIT']
+    if engine == 'sqlalchemy':
+        result = SQLAlchemyStorage(limit)
+    elif engine == 'memory':
+        result = MemoryStorage(limit)
+    elif engine == 'sharded':
+        path = config['STORAGE_SHARD_PATH'] or os.path.join(app.instance_path, 'shards')
+        result = ShardedSQLiteStorage(path, config['STORAGE_SHARDS'], limit, sqlite_pragmas(config), config['SQLITE_BUSY_TIMEOUT'])
+    else:
+        raise ValueError(f"未知的存储引擎: {engine}")
+    if config['MULTIPROCESS'] and not result.multiprocess:
+        raise ValueError(f"存储引擎{engine}的数据不能在多个工作进程之间共享，请使用单个工作进程")
+    result.file_released = delete_blob_files
+    return result
+
+def storage_meta(key, default):
+    # 读取键值，不存在时写入default；多个工作进程同时启动时以先写入的为准
+    db.session.execute(sqlite_insert(StorageMeta).values(key=key, value=default).on_conflict_do_nothing())
+    db.session.commit()
+    return db.session.get(StorageMeta, key).value
+
+def claim_storage(active):
+    # 令牌、客户端指令和分块上传按用户ID保存在本数据库中，存储数据重建（memory每次启动）或更换
+    # 存储引擎后用户ID会重新分配，删除这些记录，避免原用户的令牌落到ID相同的新用户上
+    claimed = storage_meta('active_storage', active.instance_id)
+    if claimed == active.instance_id:
+        return
+    logger.warning("存储数据已更换为%s，删除原有的访问令牌、客户端指令和分块上传", active.name)
+    uploads = db.session.execute(db.select(ClipboardUpload.id)).scalars().all()
+    db.session.execute(db.delete(AuthToken))
+    db.session.execute(db.delete(ClientCommand))
+    db.session.execute(db.delete(ClipboardUpload))
+    db.session.get(StorageMeta, 'active_storage').value = active.instance_id
+    db.session.commit()
+    for upload_id in uploads:
+        blob_store.discard_upload(upload_id)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas(app.config):
+        cursor.execute(pragma)
+    cursor.close()
 
-# 创建数据库表
-with app.app_context():
-    db.create_all()
+def create_notify_bus(config):
+    # 多进程部署时其他工作进程的写入不会经过本进程的通知器，需要通过总线转发
+    kind = config['NOTIFY_BUS']
+    if kind == 'auto':
+        kind = 'unix' if config['MULTIPROCESS'] else 'local'
+    path = config['NOTIFY_SOCKET_PATH'] or os.path.join(app.instance_path, 'notify.sock')
+    return create_bus(kind, deliver_event, path, on_connect=reset_shared_caches)
+
+# 手动升级数据库: flask --app app upgrade-db
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    create_app()
+    print(f"数据库已是最新版本 {head_version()}")
+
+def serialize_clip(clip, content=None, size=None):
+    # 新写入的记录由调用方直接传入内容和大小，避免再次加载内容块
+    if size is None:
+        if clip.blob_hash:
+            content, size = blob_content(clip.blob), clip.blob.size
+        else:
+            content, size = clip.content, len(clip.content.encode('utf-8'))
+    return {
+        'id': clip.id,
+        'content': content,
+        'content_type': clip.content_type,
+        'content_hash': clip.blob_hash,
+        'size': size,
+        'timestamp': format_time(clip.timestamp),
+        'timestamp_ms': epoch_ms(clip.timestamp)
+    }
+
+def clip_meta(data):
+    # 只包含摘要不含内容，客户端摘要不同时再通过/api/blobs/<hash>下载内容
+    if not data.get('content_hash'):
+        return data  # 未保存为内容块的旧记录仍返回内容
+    meta = dict(data)
+    del meta['content']
+    return meta
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def acquire_blob(content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None):
+    # 一条语句完成插入或引用计数加一，多个设备同时上传相同内容时也不会冲突
+    stmt = sqlite_insert(ClipboardBlob).values(
+        hash=digest,
+        content=content,
+        size=size,
+        ref_count=1,
+        created_at=get_current_time(),
+        storage=storage,
+        mimetype=mimetype
+    ).on_conflict_do_update(
+        index_elements=['hash'],
+        set_={'ref_count': ClipboardBlob.ref_count + 1}
+    )
+    db.session.execute(stmt)
+
+def acquire_blobs(contents):
+    # 批量写入时每个不同内容只执行一次插入或计数累加，contents为[(内容, 摘要, 大小)]
+    counts = Counter(digest for _, digest, _ in contents)
+    rows = {
+        digest: {
+            'hash': digest,
+            'content': content,
+            'size': size,
+            'ref_count': counts[digest],
+            'created_at': get_current_time(),
+            'storage': BLOB_STORAGE_DB,
+            'mimetype': None
+        }
+        for content, digest, size in contents
+    }
+    stmt = sqlite_insert(ClipboardBlob)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['hash'],
+            set_={'ref_count': ClipboardBlob.ref_count + stmt.excluded.ref_count}
+        ),
+        list(rows.values())
+    )
+
+def reference_blob(digest):
+    # 客户端只发送哈希时使用：服务器已有该内容则增加引用并返回内容块，否则返回None
+    blob = db.session.get(ClipboardBlob, digest)
+    if blob is None:
+        return None
+    db.session.execute(
+        db.update(ClipboardBlob).where(ClipboardBlob.hash == digest).values(ref_count=ClipboardBlob.ref_count + 1)
+    )
+    return blob
+
+def release_blobs(digests):
+    # 被删除记录引用的内容块计数减一，不再被引用的内容块一并删除，返回其中保存在磁盘上的摘要
+    counts = Counter(digest for digest in digests if digest)
+    if not counts:
+        return []
+    db.session.execute(
+        db.update(ClipboardBlob).where(ClipboardBlob.hash.in_(list(counts))).values(
+            ref_count=ClipboardBlob.ref_count - db.case(counts, value=ClipboardBlob.hash)
+        ).execution_options(synchronize_session=False)
+    )
+    unused = db.and_(ClipboardBlob.hash.in_(list(counts)), ClipboardBlob.ref_count <= 0)
+    if db.engine.dialect.delete_returning:
+        orphaned = db.session.execute(
+            db.delete(ClipboardBlob).where(unused).returning(ClipboardBlob.hash, ClipboardBlob.storage)
+            .execution_options(synchronize_session=False)
+        ).all()
+    else:
+        orphaned = db.session.execute(db.select(ClipboardBlob.hash, ClipboardBlob.storage).where(unused)).all()
+        db.session.execute(db.delete(ClipboardBlob).where(unused).execution_options(synchronize_session=False))
+    # 磁盘上的文件由调用方在事务提交后删除，回滚时保留
+    return [row.hash for row in orphaned if row.storage == BLOB_STORAGE_FILE]
+
+def delete_blob_files(digests):
+    # 提交后其他请求可能又上传了相同内容，只删除仍然没有记录的文件
+    digests = set(digests)
+    for digest in digests - storage.existing_blobs(digests):
+        blob_store.delete(digest)
+
+def get_recent_clips(user_id):
+    # 返回(最近内容列表, 是否为完整历史)，优先读取缓存，未命中时从数据库加载一次；
+    # 缓存关闭或暂时收不到其他进程的写入（未连上通知代理）时返回空的不完整列表，
+    # 调用方只查询需要的记录，不必每次加载window+1条完整内容
+    if not app.config['CLIP_CACHE_ENABLED'] or not bus.ready():
+        return (), False
+    cached = clip_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    token = clip_cache.begin_load(user_id)
+    try:
+        clips = storage.recent_clips(user_id, clip_cache.window + 1)
+        clip_cache.store(user_id, clips, token)
+    finally:
+        clip_cache.end_load(user_id)
+    return tuple(clips[:clip_cache.window]), len(clips) <= clip_cache.window
+
+def get_latest_clip(user_id):
+    # 返回最新的一条内容，没有内容时返回None
+    clips, complete = get_recent_clips(user_id)
+    if clips or complete:
+        return clips[0] if clips else None
+    clips = storage.recent_clips(user_id, 1)
+    return clips[0] if clips else None
+
+def trim_clipboard_history(user_id, limit):
+    # 一条语句删除超出上限的全部旧记录，与插入在同一事务中执行，多设备并发写入时也不会超出上限；
+    # 返回被删除的(id, blob_hash)，内容块由调用方释放
+    newest = db.select(ClipboardItem.id).where(
+        ClipboardItem.user_id == user_id
+    ).order_by(ClipboardItem.timestamp.desc(), ClipboardItem.id.desc()).limit(limit)
+    excess = db.and_(
+        ClipboardItem.user_id == user_id,
+        ClipboardItem.id.not_in(newest.scalar_subquery())
+    )
+    return delete_clips(excess)
+
+def delete_clips(condition):
+    # 删除符合条件的记录并返回(id, blob_hash)，内容块由调用方释放
+    # 支持RETURNING时一条语句完成，否则先查询再按ID删除
+    if db.engine.dialect.delete_returning:
+        return db.session.execute(
+            db.delete(ClipboardItem).where(condition).returning(ClipboardItem.id, ClipboardItem.blob_hash)
+            .execution_options(synchronize_session=False)
+        ).all()
+    rows = db.session.execute(db.select(ClipboardItem.id, ClipboardItem.blob_hash).where(condition)).all()
+    if rows:
+        db.session.execute(
+            db.delete(ClipboardItem).where(ClipboardItem.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+    return rows
+
+def client_record(client):
+    return ClientRecord(client.client_id, client.user_id, client.name, client.last_seen, client.is_online)
+
+class SQLAlchemyStorage(Storage):
+    """使用上面的模型保存在SQLALCHEMY_DATABASE_URI指定的数据库中，每个写方法结束时提交db.session"""
+    name = 'sqlalchemy'
+    multiprocess = True
+    
+    def __init__(self, history_limit=20):
+        super().__init__(history_limit)
+        # 需要在应用上下文中创建
+        self.instance_id = storage_meta('instance_id', uuid.uuid4().hex)
+    
+    def create_user(self, username, password_hash):
+        if User.query.filter_by(username=username).first():
+            return None
+        user = User(username=username, password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    
+    def find_user(self, username):
+        user = User.query.filter_by(username=username).first()
+        return UserRecord(user.id, user.username, user.password_hash) if user else None
+    
+    def add_clip(self, user_id, content_type, content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None):
+        acquire_blob('' if content is None else content, digest, size, storage, mimetype)
+        return self.commit_clip(user_id, content_type, digest, content, size)
+    
+    def add_clip_by_hash(self, user_id, content_type, digest):
+        blob = reference_blob(digest)
+        if blob is None:
+            return None
+        return self.commit_clip(user_id, content_type, digest, blob_content(blob), blob.size)
+    
+    def commit_clip(self, user_id, content_type, digest, content, size):
+        # 添加引用内容块的新记录，并在同一事务中裁剪超出上限的历史记录
+        clip = ClipboardItem(content='', blob_hash=digest, content_type=content_type, user_id=user_id)
+        db.session.add(clip)
+        db.session.flush()
+        trimmed = trim_clipboard_history(user_id, self.history_limit)
+        files = release_blobs([row.blob_hash for row in trimmed])
+        # 提交前序列化，避免提交后属性过期而重新查询
+        data = serialize_clip(clip, content, size)
+        db.session.commit()
+        self.release_files(files)
+        return data, [row.id for row in trimmed]
+    
+    def apply_batch(self, user_id, inserts, deletes=(), clear=False):
+        deleted = []
+        if clear:
+            deleted = delete_clips(ClipboardItem.user_id == user_id)
+        elif deletes:
+            deleted = delete_clips(db.and_(ClipboardItem.user_id == user_id, ClipboardItem.id.in_(list(deletes))))
+        if inserts:
+            acquire_blobs([(content, digest, size) for _, content, digest, size in inserts])
+        
+        # 按提交顺序写入，后提交的内容ID更大、时间更新
+        clips = [
+            ClipboardItem(content='', blob_hash=digest, content_type=content_type, user_id=user_id)
+            for content_type, _, digest, _ in inserts
+        ]
+        db.session.add_all(clips)
+        db.session.flush()
+        trimmed = trim_clipboard_history(user_id, self.history_limit) if clips else []
+        # 被删除记录的内容块与裁剪的内容块一起释放
+        files = release_blobs([row.blob_hash for row in list(deleted) + list(trimmed)])
+        trimmed_ids = [row.id for row in trimmed]
+        trimmed_set = set(trimmed_ids)
+        added = [
+            serialize_clip(clip, content, size)
+            for clip, (_, content, _, size) in zip(clips, inserts)
+            if clip.id not in trimmed_set
+        ]
+        ids = [clip.id for clip in clips]
+        db.session.commit()
+        self.release_files(files)
+        return BatchResult(ids, added, [row.id for row in deleted], trimmed_ids)
+    
+    def delete_clip(self, user_id, clip_id):
+        rows = delete_clips(db.and_(ClipboardItem.user_id == user_id, ClipboardItem.id == clip_id))
+        files = release_blobs([row.blob_hash for row in rows])
+        db.session.commit()
+        self.release_files(files)
+        return bool(rows)
+    
+    def recent_clips(self, user_id, limit=None):
+        query = ClipboardItem.query.filter_by(user_id=user_id).order_by(
+            ClipboardItem.timestamp.desc(), ClipboardItem.id.desc()
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [serialize_clip(clip) for clip in query]
+    
+    def clips_after(self, user_id, clip_id):
+        clips = ClipboardItem.query.filter(
+            ClipboardItem.user_id == user_id,
+            ClipboardItem.id > clip_id
+        ).order_by(ClipboardItem.id.asc()).all()
+        return [serialize_clip(clip) for clip in clips]
+    
+    def clip_ids(self, user_id):
+        return [row.id for row in db.session.query(ClipboardItem.id).filter_by(user_id=user_id).order_by(
+            ClipboardItem.timestamp.desc(), ClipboardItem.id.desc()
+        )]
+    
+    def clip_version(self, user_id):
+        return tuple(db.session.query(
+            func.max(ClipboardItem.id), func.count(ClipboardItem.id)
+        ).filter(ClipboardItem.user_id == user_id).one())
+    
+    def get_blob(self, user_id, digest, check_owner=True):
+        if check_owner:
+            owned = ClipboardItem.query.filter_by(user_id=user_id, blob_hash=digest).first()
+            blob = owned.blob if owned else None
+        else:
+            blob = db.session.get(ClipboardBlob, digest)
+        return BlobRecord(blob.hash, blob.content, blob.size, blob.storage, blob.mimetype) if blob else None
+    
+    def existing_blobs(self, digests):
+        # 在事务提交后调用，使用独立的连接
+        with db.engine.connect() as conn:
+            return set(conn.execute(
+                db.select(ClipboardBlob.hash).where(ClipboardBlob.hash.in_(list(digests)))
+            ).scalars())
+    
+    def touch_client(self, client_id, user_id):
+        client = ClientConnection.query.filter_by(client_id=client_id).first()
+        if client:
+            client.last_seen = get_current_time()
+            client.is_online = True
+        else:
+            db.session.add(ClientConnection(client_id=client_id, user_id=user_id))
+        db.session.commit()
+    
+    def get_client(self, user_id, client_id):
+        client = ClientConnection.query.filter_by(client_id=client_id, user_id=user_id).first()
+        return client_record(client) if client else None
+    
+    def online_clients(self, user_id):
+        clients = ClientConnection.query.filter_by(user_id=user_id, is_online=True).all()
+        return [client_record(client) for client in clients]
+    
+    def rename_client(self, user_id, client_id, name):
+        client = ClientConnection.query.filter_by(client_id=client_id, user_id=user_id).first()
+        if not client:
+            return False
+        client.name = name
+        db.session.commit()
+        return True
+    
+    def delete_client(self, user_id, client_id):
+        client = ClientConnection.query.filter_by(client_id=client_id, user_id=user_id).first()
+        if not client:
+            return False
+        db.session.delete(client)
+        db.session.commit()
+        return True
+    
+    def count_online_clients(self):
+        return db.session.query(func.count(ClientConnection.id)).filter(ClientConnection.is_online.is_(True)).scalar()
+
+def publish_clip(user_id, data):
+    # 其他进程的事件可能晚于本进程更新的内容到达，推送连接跳过ID较小的内容
+    bus.publish(user_id, 'clip', data)
+
+def publish_delete(user_id, clip_ids):
+    # 只通知被删除的ID，网页端收到后重新加载列表
+    if clip_ids:
+        bus.publish(user_id, 'delete', {'ids': clip_ids})
+
+def publish_command(user_id, client_id):
+    # 只通知有新指令，客户端收到后通过/api/clients/<client_id>/commands获取
+    bus.publish(user_id, 'command', {'client_id': client_id})
+
+def clips_etag(user_id):
+    # 新增会增大最大ID，删除会减少条数，两者组合即可标识历史记录的状态
+    clips, complete = get_recent_clips(user_id)
+    if complete:
+        return f'{max((clip["id"] for clip in clips), default=0)}-{len(clips)}'
+    
+    max_id, count = storage.clip_version(user_id)
+    return f'{max_id or 0}-{count}'
+
+def etag_response(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def with_pending_commands(response, user_id):
+    # 轮询时带client_id参数的客户端从响应头得知待执行的指令数，没有指令时无需再请求指令接口
+    client_id = request.args.get('client_id')
+    if client_id:
+        response.headers['X-Pending-Commands'] = str(pending_command_count(user_id, client_id))
+    return response
+
+def pending_command_count(user_id, client_id):
+    # 内存中记录为没有未完成指令的客户端直接返回0，只在有指令（或尚未记录）时查询数据库
+    key = (user_id, client_id)
+    trusted = events_complete and bus.ready()
+    seen = command_hints.get(key)
+    if trusted and seen is False:
+        return 0
+    
+    now = get_current_time()
+    redeliver_before = now - timedelta(seconds=app.config['COMMAND_REDELIVER_AFTER'])
+    outstanding = db.session.query(ClientCommand.state, ClientCommand.delivered_at).filter(
+        ClientCommand.user_id == user_id,
+        ClientCommand.client_id == client_id,
+        ClientCommand.expires_at > now,
+        ClientCommand.state.in_((COMMAND_PENDING, COMMAND_DELIVERED))
+    ).all()
+    # 已下发未确认的指令之后还会重新下发，全部确认或过期后才记为没有指令；
+    # 查询期间收到新指令的通知时保留通知
+    if trusted and not outstanding:
+        with command_hint_lock:
+            if command_hints.get(key) == seen:
+                command_hints[key] = False
+    return sum(1 for state, delivered_at in outstanding
+               if state == COMMAND_PENDING or delivered_at <= redeliver_before)
+
+def format_sse(event, data, event_id=None):
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    # ensure_ascii保证数据中不含换行等分隔符
+    message += f'data: {json.dumps(data)}\n\n'
+    return message
+
+def count_active_sessions():
+    cutoff = time.monotonic() - ACTIVE_SESSION_WINDOW
+    for user_id, seen in list(active_users.items()):
+        if seen < cutoff:
+            active_users.pop(user_id, None)
+    return len(active_users)
+
+metrics.gauge('clipsync_active_sessions', f'最近{ACTIVE_SESSION_WINDOW}秒内有请求的登录用户数', callback=count_active_sessions)
+metrics.gauge('clipsync_online_clients', '在线状态的客户端数', callback=lambda: storage.count_online_clients())
+metrics.gauge('clipsync_stream_connections', '本进程的推送连接数', callback=lambda: notifier.subscriber_count())
+metrics.gauge('clipsync_clip_cache_users', '剪贴板缓存中的用户数', callback=lambda: clip_cache.stats()['users'])
+metrics.gauge('clipsync_clip_cache_bytes', '剪贴板缓存占用的内存（估算）', callback=lambda: clip_cache.stats()['bytes'])
+metrics.callback_counter('clipsync_clip_cache_hits_total', '剪贴板缓存命中次数', lambda: clip_cache.stats()['hits'])
+metrics.callback_counter('clipsync_clip_cache_misses_total', '剪贴板缓存未命中次数', lambda: clip_cache.stats()['misses'])
+metrics.callback_counter('clipsync_clip_cache_evictions_total', '剪贴板缓存淘汰的用户数', lambda: clip_cache.stats()['evictions'])
+metrics.callback_counter('clipsync_token_cache_hits_total', '令牌缓存命中次数', lambda: token_cache.stats()['hits'])
+metrics.callback_counter('clipsync_token_cache_misses_total', '令牌缓存未命中次数', lambda: token_cache.stats()['misses'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+# 会话Cookie只在登录时的那一份存储数据中有效，存储数据重建后原来的用户ID可能属于其他用户；
+# 令牌在存储数据更换时已由claim_storage删除
+@app.before_request
+def check_session_storage():
+    if isinstance(session, TokenSession):
+        return
+    if 'user_id' in session and session.get('storage_id') != storage.instance_id:
+        session.clear()
+
+# 在压缩之后执行（after_request按注册的相反顺序调用），响应大小为实际传输的字节数
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_count.inc(request.method, route, str(response.status_code))
+    request_latency.observe(time.perf_counter() - started, request.method, route)
+    if request.content_length is not None:
+        request_size.observe(request.content_length, route)
+    if not response.is_streamed and response.content_length is not None:
+        response_size.observe(response.content_length, route)
+    if 'user_id' in session:
+        active_users[session['user_id']] = time.monotonic()
+    return response
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def record_query_metrics(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+    query_count.inc(operation)
+    query_latency.observe(time.perf_counter() - started, operation)
+
+def discard_query_timer(exception_context):
+    # 执行失败的语句没有after_cursor_execute事件
+    stack = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+# 数据库繁忙（SQLite等待写锁超时）时返回503和Retry-After，客户端按指定时间退避后重试
+@app.errorhandler(OperationalError)
+def database_busy(error):
+    db.session.rollback()
+    message = str(error.orig).lower()
+    if 'locked' not in message and 'busy' not in message:
+        raise error
+    return busy_response()
+
+# 其他存储引擎等待写锁超时
+@app.errorhandler(StorageBusy)
+def storage_busy(error):
+    return busy_response()
+
+def busy_response():
+    response = jsonify({'error': '服务器繁忙，请稍后重试'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['BUSY_RETRY_AFTER'])
+    return response
 
 # 注册路由
 @app.route('/api/register', methods=['POST'])
@@ -71,15 +817,9 @@ def register():
     if not username or not password:
         return jsonify({'error': '用户名和密码不能为空'}), 400
     
-    if User.query.filter_by(username=username).first():
+    if storage.create_user(username, generate_password_hash(password)) is None:
         return jsonify({'error': '用户名已存在'}), 400
     
-    user = User(username=username)
-    user.set_password(password)
-    
-    db.session.add(user)
-    db.session.commit()
-    
     return jsonify({'message': '注册成功'}), 201
 
 # 登录路由
@@ -90,55 +830,208 @@ def login():
     password = data.get('password')
     client_id = data.get('client_id')
     
-    user = User.query.filter_by(username=username).first()
+    user = storage.find_user(username)
     
-    if not user or not user.check_password(password):
+    if not user or not check_password_hash(user.password_hash, password):
         return jsonify({'error': '用户名或密码错误'}), 401
     
     session['user_id'] = user.id
+    session['storage_id'] = storage.instance_id
     
     # 记录客户端连接
     if client_id:
-        # 检查是否已存在该客户端记录
-        client = ClientConnection.query.filter_by(client_id=client_id).first()
-        if client:
-            client.last_seen = get_current_time()
-            client.is_online = True
-        else:
-            client = ClientConnection(client_id=client_id, user_id=user.id)
-            db.session.add(client)
-        db.session.commit()
+        storage.touch_client(client_id, user.id)
     
     return jsonify({'message': '登录成功', 'user_id': user.id}), 200
 
+# 带Bearer令牌的请求按令牌确定用户，缓存未命中时按哈希查询数据库
+def lookup_token(token):
+    digest = hash_token(token)
+    user_id = token_cache.get(digest)
+    if user_id is not None:
+        return user_id
+    row = db.session.execute(
+        db.select(AuthToken.user_id, AuthToken.expires_at)
+        .where(AuthToken.token_hash == digest, AuthToken.expires_at > get_current_time())
+    ).first()
+    if row is None:
+        return None
+    token_cache.put(digest, row.user_id, epoch_ms(row.expires_at) / 1000)
+    return row.user_id
+
+app.session_interface = TokenSessionInterface(lookup_token)
+
+def issue_token(user_id, client_id):
+    # 调用方负责提交
+    token, digest = new_token()
+    now = get_current_time()
+    ttl = app.config['TOKEN_TTL']
+    record = AuthToken(
+        token_hash=digest,
+        user_id=user_id,
+        client_id=client_id,
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl)
+    )
+    db.session.add(record)
+    return {
+        'token': token,
+        'user_id': user_id,
+        'expires_at': format_time(record.expires_at),
+        'expires_at_ms': epoch_ms(record.expires_at),
+        # 客户端在有效期过半后刷新
+        'refresh_at_ms': epoch_ms(now + timedelta(seconds=ttl / 2))
+    }
+
+def expire_tokens():
+    # 删除已过期的令牌
+    db.session.execute(db.delete(AuthToken).where(AuthToken.expires_at <= get_current_time()))
+
+def revoke_tokens(condition):
+    # 同时提交调用方的修改，提交后再清除缓存，避免并发请求把刚删除的令牌重新放入缓存
+    digests = db.session.execute(db.select(AuthToken.token_hash).where(condition)).scalars().all()
+    db.session.execute(db.delete(AuthToken).where(condition))
+    db.session.commit()
+    token_cache.discard(digests)
+
+# 客户端用用户名和密码换取访问令牌，之后只保存令牌
+@app.route('/api/tokens', methods=['POST'])
+def create_token():
+    data = request.get_json(silent=True) or {}
+    username = data.get('username')
+    password = data.get('password')
+    client_id = data.get('client_id')
+    
+    user = storage.find_user(username) if username and password else None
+    if not user or not check_password_hash(user.password_hash, password):
+        return jsonify({'error': '用户名或密码错误'}), 401
+    
+    if client_id:
+        storage.touch_client(client_id, user.id)
+    
+    expire_tokens()
+    result = issue_token(user.id, client_id)
+    db.session.commit()
+    
+    return jsonify(result), 201
+
+# 用当前令牌换取新令牌，旧令牌在TOKEN_REFRESH_GRACE秒后失效
+@app.route('/api/tokens/refresh', methods=['POST'])
+def refresh_token():
+    token = getattr(session, 'token', None)
+    if token is None or 'user_id' not in session:
+        return jsonify({'error': '令牌无效或已过期'}), 401
+    
+    current = AuthToken.query.filter_by(token_hash=hash_token(token)).first()
+    if current is None:
+        return jsonify({'error': '令牌无效或已过期'}), 401
+    
+    if current.client_id:
+        storage.touch_client(current.client_id, current.user_id)
+    
+    expire_tokens()
+    result = issue_token(current.user_id, current.client_id)
+    current.expires_at = min(current.expires_at, get_current_time() + timedelta(seconds=app.config['TOKEN_REFRESH_GRACE']))
+    db.session.commit()
+    token_cache.discard([current.token_hash])
+    
+    return jsonify(result), 201
+
+# 撤销当前令牌（客户端退出登录）
+@app.route('/api/tokens', methods=['DELETE'])
+def delete_token():
+    token = getattr(session, 'token', None)
+    if token is None or 'user_id' not in session:
+        return jsonify({'error': '令牌无效或已过期'}), 401
+    
+    revoke_tokens(AuthToken.token_hash == hash_token(token))
+    
+    return jsonify({'message': '令牌已撤销'}), 200
+
 # 添加剪贴板内容
 @app.route('/api/clipboard', methods=['POST'])
 def add_clipboard():
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
+    user_id = session['user_id']
     data = request.get_json()
     content = data.get('content')
     content_type = data.get('content_type', 'text')
+    digest = data.get('content_hash')
+    
+    # 客户端可以只发送哈希：服务器已有相同内容时无需上传内容本身
+    if not content and digest:
+        result = storage.add_clip_by_hash(user_id, content_type, digest)
+        if result is None:
+            return jsonify({'error': '服务器没有该内容，请上传完整内容', 'need_content': True}), 404
+    elif not content:
+        return jsonify({'error': '内容不能为空'}), 400
+    else:
+        digest = content_hash(content)
+        result = storage.add_clip(user_id, content_type, content, digest, len(content.encode('utf-8')))
+    
+    data = clip_added(user_id, *result)
     
-    if not content:
+    return jsonify({'message': '添加成功', 'id': data['id'], 'content_hash': digest}), 201
+
+def clip_added(user_id, data, trimmed_ids):
+    # 新记录和裁剪的记录已提交，更新缓存并推送
+    if trimmed_ids:
+        trimmed_count.inc(amount=len(trimmed_ids))
+    clip_cache.add(user_id, data, trimmed_ids)
+    publish_clip(user_id, data)
+    return data
+
+# 批量修改剪贴板内容：先删除再按顺序添加，所有修改在同一事务中完成并只裁剪一次历史记录。
+# 用于客户端离线补发、批量导入和清空历史，请求体为
+#   {"inserts": [{"content": ..., "content_type": ...}], "deletes": [ID, ...], "clear": false}
+@app.route('/api/clipboard/batch', methods=['POST'])
+def batch_clipboard():
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    user_id = session['user_id']
+    data = request.get_json()
+    inserts = data.get('inserts') or []
+    deletes = data.get('deletes') or []
+    clear = bool(data.get('clear'))
+    max_items = app.config['BATCH_MAX_ITEMS']
+    if not isinstance(inserts, list) or not isinstance(deletes, list) or len(inserts) + len(deletes) > max_items:
+        return jsonify({'error': f"每次最多提交{max_items}条"}), 400
+    if any(not isinstance(item, dict) or not item.get('content') for item in inserts):
         return jsonify({'error': '内容不能为空'}), 400
+    if any(not isinstance(clip_id, int) for clip_id in deletes):
+        return jsonify({'error': '删除的ID无效'}), 400
     
-    # 检查用户已有剪贴板数量
-    clip_count = ClipboardItem.query.filter_by(user_id=session['user_id']).count()
+    contents = []
+    for item in inserts:
+        content = item['content']
+        contents.append((item.get('content_type', 'text'), content, content_hash(content), len(content.encode('utf-8'))))
     
-    # 如果超过20条，删除最旧的记录
-    if clip_count >= 20:
-        oldest_clip = ClipboardItem.query.filter_by(user_id=session['user_id']).order_by(ClipboardItem.timestamp.asc()).first()
-        if oldest_clip:
-            db.session.delete(oldest_clip)
+    # clear为true时删除该用户的全部历史记录；超出历史上限的新内容在同一事务中已被裁剪，不再加入缓存和推送
+    result = storage.apply_batch(user_id, contents, deletes, clear)
+    if result.trimmed_ids:
+        trimmed_count.inc(amount=len(result.trimmed_ids))
     
-    # 添加新记录
-    clip = ClipboardItem(content=content, content_type=content_type, user_id=session['user_id'])
-    db.session.add(clip)
-    db.session.commit()
+    if clear:
+        clip_cache.invalidate(user_id)
+    else:
+        clip_cache.remove(user_id, result.deleted_ids + result.trimmed_ids)
+    publish_delete(user_id, result.deleted_ids)
+    for clip in result.added:
+        clip_cache.add(user_id, clip)
+        publish_clip(user_id, clip)
     
-    return jsonify({'message': '添加成功', 'id': clip.id}), 201
+    return jsonify({
+        'message': '操作成功',
+        'ids': result.ids,
+        'content_hashes': [digest for _, _, digest, _ in contents],
+        'deleted': result.deleted_ids,
+        'trimmed': result.trimmed_ids,
+        # 操作后历史记录的版本，与列表接口的ETag一致
+        'version': clips_etag(user_id)
+    }), 201 if result.ids else 200
 
 # 获取剪贴板内容
 @app.route('/api/clipboard', methods=['GET'])
@@ -146,18 +1039,46 @@ def get_clipboard():
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
-    clips = ClipboardItem.query.filter_by(user_id=session['user_id']).order_by(ClipboardItem.timestamp.desc()).all()
-    result = []
+    user_id = session['user_id']
+    etag = clips_etag(user_id)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
     
-    for clip in clips:
-        result.append({
-            'id': clip.id,
-            'content': clip.content,
-            'content_type': clip.content_type,
-            'timestamp': clip.timestamp.isoformat()
-        })
+    clips, complete = get_recent_clips(user_id)
+    if complete:
+        result = list(clips)
+    else:
+        result = storage.recent_clips(user_id)
     
-    return jsonify(result), 200
+    return etag_response(result, etag), 200
+
+# 增量获取剪贴板内容：只返回since_id之后的新内容，以及当前仍存在的ID用于同步删除
+@app.route('/api/clipboard/changes', methods=['GET'])
+def get_clipboard_changes():
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    user_id = session['user_id']
+    since_id = request.args.get('since_id', 0, type=int)
+    
+    # 返回的内容取决于since_id，不同游标的响应不能共用ETag
+    etag = f'{clips_etag(user_id)}-{since_id}'
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    cached_clips, complete = get_recent_clips(user_id)
+    if complete:
+        ids = [clip['id'] for clip in cached_clips]
+        items = sorted((clip for clip in cached_clips if clip['id'] > since_id), key=lambda clip: clip['id'])
+    else:
+        ids = storage.clip_ids(user_id)
+        items = storage.clips_after(user_id, since_id)
+    
+    return etag_response({
+        'items': items,
+        'ids': ids,
+        'cursor': max([since_id] + ids)
+    }, etag), 200
 
 # 获取最新的剪贴板内容
 @app.route('/api/clipboard/latest', methods=['GET'])
@@ -165,31 +1086,285 @@ def get_latest_clipboard():
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
-    clip = ClipboardItem.query.filter_by(user_id=session['user_id']).order_by(ClipboardItem.timestamp.desc()).first()
+    # 先按历史记录的版本判断是否变化（缓存或一次ID聚合查询），未变化时返回304，不读取内容
+    user_id = session['user_id']
+    # meta=1时只返回摘要和长度，不返回内容
+    meta = request.args.get('meta', type=int) == 1
+    etag = clips_etag(user_id)
+    if meta:
+        etag += '-meta'
+    if request.if_none_match.contains_weak(etag):
+        return with_pending_commands(not_modified(etag), user_id)
     
-    if not clip:
-        return jsonify({'error': '没有剪贴板内容'}), 404
+    clip = get_latest_clip(user_id)
+    if clip is None:
+        return with_pending_commands(jsonify({'error': '没有剪贴板内容'}), user_id), 404
+    
+    return with_pending_commands(etag_response(clip_meta(clip) if meta else clip, etag), user_id), 200
+
+# 按摘要下载内容，只允许下载当前用户历史记录中的内容
+@app.route('/api/blobs/<string:digest>', methods=['GET'])
+def get_blob(digest):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    user_id = session['user_id']
+    clips, complete = get_recent_clips(user_id)
+    clip = next((clip for clip in clips if clip['content_hash'] == digest), None)
+    if clip is not None and clip['content'] is not None:
+        return blob_response(Response(clip['content'], mimetype='text/plain'), digest)
+    
+    blob = None
+    if clip is not None:
+        blob = storage.get_blob(user_id, digest, check_owner=False)
+    elif not complete:
+        blob = storage.get_blob(user_id, digest)
+    
+    if blob is None:
+        return jsonify({'error': '内容不存在或无权限访问'}), 404
+    if blob.storage != BLOB_STORAGE_FILE:
+        return blob_response(Response(blob.content, mimetype='text/plain'), digest)
+    
+    # 磁盘上的内容流式发送，支持Range请求，下载中断后可以从断点继续
+    response = send_file(
+        blob_store.path(digest),
+        mimetype=blob.mimetype or 'application/octet-stream',
+        etag=digest,
+        conditional=True
+    )
+    return blob_response(response, digest)
+
+def blob_response(response, digest):
+    # 内容由摘要唯一确定，可以长期缓存
+    response.set_etag(digest)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+# 分块上传：创建上传 -> 按偏移量上传分块（断线后查询偏移量继续） -> 提交
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    data = request.get_json()
+    size = data.get('size')
+    content_type = data.get('content_type', 'text')
+    digest = data.get('content_hash')
+    mimetype = data.get('mimetype') or ('text/plain' if content_type == 'text' else None)
+    
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': '上传大小无效'}), 400
+    if size > app.config['UPLOAD_MAX_SIZE']:
+        return jsonify({'error': '内容过大', 'max_size': app.config['UPLOAD_MAX_SIZE']}), 413
+    
+    # 服务器已有相同内容时直接添加记录，无需上传
+    if digest:
+        result = storage.add_clip_by_hash(session['user_id'], content_type, digest)
+        if result is not None:
+            data = clip_added(session['user_id'], *result)
+            return jsonify({'message': '添加成功', 'id': data['id'], 'content_hash': digest}), 201
+    
+    expire_uploads()
+    upload = ClipboardUpload(
+        id=uuid.uuid4().hex,
+        user_id=session['user_id'],
+        content_type=content_type,
+        mimetype=mimetype,
+        size=size,
+        content_hash=digest
+    )
+    db.session.add(upload)
+    blob_store.create_upload(upload.id)
+    db.session.commit()
     
     return jsonify({
-        'id': clip.id,
-        'content': clip.content,
-        'content_type': clip.content_type,
-        'timestamp': clip.timestamp.isoformat()
+        'upload_id': upload.id,
+        'offset': 0,
+        'size': size,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+def get_upload(upload_id):
+    return ClipboardUpload.query.filter_by(id=upload_id, user_id=session['user_id']).first()
+
+def expire_uploads():
+    # 删除超过保留时间仍未完成的上传
+    cutoff = get_current_time() - timedelta(hours=app.config['UPLOAD_EXPIRE_HOURS'])
+    expired = db.session.execute(db.select(ClipboardUpload.id).where(ClipboardUpload.created_at < cutoff)).scalars().all()
+    if expired:
+        db.session.execute(db.delete(ClipboardUpload).where(ClipboardUpload.id.in_(expired)))
+        for upload_id in expired:
+            blob_store.discard_upload(upload_id)
+
+# 查询已上传的偏移量，断线重连后从该位置继续
+@app.route('/api/uploads/<string:upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    upload = get_upload(upload_id)
+    offset = blob_store.upload_size(upload_id) if upload else None
+    if offset is None:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    
+    return jsonify({
+        'upload_id': upload_id,
+        'offset': offset,
+        'size': upload.size,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
     }), 200
 
+# 上传一个分块，请求体为原始字节，offset必须等于已上传的字节数
+@app.route('/api/uploads/<string:upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    upload = get_upload(upload_id)
+    current = blob_store.upload_size(upload_id) if upload else None
+    if current is None:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    
+    offset = request.args.get('offset', type=int)
+    length = request.content_length
+    if offset != current:
+        return jsonify({'error': '偏移量不一致', 'offset': current}), 409
+    if length is None or length > app.config['UPLOAD_CHUNK_SIZE'] or offset + length > upload.size:
+        return jsonify({'error': '分块大小无效', 'offset': current}), 400
+    
+    # 分块直接从请求流写入文件，不在内存中保存整个分块
+    offset = blob_store.write_chunk(upload_id, offset, request.stream, length)
+    return jsonify({'upload_id': upload_id, 'offset': offset, 'size': upload.size}), 200
+
+# 全部分块上传完成后校验哈希并添加剪贴板记录
+@app.route('/api/uploads/<string:upload_id>/commit', methods=['POST'])
+def commit_upload(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    upload = get_upload(upload_id)
+    offset = blob_store.upload_size(upload_id) if upload else None
+    if offset is None:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    if offset != upload.size:
+        return jsonify({'error': '上传未完成', 'offset': offset}), 409
+    
+    digest, size = blob_store.upload_digest(upload_id)
+    if upload.content_hash and digest != upload.content_hash:
+        db.session.delete(upload)
+        db.session.commit()
+        blob_store.discard_upload(upload_id)
+        return jsonify({'error': '内容哈希不一致，请重新上传'}), 400
+    
+    user_id, content_type, mimetype = session['user_id'], upload.content_type, upload.mimetype
+    # 使用sqlalchemy存储时上传记录与新的剪贴板记录在同一事务中提交
+    db.session.delete(upload)
+    result = storage.add_clip_by_hash(user_id, content_type, digest)
+    if result is None:
+        blob_store.commit_upload(upload_id, digest)
+        result = storage.add_clip(user_id, content_type, None, digest, size, BLOB_STORAGE_FILE, mimetype)
+    else:
+        # 已有相同内容（例如以JSON提交过的文本），不再保存文件
+        blob_store.discard_upload(upload_id)
+    db.session.commit()
+    data = clip_added(user_id, *result)
+    
+    return jsonify({'message': '添加成功', 'id': data['id'], 'content_hash': digest}), 201
+
+# 取消上传
+@app.route('/api/uploads/<string:upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    upload = get_upload(upload_id)
+    if not upload:
+        return jsonify({'error': '上传不存在或已过期'}), 404
+    
+    db.session.delete(upload)
+    db.session.commit()
+    blob_store.discard_upload(upload_id)
+    
+    return jsonify({'message': '上传已取消'}), 200
+
+# 剪贴板变更推送（Server-Sent Events），替代客户端的定时轮询
+@app.route('/api/clipboard/stream', methods=['GET'])
+def stream_clipboard():
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    # 推送连接在连接期间一直占用一个线程（gthread、waitress）或连接（gevent），
+    # 达到上限时返回503，客户端改为轮询并在Retry-After之后再尝试推送，普通请求始终有线程可用
+    limit = app.config['STREAM_MAX_CONNECTIONS']
+    if limit and notifier.subscriber_count() >= limit:
+        stream_rejected_count.inc()
+        response = jsonify({'error': '推送连接已满，请改为轮询'})
+        response.headers['Retry-After'] = str(app.config['STREAM_RETRY_AFTER'])
+        return response, 503
+    
+    user_id = session['user_id']
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    # meta=1时事件只包含摘要，客户端按需下载内容
+    render = clip_meta if request.args.get('meta', type=int) == 1 else (lambda data: data)
+    
+    # 开始接收其他工作进程的事件
+    bus.start()
+    
+    # 先订阅再补发，避免补发期间产生的新内容丢失
+    subscription = notifier.subscribe(user_id)
+    
+    # 断线重连时补发错过的内容，首次连接时发送当前最新内容
+    clips, complete = get_recent_clips(user_id)
+    if last_event_id is None:
+        latest = get_latest_clip(user_id)
+        backlog = [latest] if latest else []
+    elif complete or (clips and clips[-1]['id'] <= last_event_id):
+        backlog = sorted((clip for clip in clips if clip['id'] > last_event_id), key=lambda clip: clip['id'])
+    else:
+        backlog = storage.clips_after(user_id, last_event_id)
+    
+    def generate():
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            sent_id = last_event_id or 0
+            for data in backlog:
+                sent_id = max(sent_id, data['id'])
+                yield format_sse('clip', render(data), data['id'])
+            while True:
+                try:
+                    event, data = subscription.get(timeout=STREAM_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event != 'clip':
+                    yield format_sse(event, data)
+                    continue
+                # 跳过已经发送过的内容和比已发送内容更早的内容
+                if data['id'] <= sent_id:
+                    continue
+                sent_id = data['id']
+                yield format_sse(event, render(data), data['id'])
+        finally:
+            notifier.unsubscribe(user_id, subscription)
+    
+    # 生成器不依赖请求上下文，数据库会话在返回响应时即可释放
+    response = Response(generate(), mimetype='text/event-stream')
+    response.call_on_close(lambda: notifier.unsubscribe(user_id, subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # 删除剪贴板内容
 @app.route('/api/clipboard/<int:clip_id>', methods=['DELETE'])
 def delete_clipboard(clip_id):
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
-    clip = ClipboardItem.query.filter_by(id=clip_id, user_id=session['user_id']).first()
-    
-    if not clip:
+    if not storage.delete_clip(session['user_id'], clip_id):
         return jsonify({'error': '剪贴板内容不存在或无权限删除'}), 404
     
-    db.session.delete(clip)
-    db.session.commit()
+    clip_cache.remove(session['user_id'], [clip_id])
+    publish_delete(session['user_id'], [clip_id])
     
     return jsonify({'message': '删除成功'}), 200
 
@@ -199,14 +1374,15 @@ def get_clients():
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
-    clients = ClientConnection.query.filter_by(user_id=session['user_id'], is_online=True).all()
+    clients = storage.online_clients(session['user_id'])
     result = []
     
     for client in clients:
         result.append({
             'client_id': client.client_id,
             'name': client.name,
-            'last_seen': client.last_seen.isoformat()
+            'last_seen': format_time(client.last_seen),
+            'last_seen_ms': epoch_ms(client.last_seen)
         })
     
     return jsonify(result), 200
@@ -226,32 +1402,204 @@ def simulate_typing():
         return jsonify({'error': '客户端ID和内容不能为空'}), 400
     
     # 检查客户端是否存在且属于当前用户
-    client = ClientConnection.query.filter_by(client_id=client_id, user_id=session['user_id']).first()
-    if not client:
+    if not storage.get_client(session['user_id'], client_id):
         return jsonify({'error': '客户端不存在或不属于当前用户'}), 404
     
-    # 创建一个特殊的剪贴板项用于模拟输入
-    typing_command = {
-        'action': 'simulate_typing',
-        'content': content,
-        'typing_speed': typing_speed,
-        'command_id': str(uuid.uuid4())
-    }
-    
-    # 将命令保存为剪贴板内容，但使用特殊的content_type标记
-    clip = ClipboardItem(
-        content=json.dumps(typing_command),
-        content_type='typing_command',
-        user_id=session['user_id']
+    expire_commands()
+    command = ClientCommand(
+        command_id=str(uuid.uuid4()),
+        user_id=session['user_id'],
+        client_id=client_id,
+        action='simulate_typing',
+        payload=json.dumps({'content': content, 'typing_speed': typing_speed}),
+        expires_at=get_current_time() + timedelta(seconds=app.config['COMMAND_TTL']),
+        total=len(content)
     )
-    db.session.add(clip)
+    db.session.add(command)
     db.session.commit()
     
+    publish_command(session['user_id'], client_id)
+    
     return jsonify({
         'message': '模拟输入指令已发送',
-        'command_id': typing_command['command_id']
+        'command_id': command.command_id,
+        'expires_at': format_time(command.expires_at),
+        'expires_at_ms': epoch_ms(command.expires_at)
     }), 201
 
+def serialize_command(command):
+    data = json.loads(command.payload)
+    data.update({
+        'command_id': command.command_id,
+        'action': command.action,
+        'created_at': format_time(command.created_at),
+        'created_at_ms': epoch_ms(command.created_at),
+        'expires_at': format_time(command.expires_at),
+        'expires_at_ms': epoch_ms(command.expires_at)
+    })
+    return data
+
+def expire_commands():
+    # 删除超过保留时间的指令记录，未确认的指令在有效期过后按过期处理
+    now = get_current_time()
+    db.session.execute(
+        db.delete(ClientCommand)
+        .where(ClientCommand.created_at < now - timedelta(hours=app.config['COMMAND_RETENTION_HOURS']))
+    )
+    db.session.execute(
+        db.update(ClientCommand)
+        .where(
+            ClientCommand.state.in_((COMMAND_PENDING, COMMAND_DELIVERED)),
+            ClientCommand.expires_at <= now
+        )
+        .values(state=COMMAND_EXPIRED)
+    )
+
+def deliverable_commands(user_id, client_id, now=None):
+    # 可以下发给客户端的指令：未下发的和下发后长时间未确认的
+    now = now or get_current_time()
+    redeliver_before = now - timedelta(seconds=app.config['COMMAND_REDELIVER_AFTER'])
+    return ClientCommand.query.filter(
+        ClientCommand.user_id == user_id,
+        ClientCommand.client_id == client_id,
+        ClientCommand.expires_at > now,
+        db.or_(
+            ClientCommand.state == COMMAND_PENDING,
+            db.and_(ClientCommand.state == COMMAND_DELIVERED, ClientCommand.delivered_at <= redeliver_before)
+        )
+    )
+
+# 客户端获取发给自己的指令：未下发的和下发后长时间未确认的，按创建顺序返回
+@app.route('/api/clients/<string:client_id>/commands', methods=['GET'])
+def get_client_commands(client_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    if not storage.get_client(session['user_id'], client_id):
+        return jsonify({'error': '客户端不存在或不属于当前用户'}), 404
+    
+    now = get_current_time()
+    commands = deliverable_commands(session['user_id'], client_id, now).order_by(
+        ClientCommand.id.asc()
+    ).limit(app.config['COMMAND_FETCH_LIMIT']).all()
+    
+    for command in commands:
+        command.state = COMMAND_DELIVERED
+        command.delivered_at = now
+    result = [serialize_command(command) for command in commands]
+    db.session.commit()
+    
+    return jsonify(result), 200
+
+# 客户端确认收到指令后再执行，已过期的指令返回410，客户端不再执行
+@app.route('/api/clients/<string:client_id>/commands/<string:command_id>/ack', methods=['POST'])
+def ack_client_command(client_id, command_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    command = ClientCommand.query.filter_by(
+        command_id=command_id, client_id=client_id, user_id=session['user_id']
+    ).first()
+    if not command:
+        return jsonify({'error': '指令不存在'}), 404
+    
+    if command.state == COMMAND_ACKED:
+        return jsonify({'message': '指令已确认', 'state': command.state}), 200
+    if command_delivery_state(command) == COMMAND_EXPIRED:
+        command.state = COMMAND_EXPIRED
+        db.session.commit()
+        return jsonify({'error': '指令已过期', 'state': command.state}), 410
+    
+    command.state = COMMAND_ACKED
+    command.acked_at = get_current_time()
+    db.session.commit()
+    
+    return jsonify({'message': '指令已确认', 'state': command.state}), 200
+
+def get_typing_command(command_id):
+    return ClientCommand.query.filter_by(
+        command_id=command_id, user_id=session['user_id'], action='simulate_typing'
+    ).first()
+
+def command_delivery_state(command):
+    # 过期的指令由expire_commands批量更新，查询时按有效期判断
+    if command.state in (COMMAND_PENDING, COMMAND_DELIVERED) and command.expires_at <= get_current_time():
+        return COMMAND_EXPIRED
+    return command.state
+
+def typing_progress_response(command):
+    state = command.progress_state
+    delivery = command_delivery_state(command)
+    # 客户端确认前过期的指令不会再执行
+    if state == 'sent' and delivery == COMMAND_EXPIRED:
+        state = 'expired'
+    return {
+        'client_id': command.client_id,
+        'state': state,
+        'delivery': delivery,
+        'typed': command.typed,
+        'total': command.total,
+        'error': command.error,
+        'cancel_requested': command.cancel_requested
+    }
+
+# 查询模拟输入进度
+@app.route('/api/simulate_typing/<string:command_id>', methods=['GET'])
+def get_typing_progress(command_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    command = get_typing_command(command_id)
+    if not command:
+        return jsonify({'error': '模拟输入指令不存在'}), 404
+    
+    return jsonify(typing_progress_response(command)), 200
+
+# 客户端报告模拟输入进度，响应中的cancel表示网页端已请求取消
+@app.route('/api/simulate_typing/<string:command_id>/progress', methods=['POST'])
+def report_typing_progress(command_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    state = data.get('state')
+    typed = data.get('typed')
+    total = data.get('total')
+    if state not in TYPING_STATES:
+        return jsonify({'error': '无效的状态'}), 400
+    if not isinstance(typed, int) or not isinstance(total, int) or not 0 <= typed <= total:
+        return jsonify({'error': '无效的进度'}), 400
+    
+    command = get_typing_command(command_id)
+    if not command:
+        return jsonify({'error': '模拟输入指令不存在'}), 404
+    
+    # 只更新进度列，不会覆盖其他工作进程同时写入的取消标记
+    command.progress_state = state
+    command.typed = typed
+    command.total = total
+    command.error = data.get('error')
+    db.session.commit()
+    return jsonify({'cancel': command.cancel_requested}), 200
+
+# 取消模拟输入：未确认的指令直接过期，已在执行的由客户端在下一次报告进度时停止
+@app.route('/api/simulate_typing/<string:command_id>/cancel', methods=['POST'])
+def cancel_typing(command_id):
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    command = get_typing_command(command_id)
+    if not command or command_delivery_state(command) == COMMAND_EXPIRED \
+            or command.progress_state in TYPING_FINAL_STATES:
+        return jsonify({'error': '模拟输入指令不存在或已结束'}), 404
+    
+    command.cancel_requested = True
+    if command.state in (COMMAND_PENDING, COMMAND_DELIVERED):
+        command.state = COMMAND_EXPIRED
+    db.session.commit()
+    
+    return jsonify({'message': '已请求取消模拟输入', **typing_progress_response(command)}), 200
+
 # 修改客户端名称
 @app.route('/api/clients/<string:client_id>', methods=['PUT'])
 def update_client(client_id):
@@ -264,13 +1612,9 @@ def update_client(client_id):
     if not new_name:
         return jsonify({'error': '新名称不能为空'}), 400
     
-    client = ClientConnection.query.filter_by(client_id=client_id, user_id=session['user_id']).first()
-    if not client:
+    if not storage.rename_client(session['user_id'], client_id, new_name):
         return jsonify({'error': '客户端不存在或不属于当前用户'}), 404
     
-    client.name = new_name
-    db.session.commit()
-    
     return jsonify({'message': '客户端名称修改成功'}), 200
 
 # 删除客户端
@@ -279,19 +1623,46 @@ def delete_client(client_id):
     if 'user_id' not in session:
         return jsonify({'error': '请先登录'}), 401
     
-    client = ClientConnection.query.filter_by(client_id=client_id, user_id=session['user_id']).first()
-    if not client:
+    if not storage.delete_client(session['user_id'], client_id):
         return jsonify({'error': '客户端不存在或不属于当前用户'}), 404
     
-    db.session.delete(client)
-    db.session.commit()
+    db.session.execute(db.delete(ClientCommand).where(ClientCommand.client_id == client_id))
+    # 被删除的设备不能再用原来的令牌访问
+    revoke_tokens(db.and_(AuthToken.client_id == client_id, AuthToken.user_id == session['user_id']))
     
     return jsonify({'message': '客户端删除成功'}), 200
 
+# Prometheus指标
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': '指标接口未启用'}), 404
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 # 前端页面路由
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def main():
+    parser = argparse.ArgumentParser(description='剪贴板同步服务端')
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help='使用生产服务器运行（多进程+线程池）')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=5000)
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='工作进程数')
+    serve_parser.add_argument('--threads', type=int, default=32, help='gthread模式下每个进程的线程数，推送连接各占一个线程')
+    serve_parser.add_argument('--connections', type=int, default=1000, help='gevent模式下每个进程的最大连接数')
+    serve_parser.add_argument('--worker-class', choices=('auto', 'gevent', 'gthread'), default='auto',
+                              help='gunicorn工作模式，auto时安装了gevent则使用gevent')
+    args = parser.parse_args()
+    
+    if args.command == 'serve':
+        from serve import run_server
+        run_server(args.host, args.port, args.workers, args.threads, args.connections, args.worker_class)
+    else:
+        # 开发模式
+        create_app().run(debug=True, host='0.0.0.0', port=5000)
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""客户端访问令牌
+
+客户端用用户名和密码换取令牌后只保存令牌，之后的请求通过Authorization: Bearer携带，
+不再校验密码，也不读写会话Cookie；网页端仍使用会话Cookie。数据库只保存令牌的SHA-256，
+查询结果在进程内缓存，其他工作进程撤销的令牌最迟在缓存过期后失效。
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask.sessions import SecureCookieSessionInterface, SessionMixin
+
+BEARER_PREFIX = 'bearer '
+
+
+def new_token():
+    """生成新令牌，返回(令牌, 哈希)"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_token(token)
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def bearer_token(request):
+    """读取请求头Authorization中的令牌，没有时返回None"""
+    header = request.headers.get('Authorization', '')
+    if header[:len(BEARER_PREFIX)].lower() != BEARER_PREFIX:
+        return None
+    return header[len(BEARER_PREFIX):].strip() or None
+
+
+class TokenCache:
+    """令牌哈希 -> 用户ID的进程内LRU缓存，按条数淘汰，每条最多保留ttl秒且不超过令牌的有效期"""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # 令牌哈希 -> (用户ID, 缓存失效的时间戳)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        """返回缓存的用户ID，未缓存或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                self._entries.pop(digest, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest, user_id, expires_at):
+        """expires_at为令牌过期的时间戳（秒）"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = (user_id, min(time.time() + self.ttl, expires_at))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, digests):
+        with self._lock:
+            for digest in digests:
+                self._entries.pop(digest, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class TokenSession(dict, SessionMixin):
+    """通过令牌认证的请求使用的会话，只在本次请求内有效，不会写入Cookie"""
+
+    def __init__(self, token, user_id):
+        super().__init__({} if user_id is None else {'user_id': user_id})
+        self.token = token
+
+
+class TokenSessionInterface(SecureCookieSessionInterface):
+    """带Bearer令牌的请求按令牌确定session['user_id']，路由无需区分两种认证方式"""
+
+    def __init__(self, lookup):
+        self.lookup = lookup  # 令牌 -> 用户ID，令牌无效时返回None
+
+    def open_session(self, app, request):
+        token = bearer_token(request)
+        if token is None:
+            return super().open_session(app, request)
+        return TokenSession(token, self.lookup(token))
+
+    def save_session(self, app, session, response):
+        if isinstance(session, TokenSession):
+            return
+        super().save_session(app, session, response)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """按SHA-256保存在磁盘上的内容块，以及分块上传过程中的临时文件
+
+    内容块路径为 <root>/<哈希前两位>/<哈希>，上传中的文件为 <root>/uploads/<上传ID>，
+    上传完成后校验哈希并原子地移动到内容块路径。
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def upload_path(self, upload_id):
+        return os.path.join(self.root, 'uploads', upload_id)
+
+    def create_upload(self, upload_id):
+        os.makedirs(os.path.dirname(self.upload_path(upload_id)), exist_ok=True)
+        open(self.upload_path(upload_id), 'wb').close()
+
+    def upload_size(self, upload_id):
+        """已写入的字节数，即断点续传的偏移量；上传不存在时返回None"""
+        try:
+            return os.path.getsize(self.upload_path(upload_id))
+        except FileNotFoundError:
+            return None
+
+    def write_chunk(self, upload_id, offset, stream, length):
+        """从请求流中边读边写入一个分块，返回写入后的偏移量
+
+        连接中途断开时已收到的部分保留在文件中，客户端从新的偏移量继续上传。
+        """
+        with open(self.upload_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                f.write(block)
+                remaining -= len(block)
+            return f.tell()
+
+    def upload_digest(self, upload_id):
+        """逐块计算上传文件的SHA-256，返回(摘要, 大小)"""
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(self.upload_path(upload_id), 'rb') as f:
+            for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                sha256.update(block)
+                size += len(block)
+        return sha256.hexdigest(), size
+
+    def commit_upload(self, upload_id, digest):
+        """把上传完成的文件移动到内容块路径，内容相同的文件已存在时直接覆盖"""
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.upload_path(upload_id), target)
+
+    def discard_upload(self, upload_id):
+        try:
+            os.remove(self.upload_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
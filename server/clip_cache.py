@@ -0,0 +1,173 @@
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+ENTRY_OVERHEAD = 256  # 每条缓存记录除内容外的大致内存开销（字节）
+
+
+class CachedClips:
+    """单个用户缓存的最近剪贴板内容，按新到旧排列"""
+
+    __slots__ = ('clips', 'complete', 'size')
+
+    def __init__(self, clips, complete):
+        self.clips = list(clips)
+        # complete表示缓存中包含该用户的全部历史记录
+        self.complete = complete
+        self.size = sum(clip_size(clip) for clip in self.clips)
+
+
+def clip_size(clip):
+    return sys.getsizeof(clip['content']) + ENTRY_OVERHEAD
+
+
+def clip_order(clip):
+    # 与数据库的排序（时间、ID）一致
+    return datetime.fromisoformat(clip['timestamp']), clip['id']
+
+
+class ClipCache:
+    """按用户缓存最新剪贴板内容的进程内LRU缓存，按用户数和内存占用淘汰
+
+    多进程部署时其他工作进程的写入通过通知总线交给add和remove，同一写入可能被应用两次，
+    两者都是幂等的。
+    """
+
+    def __init__(self, max_users=10000, max_bytes=64 * 1024 * 1024, window=20):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.window = window
+        self._entries = OrderedDict()  # user_id -> CachedClips
+        self._bytes = 0
+        self._loading = {}  # user_id -> [进行中的加载数, 加载期间的写入计数]，用于丢弃与写操作并发的加载结果
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """返回(剪贴板列表, 是否完整)，未缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return tuple(entry.clips), entry.complete
+
+    def begin_load(self, user_id):
+        """从数据库加载前调用，返回的令牌交给store判断加载期间该用户是否有写入，加载结束后调用end_load"""
+        with self._lock:
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            return loading[1]
+
+    def end_load(self, user_id):
+        with self._lock:
+            loading = self._loading[user_id]
+            loading[0] -= 1
+            if not loading[0]:
+                del self._loading[user_id]
+
+    def store(self, user_id, clips, token):
+        """缓存从数据库加载的最近window+1条内容；加载期间有写入时放弃缓存，避免存入过期数据"""
+        with self._lock:
+            if token != self._loading[user_id][1]:
+                return
+            self._discard(user_id)
+            entry = CachedClips(clips[:self.window], len(clips) <= self.window)
+            self._entries[user_id] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def add(self, user_id, clip, removed_ids=()):
+        """写入新内容后更新缓存，removed_ids为同一事务中被删除的记录"""
+        with self._lock:
+            self._written(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            self._remove_ids(entry, removed_ids)
+            if any(cached['id'] == clip['id'] for cached in entry.clips):
+                return
+            # 并发写入的请求更新缓存的顺序可能与提交顺序不同，按时间和ID插入到对应位置
+            key = clip_order(clip)
+            index = 0
+            while index < len(entry.clips) and clip_order(entry.clips[index]) > key:
+                index += 1
+            entry.clips.insert(index, clip)
+            entry.size += clip_size(clip)
+            self._bytes += clip_size(clip)
+            while len(entry.clips) > self.window:
+                dropped = entry.clips.pop()
+                entry.size -= clip_size(dropped)
+                self._bytes -= clip_size(dropped)
+                entry.complete = False
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def remove(self, user_id, clip_ids):
+        """删除内容后更新缓存"""
+        with self._lock:
+            self._written(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            self._remove_ids(entry, clip_ids)
+            # 缓存不完整且已被删空时无法确定最新内容，需要重新加载
+            if not entry.clips and not entry.complete:
+                self._discard(user_id)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._written(user_id)
+            self._discard(user_id)
+
+    def clear(self):
+        """清空缓存，进行中的加载结果也不再缓存"""
+        with self._lock:
+            for loading in self._loading.values():
+                loading[1] += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _written(self, user_id):
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            loading[1] += 1
+
+    def _remove_ids(self, entry, clip_ids):
+        if not clip_ids:
+            return
+        clip_ids = set(clip_ids)
+        kept = []
+        for clip in entry.clips:
+            if clip['id'] in clip_ids:
+                entry.size -= clip_size(clip)
+                self._bytes -= clip_size(clip)
+            else:
+                kept.append(clip)
+        entry.clips = kept
+
+    def _discard(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_users or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
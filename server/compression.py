@@ -0,0 +1,83 @@
+import gzip
+import io
+import zlib
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# 请求体支持的压缩编码，通过响应头Accept-Encoding告知客户端（RFC 7694）
+REQUEST_ENCODINGS = ('gzip',)
+
+# 不压缩的响应类型：推送流需要逐条发送，图片等已压缩的内容再压缩没有收益
+SKIP_MIMETYPES = ('text/event-stream', 'image/')
+
+
+class DecompressRequestMiddleware:
+    """WSGI中间件：解压Content-Encoding为gzip的请求体，路由中照常使用request.get_json()"""
+
+    def __init__(self, wsgi_app, max_size):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return self.wsgi_app(environ, start_response)
+        if encoding not in REQUEST_ENCODINGS:
+            return UnsupportedMediaType(f'不支持的请求压缩编码: {encoding}')(environ, start_response)
+
+        try:
+            body = self.decompress(environ['wsgi.input'], environ.get('CONTENT_LENGTH'))
+        except RequestEntityTooLarge as e:
+            return e(environ, start_response)
+        except (OSError, EOFError, zlib.error):
+            return UnsupportedMediaType('请求体解压失败')(environ, start_response)
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+    def decompress(self, stream, content_length):
+        length = int(content_length or 0)
+        compressed = stream.read(length) if length else stream.read()
+        # 限制解压后的大小，防止压缩炸弹占满内存
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(compressed, self.max_size + 1)
+        if len(body) > self.max_size or decompressor.unconsumed_tail:
+            raise RequestEntityTooLarge('解压后的请求体过大')
+        if not decompressor.eof:
+            raise EOFError('压缩数据不完整')
+        return body
+
+
+def compress_response(response, min_size, level):
+    """客户端接受gzip且响应体超过阈值时压缩响应"""
+    response.headers['Accept-Encoding'] = ', '.join(REQUEST_ENCODINGS)
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype.startswith(SKIP_MIMETYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=level, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    # 压缩后的表示与原内容字节不同，强ETag改为弱ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+    app.wsgi_app = DecompressRequestMiddleware(app.wsgi_app, app.config['COMPRESSION_MAX_REQUEST_SIZE'])
+    min_size = app.config['COMPRESSION_MIN_SIZE']
+    level = app.config['COMPRESSION_LEVEL']
+    app.after_request(lambda response: compress_response(response, min_size, level))
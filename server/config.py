@@ -0,0 +1,117 @@
+import os
+import secrets
+
+# 默认配置，均可通过CLIPSYNC_前缀的环境变量覆盖，例如:
+#   CLIPSYNC_SECRET_KEY=...  CLIPSYNC_CLIPBOARD_HISTORY_LIMIT=50
+DEFAULTS = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///clipboard.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    # 用户、剪贴板记录和客户端的存储：sqlalchemy（默认）、memory（进程内存）或sharded（多个SQLite分片）
+    'STORAGE_ENGINE': 'sqlalchemy',
+    'STORAGE_SHARDS': 4,  # sharded的分片数，决定用户ID的编码，建立数据后不能修改
+    'STORAGE_SHARD_PATH': None,  # sharded的分片文件目录，默认为instance/shards
+    'CLIPBOARD_HISTORY_LIMIT': 20,  # 每个用户保留的剪贴板历史条数
+    'BATCH_MAX_ITEMS': 100,  # 批量接口每次最多处理的条数
+    # 每个用户最近剪贴板内容的内存缓存
+    'CLIP_CACHE_ENABLED': True,
+    'CLIP_CACHE_MAX_USERS': 10000,
+    'CLIP_CACHE_MAX_BYTES': 64 * 1024 * 1024,
+    # 多个工作进程共享数据库时置为true，由serve命令自动设置
+    'MULTIPROCESS': False,
+    # 工作进程之间的变更通知：auto（多进程时为unix，否则为local）、local或unix
+    'NOTIFY_BUS': 'auto',
+    'NOTIFY_SOCKET_PATH': None,  # unix代理的套接字路径，默认为instance/notify.sock
+    # 推送连接（/api/clipboard/stream）
+    'STREAM_MAX_CONNECTIONS': 0,  # 每个工作进程的推送连接上限，达到后返回503，客户端改为轮询；0为不限制，serve命令按线程数或连接数设置
+    'STREAM_RETRY_AFTER': 60,  # 推送连接已满时建议客户端重新尝试推送的间隔（秒）
+    # SQLite调优
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT': 5,  # 等待写锁的时间（秒）
+    'BUSY_RETRY_AFTER': 2,  # 等待写锁超时后建议客户端重试的间隔（秒）
+    # 数据库连接池
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 10,
+    # 请求体和响应体的gzip压缩
+    'COMPRESSION_ENABLED': True,
+    'COMPRESSION_MIN_SIZE': 1024,  # 小于该大小（字节）的响应不压缩
+    'COMPRESSION_LEVEL': 6,
+    'COMPRESSION_MAX_REQUEST_SIZE': 64 * 1024 * 1024,  # 解压后请求体的最大大小（字节）
+    # 分块上传，内容保存在磁盘上的内容块目录中
+    'BLOB_STORE_PATH': None,  # 默认为instance/blobs
+    'UPLOAD_CHUNK_SIZE': 1024 * 1024,  # 每个分块的最大大小（字节）
+    'UPLOAD_MAX_SIZE': 100 * 1024 * 1024,  # 单个上传的最大大小（字节）
+    'UPLOAD_EXPIRE_HOURS': 24,  # 未完成的上传保留时间
+    # 发送给指定客户端的指令（模拟输入等）
+    'COMMAND_TTL': 300,  # 指令在客户端确认前的有效期（秒）
+    'COMMAND_REDELIVER_AFTER': 30,  # 已下发但未确认的指令重新下发的间隔（秒）
+    'COMMAND_RETENTION_HOURS': 24,  # 已结束的指令记录保留时间
+    'COMMAND_FETCH_LIMIT': 20,  # 客户端每次最多获取的指令数
+    # 客户端的访问令牌，网页端仍使用会话Cookie
+    'TOKEN_TTL': 30 * 24 * 3600,  # 令牌有效期（秒），客户端在过半后刷新
+    'TOKEN_REFRESH_GRACE': 60,  # 刷新后旧令牌继续有效的时间（秒），刷新响应丢失时客户端仍可重试
+    'TOKEN_CACHE_TTL': 60,  # 令牌查询结果在进程内的缓存时间（秒），其他工作进程撤销的令牌最迟在该时间后失效
+    'TOKEN_CACHE_MAX_ENTRIES': 10000,
+    'METRICS_ENABLED': True,  # 是否提供/metrics接口
+    # 日志
+    'LOG_LEVEL': 'INFO',  # DEBUG、INFO、WARNING、ERROR
+    'LOG_FORMAT': 'text',  # text或json
+    'LOG_RATE_LIMIT': 60,  # 相同的警告和错误在该时间内只输出一次（秒），0为不限制
+}
+
+SECRET_KEY_FILE = 'secret_key'
+
+
+def load_config(app):
+    """加载默认配置和环境变量"""
+    app.config.from_mapping(DEFAULTS)
+    app.config.from_prefixed_env('CLIPSYNC')
+
+
+def load_secret_key(instance_path):
+    """读取持久化的密钥，不存在时生成一个，保证重启和多进程之间会话有效"""
+    os.makedirs(instance_path, exist_ok=True)
+    path = os.path.join(instance_path, SECRET_KEY_FILE)
+    try:
+        # O_EXCL保证多个工作进程同时启动时只有一个生成密钥
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    return key
+
+
+def engine_options(config):
+    """根据数据库类型生成SQLAlchemy引擎参数"""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}  # 内存数据库使用单连接
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'connect_args': {
+                'timeout': config['SQLITE_BUSY_TIMEOUT'],
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': True
+    }
+
+
+def sqlite_pragmas(config):
+    """每个新的SQLite连接需要执行的PRAGMA"""
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'] * 1000)}",
+    ]
@@ -0,0 +1,48 @@
+import importlib
+import sys
+
+import pytest
+
+ENGINES = ('sqlalchemy', 'memory', 'sharded')
+
+
+def load_app(tmp_path, **config):
+    """重新导入app模块并初始化，create_app在每个模块实例中只初始化一次"""
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/clipboard.db',
+        'SECRET_KEY': 'test',
+        'BLOB_STORE_PATH': str(tmp_path / 'blobs'),
+        'STORAGE_SHARD_PATH': str(tmp_path / 'shards'),
+        'LOG_LEVEL': 'WARNING',
+    }
+    settings.update(config)
+    module.create_app(settings)
+    return module
+
+
+def login(client, username='alice', password='secret', client_id='test-client'):
+    """注册用户并用访问令牌登录，之后的请求都带该令牌"""
+    client.post('/api/register', json={'username': username, 'password': password})
+    response = client.post('/api/tokens', json={'username': username, 'password': password, 'client_id': client_id})
+    assert response.status_code == 201
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.json['token']}"
+    return response.json
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request):
+    return request.param
+
+
+@pytest.fixture
+def server(tmp_path, engine):
+    return load_app(tmp_path, STORAGE_ENGINE=engine)
+
+
+@pytest.fixture
+def client(server):
+    client = server.app.test_client()
+    login(client)
+    return client
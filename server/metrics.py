@@ -0,0 +1,155 @@
+"""Prometheus文本格式的进程内指标
+
+只实现服务端用到的计数器、仪表和直方图，不依赖prometheus_client。
+多进程部署时每个工作进程各自统计，/metrics返回处理该请求的进程的数据。
+"""
+import bisect
+import math
+import threading
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # 标签值元组 -> 值
+
+    def check_labels(self, values):
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} 需要标签 {self.labels}")
+
+    def samples(self):
+        """返回[(后缀, 标签值, 附加标签, 值)]"""
+        with self.lock:
+            return [('', key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{format_labels(self.labels, key, extra)} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.check_labels(labels)
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """可直接设置的值，或者在采集时调用callback取值
+
+    callback返回数值（无标签时）或 {标签值元组: 值}。
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value, *labels):
+        self.check_labels(labels)
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [('', key, (), value) for key, value in sorted(values.items())]
+
+
+class CallbackCounter(Gauge):
+    """在采集时从其他组件读取的累计值，例如缓存的命中次数"""
+    kind = 'counter'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        self.check_labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # 各区间的计数（不累计）、总和、总数
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self.values.items())]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, (('le', format_value(bound)),), cumulative))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+
+class Registry:
+    """按注册顺序输出全部指标"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def callback_counter(self, name, documentation, callback, labels=()):
+        return self.register(CallbackCounter(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
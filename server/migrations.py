@@ -0,0 +1,313 @@
+"""数据库结构版本管理
+
+每个迁移有一个递增的版本号，已应用的版本记录在schema_version表中。
+启动时自动执行未应用的迁移，也可以单独运行：
+
+    python migrations.py instance/clipboard.db
+"""
+import sys
+import hashlib
+import logging
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, text
+
+try:
+    import fcntl
+except ImportError:  # Windows上只用于单进程开发服务器
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []  # (版本号, 说明, 迁移函数)
+
+
+def migration(version, description):
+    """注册迁移函数，版本号必须递增"""
+    def decorator(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"迁移版本号必须递增: {version}")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+def head_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def get_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = conn.execute(text('SELECT version FROM schema_version')).scalar()
+    if version is None:
+        conn.execute(text('INSERT INTO schema_version (version) VALUES (0)'))
+        return 0
+    return version
+
+
+def set_version(conn, version):
+    conn.execute(text('UPDATE schema_version SET version = :version'), {'version': version})
+
+
+def stamp(engine, version=None):
+    """将数据库标记为指定版本（新建的数据库已是最新结构，无需执行迁移）"""
+    with engine.begin() as conn:
+        get_version(conn)
+        set_version(conn, head_version() if version is None else version)
+
+
+def upgrade(engine, target=None):
+    """按顺序执行未应用的迁移直到target版本（默认最新），每个迁移在独立事务中完成，返回已执行的版本列表"""
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            if get_version(conn) >= version:
+                continue
+            logger.info("执行数据库迁移 %s: %s", version, description)
+            func(conn)
+            set_version(conn, version)
+        applied.append(version)
+    return applied
+
+
+@contextmanager
+def schema_lock(engine):
+    """数据库文件旁的排他文件锁，多个工作进程同时启动时依次检查、建表和迁移"""
+    path = engine.url.database
+    if fcntl is None or engine.dialect.name != 'sqlite' or not path or path == ':memory:':
+        yield
+        return
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def init_database(db):
+    """创建缺失的表并把数据库升级到最新版本"""
+    engine = db.engine
+    with schema_lock(engine):
+        # 在锁内检查，先拿到锁的进程建好的表不会被当作新数据库再建一次
+        if not inspect(engine).has_table('clipboard_item'):
+            db.create_all()
+            stamp(engine)
+            return
+        # 已有数据库先迁移：迁移按各自版本的结构建表，create_all先建成最新结构会使旧迁移写入失败；
+        # create_all之后只补建缺失的表，已有表的新索引和新列由迁移负责
+        upgrade(engine)
+        db.create_all()
+
+
+@migration(1, '为剪贴板内容和客户端连接添加复合索引')
+def add_composite_indexes(conn):
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_clipboard_item_user_timestamp '
+        'ON clipboard_item (user_id, timestamp)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_clipboard_item_user_id_id '
+        'ON clipboard_item (user_id, id)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_client_connection_user_online '
+        'ON client_connection (user_id, is_online)'
+    ))
+
+
+@migration(2, '剪贴板内容按SHA-256去重保存到clipboard_blob表')
+def deduplicate_clipboard_content(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS clipboard_blob ('
+        'hash VARCHAR(64) NOT NULL, content TEXT NOT NULL, size INTEGER NOT NULL, '
+        'ref_count INTEGER NOT NULL, created_at DATETIME, PRIMARY KEY (hash))'
+    ))
+    columns = [column['name'] for column in inspect(conn).get_columns('clipboard_item')]
+    if 'blob_hash' not in columns:
+        conn.execute(text(
+            'ALTER TABLE clipboard_item ADD COLUMN blob_hash VARCHAR(64) REFERENCES clipboard_blob (hash)'
+        ))
+
+    # 分批把已有内容移入内容块表，模拟输入指令仍保存在原表中
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, content FROM clipboard_item WHERE id > :last_id AND blob_hash IS NULL "
+            "AND content_type IS NOT 'typing_command' ORDER BY id LIMIT 1000"
+        ), {'last_id': last_id}).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        digests = {}
+        counts = Counter()
+        for row in rows:
+            digest = hashlib.sha256(row.content.encode('utf-8')).hexdigest()
+            digests[row.id] = (digest, row.content)
+            counts[digest] += 1
+
+        blobs = {digest: content for digest, content in digests.values()}
+        conn.execute(text(
+            'INSERT INTO clipboard_blob (hash, content, size, ref_count, created_at) '
+            'VALUES (:hash, :content, :size, :count, :created_at) '
+            'ON CONFLICT (hash) DO UPDATE SET ref_count = ref_count + excluded.ref_count'
+        ), [
+            {
+                'hash': digest,
+                'content': content,
+                'size': len(content.encode('utf-8')),
+                'count': counts[digest],
+                'created_at': datetime.now()
+            }
+            for digest, content in blobs.items()
+        ])
+        conn.execute(text(
+            "UPDATE clipboard_item SET blob_hash = :hash, content = '' WHERE id = :id"
+        ), [{'hash': digest, 'id': clip_id} for clip_id, (digest, _) in digests.items()])
+
+
+@migration(3, '内容块支持保存到磁盘，新增分块上传表')
+def add_blob_storage(conn):
+    columns = [column['name'] for column in inspect(conn).get_columns('clipboard_blob')]
+    if 'storage' not in columns:
+        conn.execute(text("ALTER TABLE clipboard_blob ADD COLUMN storage VARCHAR(10) NOT NULL DEFAULT 'db'"))
+    if 'mimetype' not in columns:
+        conn.execute(text('ALTER TABLE clipboard_blob ADD COLUMN mimetype VARCHAR(100)'))
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS clipboard_upload ('
+        'id VARCHAR(32) NOT NULL, user_id INTEGER NOT NULL, content_type VARCHAR(20), '
+        'mimetype VARCHAR(100), size INTEGER NOT NULL, content_hash VARCHAR(64), created_at DATETIME, '
+        'PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id))'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_clipboard_upload_created_at ON clipboard_upload (created_at)'
+    ))
+
+
+@migration(4, '客户端指令改为保存在client_command表，删除保存为剪贴板内容的模拟输入指令')
+def add_client_commands(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS client_command ('
+        'id INTEGER NOT NULL, command_id VARCHAR(36) NOT NULL, user_id INTEGER NOT NULL, '
+        'client_id VARCHAR(100) NOT NULL, action VARCHAR(30) NOT NULL, payload TEXT NOT NULL, '
+        'state VARCHAR(20) NOT NULL, created_at DATETIME, expires_at DATETIME NOT NULL, '
+        'delivered_at DATETIME, acked_at DATETIME, '
+        'PRIMARY KEY (id), UNIQUE (command_id), FOREIGN KEY(user_id) REFERENCES user (id))'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_client_command_client_state ON client_command (client_id, state)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_client_command_created_at ON client_command (created_at)'
+    ))
+    # 旧的指令没有内容块，直接删除即可
+    conn.execute(text("DELETE FROM clipboard_item WHERE content_type = 'typing_command'"))
+
+
+# 保存时间的列，迁移5之前为服务器本地时间
+DATETIME_COLUMNS = [
+    ('clipboard_item', 'timestamp'),
+    ('client_connection', 'last_seen'),
+    ('clipboard_blob', 'created_at'),
+    ('clipboard_upload', 'created_at'),
+    ('client_command', 'created_at'),
+    ('client_command', 'expires_at'),
+    ('client_command', 'delivered_at'),
+    ('client_command', 'acked_at'),
+]
+
+
+@migration(5, '时间改为保存UTC时间')
+def convert_times_to_utc(conn):
+    # SQLite的utc修饰符按本机时区（含夏令时）把本地时间转换为UTC，
+    # 时间格式为YYYY-MM-DD HH:MM:SS.ffffff，第20位起的小数部分原样保留
+    for table, column in DATETIME_COLUMNS:
+        conn.execute(text(
+            f"UPDATE {table} SET {column} = strftime('%Y-%m-%d %H:%M:%S', {column}, 'utc') || substr({column}, 20) "
+            f"WHERE {column} IS NOT NULL"
+        ))
+
+
+@migration(6, '新增客户端访问令牌表auth_token')
+def add_auth_tokens(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS auth_token ('
+        'id INTEGER NOT NULL, token_hash VARCHAR(64) NOT NULL, user_id INTEGER NOT NULL, '
+        'client_id VARCHAR(100), created_at DATETIME, expires_at DATETIME NOT NULL, '
+        'PRIMARY KEY (id), UNIQUE (token_hash), FOREIGN KEY(user_id) REFERENCES user (id))'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_auth_token_client_id ON auth_token (client_id)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_auth_token_expires_at ON auth_token (expires_at)'
+    ))
+
+
+@migration(7, '剪贴板记录ID改为AUTOINCREMENT，删除最新记录后ID不再被重用')
+def autoincrement_clip_ids(conn):
+    # SQLite不能修改已有表的主键，新建表复制数据后替换；复制时sqlite_sequence记录当前最大ID
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'clipboard_item'")).scalar()
+    if 'AUTOINCREMENT' in sql.upper():
+        return
+    conn.execute(text(
+        'CREATE TABLE clipboard_item_new ('
+        'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, content TEXT NOT NULL, content_type VARCHAR(20), '
+        'timestamp DATETIME, user_id INTEGER NOT NULL, blob_hash VARCHAR(64), '
+        'FOREIGN KEY(user_id) REFERENCES user (id), FOREIGN KEY(blob_hash) REFERENCES clipboard_blob (hash))'
+    ))
+    conn.execute(text(
+        'INSERT INTO clipboard_item_new (id, content, content_type, timestamp, user_id, blob_hash) '
+        'SELECT id, content, content_type, timestamp, user_id, blob_hash FROM clipboard_item'
+    ))
+    conn.execute(text('DROP TABLE clipboard_item'))
+    conn.execute(text('ALTER TABLE clipboard_item_new RENAME TO clipboard_item'))
+    conn.execute(text(
+        'CREATE INDEX ix_clipboard_item_user_timestamp ON clipboard_item (user_id, timestamp)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX ix_clipboard_item_user_id_id ON clipboard_item (user_id, id)'
+    ))
+
+
+@migration(8, '新增storage_meta表，记录令牌、客户端指令和分块上传所属的存储数据')
+def add_storage_meta(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS storage_meta ('
+        'key VARCHAR(50) NOT NULL, value VARCHAR(100) NOT NULL, PRIMARY KEY (key))'
+    ))
+    # 已有的记录属于本数据库中的用户（默认的sqlalchemy存储引擎）
+    instance_id = uuid.uuid4().hex
+    conn.execute(text(
+        "INSERT OR IGNORE INTO storage_meta (key, value) VALUES ('instance_id', :value), ('active_storage', :value)"
+    ), {'value': instance_id})
+
+
+@migration(9, '模拟输入进度和取消标记保存在client_command表中')
+def add_typing_progress(conn):
+    columns = [column['name'] for column in inspect(conn).get_columns('client_command')]
+    for name, definition in (
+        ('progress_state', "VARCHAR(20) NOT NULL DEFAULT 'sent'"),
+        ('typed', 'INTEGER NOT NULL DEFAULT 0'),
+        ('total', 'INTEGER NOT NULL DEFAULT 0'),
+        ('error', 'TEXT'),
+        ('cancel_requested', 'BOOLEAN NOT NULL DEFAULT 0'),
+    ):
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE client_command ADD COLUMN {name} {definition}'))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法: python migrations.py <数据库文件路径>")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    engine = create_engine(f'sqlite:///{sys.argv[1]}')
+    with schema_lock(engine):
+        applied = upgrade(engine)
+    print(f"数据库已是最新版本 {head_version()}" if not applied else f"已执行迁移: {applied}")
@@ -0,0 +1,52 @@
+import queue
+import threading
+
+
+class ClipboardNotifier:
+    """按用户分发剪贴板变更事件的进程内通知器"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscribers = {}  # user_id -> 订阅队列集合
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """为用户注册一个订阅队列"""
+        subscription = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        """注销订阅队列"""
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data):
+        """向用户的所有订阅者推送事件，不阻塞写请求"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        for subscription in subscribers:
+            while True:
+                try:
+                    subscription.put_nowait((event, data))
+                    break
+                except queue.Full:
+                    # 消费过慢的连接丢弃最旧的事件，保证最新内容能送达
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def subscriber_count(self, user_id=None):
+        """返回订阅连接数量"""
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
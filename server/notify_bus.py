@@ -0,0 +1,266 @@
+"""工作进程之间的变更通知总线
+
+写请求所在的进程把事件发布到总线，每个进程收到后交给本进程的推送连接：
+  local  只在本进程内分发，单进程运行时使用
+  unix   通过本机Unix套接字上的代理转发给所有工作进程，不需要额外的服务
+代理由工作进程自己承担：持有锁文件的进程监听套接字并转发消息，该进程退出后锁被释放，
+其他进程重连时重新竞争，由获得锁的进程接替。
+"""
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_INTERVAL = 0.5  # 与代理断开后重连的间隔（秒）
+CONNECT_TIMEOUT = 2  # 推送连接首次使用总线时等待连接代理的时间（秒），发布事件不等待
+SEND_TIMEOUT = 5  # 代理向某个进程转发超时后断开该进程
+MAX_OUTBOX = 1000  # 与代理断开期间暂存的待发送事件数
+
+
+class NotifyBus:
+    """通知总线接口，deliver(user_id, event, data)把事件交给本进程的推送连接"""
+    name = 'base'
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def start(self):
+        """开始接收其他进程的事件，可重复调用"""
+
+    def ready(self):
+        """本进程当前能否收到其他进程的事件，不能时依赖这些事件保持一致的进程内缓存不可使用"""
+        return True
+
+    def publish(self, user_id, event, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalBus(NotifyBus):
+    """只在本进程内分发"""
+    name = 'local'
+
+    def publish(self, user_id, event, data):
+        self.deliver(user_id, event, data)
+
+
+class UnixSocketBus(NotifyBus):
+    """通过Unix套接字代理在本机的工作进程之间转发事件
+
+    本进程发布的事件直接交给本进程的推送连接，不经过代理；发往代理的事件放入发件箱，
+    由发送线程发送，写请求不等待连接或发送。与代理断开期间的事件暂存在发件箱中，重连后补发。
+    """
+    name = 'unix'
+
+    def __init__(self, deliver, path, on_connect=None):
+        super().__init__(deliver)
+        self.path = path
+        # 每次连上代理后调用：断开期间的事件已丢失，进程内缓存需要清空
+        self.on_connect = on_connect
+        self.lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)  # 发件箱有新事件或连上代理时通知发送线程
+        self.connected = threading.Event()
+        self.pid = None
+        self.closed = False
+
+    def reset(self):
+        # 每个进程使用自己的连接和线程，fork后的子进程重新初始化
+        self.pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.sock = None
+        self.outbox = deque(maxlen=MAX_OUTBOX)
+        self.broker = None
+        self.connected.clear()
+
+    def start(self, wait=True):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.reset()
+            threading.Thread(target=self.run, daemon=True).start()
+            threading.Thread(target=self.send_loop, daemon=True).start()
+        # 推送连接首次使用时等待连接代理，避免刚建立的推送连接错过其他进程的事件
+        if wait:
+            self.connected.wait(CONNECT_TIMEOUT)
+
+    def ready(self):
+        self.start(wait=False)
+        return self.connected.is_set()
+
+    def publish(self, user_id, event, data):
+        self.start(wait=False)
+        self.deliver(user_id, event, data)
+        message = json.dumps({'origin': self.origin, 'user_id': user_id, 'event': event, 'data': data}) + '\n'
+        with self.lock:
+            self.outbox.append(message.encode('utf-8'))
+            self.pending.notify()
+
+    def send_loop(self):
+        # 在锁外发送，代理交接或阻塞时只有发送线程等待
+        while True:
+            with self.lock:
+                while not self.closed and (self.sock is None or not self.outbox):
+                    self.pending.wait()
+                if self.closed:
+                    return
+                sock, message = self.sock, self.outbox[0]
+            try:
+                sock.sendall(message)
+            except OSError as e:
+                logger.warning("向通知代理发送失败: %s", e)
+                with self.lock:
+                    if self.sock is sock:
+                        self.disconnect()
+                continue
+            with self.lock:
+                # 发件箱已满时最早的事件可能已被挤出
+                if self.outbox and self.outbox[0] is message:
+                    self.outbox.popleft()
+
+    def disconnect(self):
+        # 调用方持有self.lock
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+        self.connected.clear()
+
+    def run(self):
+        while not self.closed:
+            if self.broker is None:
+                self.broker = UnixBroker.acquire(self.path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                time.sleep(RECONNECT_INTERVAL)
+                continue
+            if self.on_connect is not None:
+                self.on_connect()
+            with self.lock:
+                self.sock = sock
+                self.connected.set()
+                self.pending.notify()
+            self.receive(sock)
+            with self.lock:
+                if self.sock is sock:
+                    self.disconnect()
+            if not self.closed:
+                logger.warning("与通知代理的连接已断开，正在重连")
+                time.sleep(RECONNECT_INTERVAL)
+
+    def receive(self, sock):
+        try:
+            for line in sock.makefile('rb'):
+                message = json.loads(line)
+                # 代理不会回传给发送方，origin用于防止重连期间收到自己的事件
+                if message['origin'] != self.origin:
+                    self.deliver(message['user_id'], message['event'], message['data'])
+        except (OSError, ValueError) as e:
+            logger.debug("读取通知代理消息失败: %s", e)
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            self.disconnect()
+            self.pending.notify_all()
+        if self.broker is not None:
+            self.broker.close()
+
+
+class UnixBroker:
+    """把每个进程发来的事件转发给其他所有进程"""
+
+    def __init__(self, path, lock_file):
+        self.path = path
+        self.lock_file = lock_file
+        self.clients = {}  # 连接 -> 发送锁，多个转发线程不会交错写入同一连接
+        self.lock = threading.Lock()
+        # 持有锁即说明之前的代理已退出，残留的套接字文件可以删除
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+        logger.info("本进程(%s)承担通知代理: %s", os.getpid(), path)
+
+    @classmethod
+    def acquire(cls, path):
+        """获得锁文件时在本进程启动代理并返回，其他进程已是代理时返回None"""
+        import fcntl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        lock_file = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return cls(path, lock_file)
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            # 只限制发送，读取不超时，空闲的进程不会被断开
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', SEND_TIMEOUT, 0))
+            with self.lock:
+                self.clients[conn] = threading.Lock()
+            threading.Thread(target=self.forward, args=(conn,), daemon=True).start()
+
+    def forward(self, conn):
+        try:
+            for line in conn.makefile('rb'):
+                with self.lock:
+                    targets = [(client, lock) for client, lock in self.clients.items() if client is not conn]
+                for client, lock in targets:
+                    try:
+                        with lock:
+                            client.sendall(line)
+                    except OSError:
+                        self.drop(client)
+        except OSError:
+            pass
+        finally:
+            self.drop(conn)
+
+    def drop(self, conn):
+        with self.lock:
+            self.clients.pop(conn, None)
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.close()
+
+    def close(self):
+        self.server.close()
+        with self.lock:
+            clients = list(self.clients)
+        for conn in clients:
+            self.drop(conn)
+        self.lock_file.close()
+
+
+def create_bus(kind, deliver, socket_path=None, on_connect=None):
+    """kind为local或unix，on_connect在每次连上代理后调用"""
+    if kind == 'local':
+        return LocalBus(deliver)
+    if kind == 'unix':
+        return UnixSocketBus(deliver, socket_path, on_connect)
+    raise ValueError(f"未知的通知总线: {kind}")
@@ -0,0 +1,86 @@
+import os
+import sys
+
+STREAM_SHARE = 0.75  # 推送连接最多占用的线程数或连接数比例，其余留给普通请求
+
+
+def stream_limit(slots):
+    """每个进程的推送连接上限，至少为普通请求保留一个线程或连接"""
+    return max(1, min(slots - 1, int(slots * STREAM_SHARE)))
+
+
+def resolve_worker_class(worker_class):
+    """auto时安装了gevent则使用gevent，否则使用gthread"""
+    if worker_class != 'auto':
+        return worker_class
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return 'gthread'
+    return 'gevent'
+
+
+def run_server(host, port, workers, threads, connections=1000, worker_class='auto'):
+    """使用生产WSGI服务器运行：优先gunicorn（多进程），Windows等环境退回waitress（单进程多线程）
+
+    推送连接在整个连接期间占用服务器的一个处理单元：gevent模式下是一个协程，可以同时保持大量连接；
+    gthread和waitress下是一个线程。推送连接数达到上限后新的推送请求返回503，客户端改为轮询。
+    """
+    if workers > 1:
+        # 工作进程启动时从环境变量读取配置
+        os.environ['CLIPSYNC_MULTIPROCESS'] = 'true'
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        run_waitress(host, port, workers, threads)
+        return
+
+    worker_class = resolve_worker_class(worker_class)
+    slots = connections if worker_class == 'gevent' else threads
+    os.environ.setdefault('CLIPSYNC_STREAM_MAX_CONNECTIONS', str(stream_limit(slots)))
+
+    class ClipSyncApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('worker_class', worker_class)
+            if worker_class == 'gevent':
+                # 每个连接一个协程，推送连接不占用线程
+                self.cfg.set('worker_connections', connections)
+            else:
+                # gthread下推送连接各占一个线程，推送连接数受上限限制
+                self.cfg.set('threads', threads)
+            self.cfg.set('keepalive', 30)
+            self.cfg.set('graceful_timeout', 5)
+
+        def load(self):
+            # 在各工作进程中加载，避免fork前创建数据库连接
+            from app import create_app
+            return create_app()
+
+    if worker_class == 'gevent':
+        print(f"使用gunicorn(gevent)启动: http://{host}:{port} ({workers} 个进程 x {connections} 个连接)")
+    else:
+        print(f"使用gunicorn启动: http://{host}:{port} ({workers} 个进程 x {threads} 个线程)")
+    ClipSyncApplication().run()
+
+
+def run_waitress(host, port, workers, threads):
+    try:
+        from waitress import serve
+    except ImportError:
+        print("未安装gunicorn或waitress，请执行 pip install -r requirements.txt")
+        sys.exit(1)
+
+    if workers > 1:
+        print("waitress只支持单进程，忽略--workers参数")
+        os.environ.pop('CLIPSYNC_MULTIPROCESS', None)
+    os.environ.setdefault('CLIPSYNC_STREAM_MAX_CONNECTIONS', str(stream_limit(threads)))
+
+    from app import create_app
+    print(f"使用waitress启动: http://{host}:{port} ({threads} 个线程)")
+    serve(create_app(), host=host, port=port, threads=threads)
@@ -0,0 +1,418 @@
+"""按用户分片的SQLite存储
+
+每个用户的全部数据（用户记录、剪贴板记录、内容块和客户端）只保存在一个分片文件中，
+用户名的哈希决定分片，用户ID的低位记录分片序号（ID = 分片内ID * 分片数 + 分片序号），
+之后按ID即可找到分片。SQLite每个文件只有一把写锁，不同分片的用户写入互不阻塞。
+分片数决定了用户ID的编码，建立数据后不能再修改。内容块按分片去重，磁盘上的文件各分片共用。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from storage import (Storage, StorageBusy, UserRecord, ClientRecord, BlobRecord, BatchResult,
+                     BLOB_STORAGE_DB, BLOB_STORAGE_FILE, get_current_time, clip_data)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (
+    id INTEGER PRIMARY KEY, username TEXT NOT NULL UNIQUE, password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clipboard_blob (
+    hash TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT, storage TEXT NOT NULL DEFAULT 'db', mimetype TEXT
+);
+CREATE TABLE IF NOT EXISTS clipboard_item (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, content_type TEXT, blob_hash TEXT NOT NULL, timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_clipboard_item_user_timestamp ON clipboard_item (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS ix_clipboard_item_user_id_id ON clipboard_item (user_id, id);
+CREATE TABLE IF NOT EXISTS client_connection (
+    id INTEGER PRIMARY KEY, client_id TEXT NOT NULL UNIQUE, user_id INTEGER NOT NULL,
+    last_seen TEXT, is_online INTEGER NOT NULL DEFAULT 1, name TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_client_connection_user_online ON client_connection (user_id, is_online);
+CREATE TABLE IF NOT EXISTS storage_meta (
+    key TEXT PRIMARY KEY, value TEXT NOT NULL
+);
+"""
+
+# 早期的分片文件中剪贴板记录ID没有AUTOINCREMENT，删除最新记录后会被重用
+UPGRADE_CLIP_IDS = (
+    'CREATE TABLE clipboard_item_new ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, content_type TEXT, blob_hash TEXT NOT NULL, '
+    'timestamp TEXT NOT NULL)',
+    'INSERT INTO clipboard_item_new (id, user_id, content_type, blob_hash, timestamp) '
+    'SELECT id, user_id, content_type, blob_hash, timestamp FROM clipboard_item',
+    'DROP TABLE clipboard_item',
+    'ALTER TABLE clipboard_item_new RENAME TO clipboard_item',
+    'CREATE INDEX ix_clipboard_item_user_timestamp ON clipboard_item (user_id, timestamp)',
+    'CREATE INDEX ix_clipboard_item_user_id_id ON clipboard_item (user_id, id)',
+)
+
+CLIP_COLUMNS = (
+    'SELECT c.id, c.user_id, c.content_type, c.blob_hash, c.timestamp, b.content, b.size, b.storage '
+    'FROM clipboard_item c JOIN clipboard_blob b ON b.hash = c.blob_hash'
+)
+
+
+def format_db_time(value):
+    # 固定包含微秒，按字符串比较与时间先后一致
+    return value.isoformat(' ', 'microseconds')
+
+
+def parse_db_time(value):
+    return datetime.fromisoformat(value)
+
+
+def serialize_row(row):
+    content = None if row['storage'] == BLOB_STORAGE_FILE else row['content']
+    return clip_data(row['id'], row['content_type'], row['blob_hash'], content, row['size'], parse_db_time(row['timestamp']))
+
+
+def client_record(row):
+    return ClientRecord(row['client_id'], row['user_id'], row['name'], parse_db_time(row['last_seen']), bool(row['is_online']))
+
+
+def placeholders(values):
+    return ','.join('?' * len(values))
+
+
+class SQLiteShard:
+    """一个分片文件，每个线程使用自己的连接"""
+
+    def __init__(self, path, pragmas=(), timeout=5):
+        self.path = path
+        self.pragmas = list(pragmas)
+        self.timeout = timeout
+        self.local = threading.local()
+        with translate_busy():
+            self.connection().executescript(SCHEMA)
+        # 多个工作进程同时打开时只有先获得写锁的进程升级
+        with self.transaction() as conn:
+            sql, = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'clipboard_item'").fetchone()
+            if 'AUTOINCREMENT' not in sql.upper():
+                for statement in UPGRADE_CLIP_IDS:
+                    conn.execute(statement)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None时由transaction()显式开始和提交事务
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in self.pragmas:
+                conn.execute(pragma)
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # 写事务一开始就获取写锁，避免读锁升级为写锁时死锁
+        conn = self.connection()
+        with translate_busy():
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def query(self, sql, params=()):
+        with translate_busy():
+            return self.connection().execute(sql, params).fetchall()
+
+
+@contextmanager
+def translate_busy():
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        message = str(e).lower()
+        if 'locked' in message or 'busy' in message:
+            raise StorageBusy(str(e)) from e
+        raise
+
+
+class ShardedSQLiteStorage(Storage):
+    name = 'sharded'
+    multiprocess = True
+
+    def __init__(self, directory, shards=4, history_limit=20, pragmas=(), timeout=5):
+        super().__init__(history_limit)
+        os.makedirs(directory, exist_ok=True)
+        self.shards = [
+            SQLiteShard(os.path.join(directory, f'shard-{index}.db'), pragmas, timeout)
+            for index in range(shards)
+        ]
+        # 存储数据的标识保存在第一个分片中，多个工作进程同时启动时以先写入的为准
+        with self.shards[0].transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO storage_meta (key, value) VALUES ('instance_id', ?)", (uuid.uuid4().hex,)
+            )
+            self.instance_id, = conn.execute("SELECT value FROM storage_meta WHERE key = 'instance_id'").fetchone()
+
+    def shard_index(self, username):
+        digest = hashlib.sha1(username.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') % len(self.shards)
+
+    def user_shard(self, user_id):
+        return self.shards[user_id % len(self.shards)]
+
+    # 用户
+    def create_user(self, username, password_hash):
+        index = self.shard_index(username)
+        try:
+            with self.shards[index].transaction() as conn:
+                local_id = conn.execute(
+                    'INSERT INTO user (username, password_hash) VALUES (?, ?)', (username, password_hash)
+                ).lastrowid
+        except sqlite3.IntegrityError:
+            return None
+        return local_id * len(self.shards) + index
+
+    def find_user(self, username):
+        index = self.shard_index(username)
+        rows = self.shards[index].query('SELECT id, username, password_hash FROM user WHERE username = ?', (username,))
+        if not rows:
+            return None
+        return UserRecord(rows[0]['id'] * len(self.shards) + index, rows[0]['username'], rows[0]['password_hash'])
+
+    # 内容块
+    def acquire_blobs(self, conn, blobs):
+        # blobs为[(内容, 摘要, 大小, 存储位置, MIME类型)]，相同摘要只插入一次并累加引用计数
+        counts = Counter(blob[1] for blob in blobs)
+        rows = {}
+        for content, digest, size, storage, mimetype in blobs:
+            rows.setdefault(digest, (
+                digest, '' if content is None else content, size, counts[digest],
+                format_db_time(get_current_time()), storage, mimetype
+            ))
+        conn.executemany(
+            'INSERT INTO clipboard_blob (hash, content, size, ref_count, created_at, storage, mimetype) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (hash) DO UPDATE SET ref_count = ref_count + excluded.ref_count',
+            list(rows.values())
+        )
+
+    def release_blobs(self, conn, digests):
+        # 引用计数减一，删除不再被引用的内容块，返回其中保存在磁盘上的摘要
+        counts = Counter(digest for digest in digests if digest)
+        if not counts:
+            return []
+        conn.executemany(
+            'UPDATE clipboard_blob SET ref_count = ref_count - ? WHERE hash = ?',
+            [(count, digest) for digest, count in counts.items()]
+        )
+        digests = list(counts)
+        unused = conn.execute(
+            f'SELECT hash, storage FROM clipboard_blob WHERE ref_count <= 0 AND hash IN ({placeholders(digests)})',
+            digests
+        ).fetchall()
+        if not unused:
+            return []
+        conn.execute(
+            f'DELETE FROM clipboard_blob WHERE hash IN ({placeholders(unused)})', [row['hash'] for row in unused]
+        )
+        return [row['hash'] for row in unused if row['storage'] == BLOB_STORAGE_FILE]
+
+    # 剪贴板记录
+    def insert_clips(self, conn, user_id, clips):
+        # clips为[(content_type, 摘要)]，返回新记录的ID
+        now = format_db_time(get_current_time())
+        return [
+            conn.execute(
+                'INSERT INTO clipboard_item (user_id, content_type, blob_hash, timestamp) VALUES (?, ?, ?, ?)',
+                (user_id, content_type, digest, now)
+            ).lastrowid
+            for content_type, digest in clips
+        ]
+
+    def delete_rows(self, conn, condition, params):
+        rows = conn.execute(f'SELECT id, blob_hash FROM clipboard_item WHERE {condition}', params).fetchall()
+        if rows:
+            conn.execute(
+                f'DELETE FROM clipboard_item WHERE id IN ({placeholders(rows)})', [row['id'] for row in rows]
+            )
+        return rows
+
+    def trim(self, conn, user_id):
+        # 删除超出上限的旧记录，返回被删除的(id, blob_hash)
+        return self.delete_rows(
+            conn,
+            'user_id = ? AND id NOT IN (SELECT id FROM clipboard_item WHERE user_id = ? '
+            'ORDER BY timestamp DESC, id DESC LIMIT ?)',
+            (user_id, user_id, self.history_limit)
+        )
+
+    def load_clips(self, conn, ids):
+        rows = conn.execute(f'{CLIP_COLUMNS} WHERE c.id IN ({placeholders(ids)}) ORDER BY c.id', ids).fetchall()
+        return [serialize_row(row) for row in rows]
+
+    def add_clip(self, user_id, content_type, content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None):
+        with self.user_shard(user_id).transaction() as conn:
+            self.acquire_blobs(conn, [(content, digest, size, storage, mimetype)])
+            data, trimmed, files = self.finish_add(conn, user_id, content_type, digest)
+        self.release_files(files)
+        return data, trimmed
+
+    def add_clip_by_hash(self, user_id, content_type, digest):
+        with self.user_shard(user_id).transaction() as conn:
+            updated = conn.execute(
+                'UPDATE clipboard_blob SET ref_count = ref_count + 1 WHERE hash = ?', (digest,)
+            ).rowcount
+            if not updated:
+                return None
+            data, trimmed, files = self.finish_add(conn, user_id, content_type, digest)
+        self.release_files(files)
+        return data, trimmed
+
+    def finish_add(self, conn, user_id, content_type, digest):
+        clip_id, = self.insert_clips(conn, user_id, [(content_type, digest)])
+        data, = self.load_clips(conn, [clip_id])
+        trimmed = self.trim(conn, user_id)
+        files = self.release_blobs(conn, [row['blob_hash'] for row in trimmed])
+        return data, [row['id'] for row in trimmed], files
+
+    def apply_batch(self, user_id, inserts, deletes=(), clear=False):
+        with self.user_shard(user_id).transaction() as conn:
+            deleted = []
+            if clear:
+                deleted = self.delete_rows(conn, 'user_id = ?', (user_id,))
+            elif deletes:
+                deletes = list(deletes)
+                deleted = self.delete_rows(conn, f'user_id = ? AND id IN ({placeholders(deletes)})', [user_id] + deletes)
+            if inserts:
+                self.acquire_blobs(conn, [
+                    (content, digest, size, BLOB_STORAGE_DB, None) for _, content, digest, size in inserts
+                ])
+            ids = self.insert_clips(conn, user_id, [(content_type, digest) for content_type, _, digest, _ in inserts])
+            added = self.load_clips(conn, ids) if ids else []
+            trimmed = self.trim(conn, user_id) if ids else []
+            files = self.release_blobs(conn, [row['blob_hash'] for row in deleted + trimmed])
+        self.release_files(files)
+        trimmed_ids = [row['id'] for row in trimmed]
+        return BatchResult(
+            ids,
+            [data for data in added if data['id'] not in set(trimmed_ids)],
+            [row['id'] for row in deleted],
+            trimmed_ids
+        )
+
+    def delete_clip(self, user_id, clip_id):
+        with self.user_shard(user_id).transaction() as conn:
+            rows = self.delete_rows(conn, 'user_id = ? AND id = ?', (user_id, clip_id))
+            files = self.release_blobs(conn, [row['blob_hash'] for row in rows])
+        self.release_files(files)
+        return bool(rows)
+
+    def recent_clips(self, user_id, limit=None):
+        rows = self.user_shard(user_id).query(
+            f'{CLIP_COLUMNS} WHERE c.user_id = ? ORDER BY c.timestamp DESC, c.id DESC LIMIT ?',
+            (user_id, -1 if limit is None else limit)
+        )
+        return [serialize_row(row) for row in rows]
+
+    def clips_after(self, user_id, clip_id):
+        rows = self.user_shard(user_id).query(
+            f'{CLIP_COLUMNS} WHERE c.user_id = ? AND c.id > ? ORDER BY c.id ASC', (user_id, clip_id)
+        )
+        return [serialize_row(row) for row in rows]
+
+    def clip_ids(self, user_id):
+        rows = self.user_shard(user_id).query(
+            'SELECT id FROM clipboard_item WHERE user_id = ? ORDER BY timestamp DESC, id DESC', (user_id,)
+        )
+        return [row['id'] for row in rows]
+
+    def clip_version(self, user_id):
+        row, = self.user_shard(user_id).query(
+            'SELECT max(id), count(id) FROM clipboard_item WHERE user_id = ?', (user_id,)
+        )
+        return row[0], row[1]
+
+    def get_blob(self, user_id, digest, check_owner=True):
+        sql = 'SELECT hash, content, size, storage, mimetype FROM clipboard_blob WHERE hash = ?'
+        params = (digest,)
+        if check_owner:
+            sql += ' AND EXISTS (SELECT 1 FROM clipboard_item WHERE user_id = ? AND blob_hash = ?)'
+            params = (digest, user_id, digest)
+        rows = self.user_shard(user_id).query(sql, params)
+        return BlobRecord(*rows[0]) if rows else None
+
+    def existing_blobs(self, digests):
+        digests = list(digests)
+        if not digests:
+            return set()
+        existing = set()
+        for shard in self.shards:
+            rows = shard.query(f'SELECT hash FROM clipboard_blob WHERE hash IN ({placeholders(digests)})', digests)
+            existing.update(row['hash'] for row in rows)
+        return existing
+
+    # 客户端
+    def touch_client(self, client_id, user_id):
+        now = format_db_time(get_current_time())
+        # 已存在的客户端可能属于其他分片的用户，与其他存储引擎一样只更新在线时间
+        if self.update_client_seen(client_id, user_id, now):
+            return
+        # 新客户端在第一个分片的写事务中登记，同时登记同一client_id的请求（包括其他进程）串行执行，
+        # 保证client_id在所有分片中唯一
+        first = self.shards[0]
+        with first.transaction() as first_conn:
+            if self.update_client_seen(client_id, user_id, now, first_conn):
+                return
+            shard = self.user_shard(user_id)
+            insert = 'INSERT INTO client_connection (client_id, user_id, last_seen, is_online) VALUES (?, ?, ?, 1)'
+            if shard is first:
+                first_conn.execute(insert, (client_id, user_id, now))
+            else:
+                with shard.transaction() as conn:
+                    conn.execute(insert, (client_id, user_id, now))
+
+    def update_client_seen(self, client_id, user_id, now, first_conn=None):
+        # 从该用户的分片开始更新client_id的在线时间，返回是否存在；first_conn为已在第一个分片中开始的事务
+        own = self.user_shard(user_id)
+        for shard in [own] + [shard for shard in self.shards if shard is not own]:
+            sql = 'UPDATE client_connection SET last_seen = ?, is_online = 1 WHERE client_id = ?'
+            if shard is self.shards[0] and first_conn is not None:
+                updated = first_conn.execute(sql, (now, client_id)).rowcount
+            else:
+                with shard.transaction() as conn:
+                    updated = conn.execute(sql, (now, client_id)).rowcount
+            if updated:
+                return True
+        return False
+
+    def get_client(self, user_id, client_id):
+        rows = self.user_shard(user_id).query(
+            'SELECT * FROM client_connection WHERE client_id = ? AND user_id = ?', (client_id, user_id)
+        )
+        return client_record(rows[0]) if rows else None
+
+    def online_clients(self, user_id):
+        rows = self.user_shard(user_id).query(
+            'SELECT * FROM client_connection WHERE user_id = ? AND is_online = 1', (user_id,)
+        )
+        return [client_record(row) for row in rows]
+
+    def rename_client(self, user_id, client_id, name):
+        with self.user_shard(user_id).transaction() as conn:
+            return bool(conn.execute(
+                'UPDATE client_connection SET name = ? WHERE client_id = ? AND user_id = ?', (name, client_id, user_id)
+            ).rowcount)
+
+    def delete_client(self, user_id, client_id):
+        with self.user_shard(user_id).transaction() as conn:
+            return bool(conn.execute(
+                'DELETE FROM client_connection WHERE client_id = ? AND user_id = ?', (client_id, user_id)
+            ).rowcount)
+
+    def count_online_clients(self):
+        return sum(
+            shard.query('SELECT count(*) FROM client_connection WHERE is_online = 1')[0][0] for shard in self.shards
+        )
@@ -0,0 +1,363 @@
+"""用户、剪贴板记录、内容块和客户端的存储接口
+
+路由只通过Storage的方法读写这几类数据，由配置STORAGE_ENGINE选择实现：
+  sqlalchemy  Flask-SQLAlchemy模型，数据库由SQLALCHEMY_DATABASE_URI指定（默认，见app.py）
+  memory      进程内存，重启后丢失，用于测试和基准测试
+  sharded     按用户分布到多个SQLite文件，各分片的写入互不阻塞（见sqlite_storage.py）
+分块上传、客户端指令和访问令牌仍保存在SQLALCHEMY_DATABASE_URI指定的数据库中，
+只属于instance_id标识的那一份存储数据。
+"""
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+
+BLOB_STORAGE_DB = 'db'
+BLOB_STORAGE_FILE = 'file'
+
+UserRecord = namedtuple('UserRecord', 'id username password_hash')
+ClientRecord = namedtuple('ClientRecord', 'client_id user_id name last_seen is_online')
+BlobRecord = namedtuple('BlobRecord', 'hash content size storage mimetype')
+# apply_batch的结果：added为写入后未被裁剪的新记录
+BatchResult = namedtuple('BatchResult', 'ids added deleted_ids trimmed_ids')
+ClipRow = namedtuple('ClipRow', 'id user_id content_type blob_hash timestamp')
+
+
+class StorageBusy(Exception):
+    """存储暂时无法写入（例如SQLite等待写锁超时），客户端可以稍后重试"""
+
+
+# 数据库中保存不带时区的UTC时间，返回给客户端时转换为带时区的ISO格式和毫秒时间戳
+def get_current_time():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def format_time(value):
+    return value.replace(tzinfo=timezone.utc).isoformat()
+
+
+def epoch_ms(value):
+    return int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def blob_content(blob):
+    # 保存在磁盘上的内容不随列表返回，客户端通过/api/blobs/<hash>下载
+    return None if blob.storage == BLOB_STORAGE_FILE else blob.content
+
+
+def clip_data(clip_id, content_type, digest, content, size, timestamp):
+    """剪贴板记录返回给客户端和写入缓存的格式"""
+    return {
+        'id': clip_id,
+        'content': content,
+        'content_type': content_type,
+        'content_hash': digest,
+        'size': size,
+        'timestamp': format_time(timestamp),
+        'timestamp_ms': epoch_ms(timestamp)
+    }
+
+
+class Storage(ABC):
+    """存储接口，每个写方法在一个事务中完成
+
+    剪贴板记录以clip_data格式的字典返回，列表按时间从新到旧排列；每个用户只保留最近
+    history_limit条，超出的在写入的同一事务中裁剪。不再被引用的磁盘内容块在提交后
+    通过file_released(摘要列表)通知调用方删除文件。
+    """
+    name = 'base'
+    multiprocess = False  # 多个工作进程能否共享同一份数据
+
+    def __init__(self, history_limit=20):
+        self.history_limit = history_limit
+        self.file_released = None
+        # 标识这一份数据，数据重建或更换存储引擎后用户ID会重新分配，instance_id随之不同
+        self.instance_id = None
+
+    def release_files(self, digests):
+        if digests and self.file_released is not None:
+            self.file_released(digests)
+
+    # 用户
+    @abstractmethod
+    def create_user(self, username, password_hash):
+        """返回新用户ID，用户名已存在时返回None"""
+
+    @abstractmethod
+    def find_user(self, username):
+        """返回UserRecord，不存在时返回None"""
+
+    # 剪贴板记录
+    @abstractmethod
+    def add_clip(self, user_id, content_type, content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None):
+        """保存内容块（已存在时增加引用）并添加记录，返回(记录, 裁剪的ID列表)
+
+        storage为file时内容已由blob_store保存在磁盘上，content为None。
+        """
+
+    @abstractmethod
+    def add_clip_by_hash(self, user_id, content_type, digest):
+        """引用已有的内容块添加记录，返回(记录, 裁剪的ID列表)，没有该内容块时返回None"""
+
+    @abstractmethod
+    def apply_batch(self, user_id, inserts, deletes=(), clear=False):
+        """先删除再按顺序添加，只裁剪一次，inserts为[(content_type, content, digest, size)]，返回BatchResult"""
+
+    @abstractmethod
+    def delete_clip(self, user_id, clip_id):
+        """删除用户的一条记录，返回是否存在"""
+
+    @abstractmethod
+    def recent_clips(self, user_id, limit=None):
+        """按时间从新到旧返回记录，limit为None时返回全部"""
+
+    @abstractmethod
+    def clips_after(self, user_id, clip_id):
+        """返回ID大于clip_id的记录，按ID从小到大"""
+
+    @abstractmethod
+    def clip_ids(self, user_id):
+        """按时间从新到旧返回全部记录的ID"""
+
+    @abstractmethod
+    def clip_version(self, user_id):
+        """返回(最大ID, 条数)"""
+
+    # 内容块
+    @abstractmethod
+    def get_blob(self, user_id, digest, check_owner=True):
+        """返回内容块，check_owner为True时只返回该用户历史记录引用的内容块"""
+
+    @abstractmethod
+    def existing_blobs(self, digests):
+        """返回仍然存在的内容块摘要集合"""
+
+    # 客户端
+    @abstractmethod
+    def touch_client(self, client_id, user_id):
+        """登录时记录客户端连接，已存在时更新最近在线时间"""
+
+    @abstractmethod
+    def get_client(self, user_id, client_id):
+        """返回属于该用户的ClientRecord，不存在时返回None"""
+
+    @abstractmethod
+    def online_clients(self, user_id):
+        """返回该用户在线的ClientRecord列表"""
+
+    @abstractmethod
+    def rename_client(self, user_id, client_id, name):
+        """返回客户端是否存在"""
+
+    @abstractmethod
+    def delete_client(self, user_id, client_id):
+        """返回客户端是否存在"""
+
+    @abstractmethod
+    def count_online_clients(self):
+        """返回所有用户在线的客户端数"""
+
+
+class MemoryStorage(Storage):
+    """全部数据保存在进程内存中，所有操作由一把锁串行化
+
+    重启后数据丢失，也不能在多个工作进程之间共享，用于测试和基准测试。
+    """
+    name = 'memory'
+
+    def __init__(self, history_limit=20):
+        super().__init__(history_limit)
+        self.lock = threading.RLock()
+        self.users = {}  # username -> UserRecord
+        self.clips = {}  # user_id -> [ClipRow]，按写入顺序从旧到新
+        self.blobs = {}  # 摘要 -> [BlobRecord, 引用计数]
+        self.clients = {}  # client_id -> ClientRecord
+        self.last_user_id = 0
+        self.last_clip_id = 0
+        # 每次启动都是一份新数据
+        self.instance_id = uuid.uuid4().hex
+
+    def create_user(self, username, password_hash):
+        with self.lock:
+            if username in self.users:
+                return None
+            self.last_user_id += 1
+            self.users[username] = UserRecord(self.last_user_id, username, password_hash)
+            return self.last_user_id
+
+    def find_user(self, username):
+        with self.lock:
+            return self.users.get(username)
+
+    def serialize(self, row):
+        blob = self.blobs[row.blob_hash][0]
+        return clip_data(row.id, row.content_type, row.blob_hash, blob_content(blob), blob.size, row.timestamp)
+
+    def acquire_blob(self, content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None, count=1):
+        entry = self.blobs.get(digest)
+        if entry is None:
+            blob = BlobRecord(digest, '' if content is None else content, size, storage, mimetype)
+            self.blobs[digest] = [blob, count]
+        else:
+            entry[1] += count
+
+    def release_blobs(self, digests):
+        # 返回不再被引用的磁盘内容块
+        files = []
+        for digest, count in Counter(digests).items():
+            entry = self.blobs.get(digest)
+            if entry is None:
+                continue
+            entry[1] -= count
+            if entry[1] <= 0:
+                del self.blobs[digest]
+                if entry[0].storage == BLOB_STORAGE_FILE:
+                    files.append(digest)
+        return files
+
+    def insert_clip(self, user_id, content_type, digest):
+        self.last_clip_id += 1
+        row = ClipRow(self.last_clip_id, user_id, content_type, digest, get_current_time())
+        self.clips.setdefault(user_id, []).append(row)
+        return row
+
+    def trim(self, user_id):
+        rows = self.clips.get(user_id, [])
+        excess = len(rows) - self.history_limit
+        if excess <= 0:
+            return []
+        trimmed, self.clips[user_id] = rows[:excess], rows[excess:]
+        return trimmed
+
+    def add_clip(self, user_id, content_type, content, digest, size, storage=BLOB_STORAGE_DB, mimetype=None):
+        with self.lock:
+            self.acquire_blob(content, digest, size, storage, mimetype)
+            data, trimmed, files = self.finish_add(user_id, content_type, digest)
+        self.release_files(files)
+        return data, trimmed
+
+    def add_clip_by_hash(self, user_id, content_type, digest):
+        with self.lock:
+            entry = self.blobs.get(digest)
+            if entry is None:
+                return None
+            entry[1] += 1
+            data, trimmed, files = self.finish_add(user_id, content_type, digest)
+        self.release_files(files)
+        return data, trimmed
+
+    def finish_add(self, user_id, content_type, digest):
+        # 返回(新记录, 裁剪的ID, 不再被引用的磁盘内容块)
+        row = self.insert_clip(user_id, content_type, digest)
+        data = self.serialize(row)
+        trimmed = self.trim(user_id)
+        files = self.release_blobs([clip.blob_hash for clip in trimmed])
+        return data, [clip.id for clip in trimmed], files
+
+    def apply_batch(self, user_id, inserts, deletes=(), clear=False):
+        with self.lock:
+            rows = self.clips.get(user_id, [])
+            if clear:
+                deleted, kept = rows, []
+            else:
+                deleted_set = set(deletes)
+                deleted = [row for row in rows if row.id in deleted_set]
+                kept = [row for row in rows if row.id not in deleted_set]
+            self.clips[user_id] = kept
+
+            counts = Counter(digest for _, _, digest, _ in inserts)
+            for _, content, digest, size in inserts:
+                if digest in counts:
+                    self.acquire_blob(content, digest, size, count=counts.pop(digest))
+            inserted = [self.insert_clip(user_id, content_type, digest) for content_type, _, digest, _ in inserts]
+            added = [self.serialize(row) for row in inserted]
+            trimmed = self.trim(user_id) if inserted else []
+            files = self.release_blobs([row.blob_hash for row in deleted + trimmed])
+            trimmed_ids = [row.id for row in trimmed]
+            trimmed_set = set(trimmed_ids)
+        self.release_files(files)
+        return BatchResult(
+            [row.id for row in inserted],
+            [data for data in added if data['id'] not in trimmed_set],
+            [row.id for row in deleted],
+            trimmed_ids
+        )
+
+    def delete_clip(self, user_id, clip_id):
+        with self.lock:
+            rows = self.clips.get(user_id, [])
+            row = next((row for row in rows if row.id == clip_id), None)
+            if row is None:
+                return False
+            rows.remove(row)
+            files = self.release_blobs([row.blob_hash])
+        self.release_files(files)
+        return True
+
+    def ordered(self, user_id):
+        return sorted(self.clips.get(user_id, []), key=lambda row: (row.timestamp, row.id), reverse=True)
+
+    def recent_clips(self, user_id, limit=None):
+        with self.lock:
+            return [self.serialize(row) for row in self.ordered(user_id)[:limit]]
+
+    def clips_after(self, user_id, clip_id):
+        with self.lock:
+            return [self.serialize(row) for row in self.clips.get(user_id, []) if row.id > clip_id]
+
+    def clip_ids(self, user_id):
+        with self.lock:
+            return [row.id for row in self.ordered(user_id)]
+
+    def clip_version(self, user_id):
+        with self.lock:
+            rows = self.clips.get(user_id, [])
+            return max((row.id for row in rows), default=None), len(rows)
+
+    def get_blob(self, user_id, digest, check_owner=True):
+        with self.lock:
+            if check_owner and not any(row.blob_hash == digest for row in self.clips.get(user_id, [])):
+                return None
+            entry = self.blobs.get(digest)
+            return entry[0] if entry else None
+
+    def existing_blobs(self, digests):
+        with self.lock:
+            return {digest for digest in digests if digest in self.blobs}
+
+    def touch_client(self, client_id, user_id):
+        with self.lock:
+            client = self.clients.get(client_id)
+            if client is None:
+                self.clients[client_id] = ClientRecord(client_id, user_id, None, get_current_time(), True)
+            else:
+                self.clients[client_id] = client._replace(last_seen=get_current_time(), is_online=True)
+
+    def get_client(self, user_id, client_id):
+        with self.lock:
+            client = self.clients.get(client_id)
+            return client if client is not None and client.user_id == user_id else None
+
+    def online_clients(self, user_id):
+        with self.lock:
+            return [client for client in self.clients.values() if client.user_id == user_id and client.is_online]
+
+    def rename_client(self, user_id, client_id, name):
+        with self.lock:
+            client = self.get_client(user_id, client_id)
+            if client is None:
+                return False
+            self.clients[client_id] = client._replace(name=name)
+            return True
+
+    def delete_client(self, user_id, client_id):
+        with self.lock:
+            if self.get_client(user_id, client_id) is None:
+                return False
+            del self.clients[client_id]
+            return True
+
+    def count_online_clients(self):
+        with self.lock:
+            return sum(1 for client in self.clients.values() if client.is_online)
@@ -0,0 +1,170 @@
+from sqlalchemy import event
+
+from conftest import load_app, login
+
+
+def add_clip(client, content):
+    response = client.post('/api/clipboard', json={'content': content})
+    assert response.status_code == 201
+    return response.json['id']
+
+
+def count_queries(server, func):
+    # 统计func执行期间通过SQLAlchemy发出的语句数
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with server.app.app_context():
+        engine = server.db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return result, statements
+
+
+def test_unchanged_poll_returns_304(client):
+    add_clip(client, 'hello')
+    for url in ('/api/clipboard', '/api/clipboard/latest', '/api/clipboard/latest?meta=1'):
+        first = client.get(url)
+        assert first.status_code == 200
+        etag = first.headers['ETag']
+        again = client.get(url, headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.data == b''
+        assert again.headers['ETag'] == etag
+
+
+def test_latest_meta_has_own_etag(client):
+    add_clip(client, 'hello')
+    full = client.get('/api/clipboard/latest')
+    meta = client.get('/api/clipboard/latest?meta=1')
+    assert full.headers['ETag'] != meta.headers['ETag']
+    assert full.json['content'] == 'hello'
+    assert 'content' not in meta.json
+    assert meta.json['content_hash'] == full.json['content_hash']
+
+
+def test_write_changes_etag(client):
+    add_clip(client, 'first')
+    etag = client.get('/api/clipboard/latest').headers['ETag']
+    add_clip(client, 'second')
+    response = client.get('/api/clipboard/latest', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['content'] == 'second'
+    assert response.headers['ETag'] != etag
+
+
+def test_unchanged_poll_runs_no_queries(server, client):
+    add_clip(client, 'hello')
+    etag = client.get('/api/clipboard/latest?client_id=test-client').headers['ETag']
+    client.get('/api/clipboard/latest?client_id=test-client', headers={'If-None-Match': etag})
+    response, statements = count_queries(
+        server, lambda: client.get('/api/clipboard/latest?client_id=test-client', headers={'If-None-Match': etag})
+    )
+    assert response.status_code == 304
+    assert response.headers['X-Pending-Commands'] == '0'
+    assert statements == []
+
+
+def test_pending_commands_header(client):
+    add_clip(client, 'hello')
+    assert client.get('/api/clipboard/latest?client_id=test-client').headers['X-Pending-Commands'] == '0'
+    response = client.post('/api/simulate_typing', json={'client_id': 'test-client', 'content': 'abc'})
+    assert response.status_code in (200, 201)
+    assert client.get('/api/clipboard/latest?client_id=test-client').headers['X-Pending-Commands'] == '1'
+
+
+def test_changes_since_id(client):
+    ids = [add_clip(client, f'clip {n}') for n in range(3)]
+    response = client.get(f'/api/clipboard/changes?since_id={ids[0]}')
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json['items']] == ids[1:]
+    assert [item['content'] for item in response.json['items']] == ['clip 1', 'clip 2']
+    assert response.json['ids'] == ids[::-1]
+    assert response.json['cursor'] == ids[-1]
+
+    # 游标已是最新时没有新内容，游标不变
+    latest = client.get(f'/api/clipboard/changes?since_id={ids[-1]}')
+    assert latest.json['items'] == []
+    assert latest.json['cursor'] == ids[-1]
+
+    # 同一游标未变化时返回304，不同游标的ETag不同
+    etag = response.headers['ETag']
+    assert etag != latest.headers['ETag']
+    assert client.get(f'/api/clipboard/changes?since_id={ids[0]}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_changes_reports_deletions(client):
+    ids = [add_clip(client, f'clip {n}') for n in range(3)]
+    etag = client.get(f'/api/clipboard/changes?since_id={ids[-1]}').headers['ETag']
+    assert client.delete(f'/api/clipboard/{ids[1]}').status_code == 200
+    response = client.get(f'/api/clipboard/changes?since_id={ids[-1]}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['items'] == []
+    assert response.json['ids'] == [ids[2], ids[0]]
+
+
+def test_deleted_latest_id_not_reused(client):
+    first = add_clip(client, 'first')
+    second = add_clip(client, 'second')
+    client.delete(f'/api/clipboard/{second}')
+    third = add_clip(client, 'third')
+    assert third > second > first
+    changes = client.get(f'/api/clipboard/changes?since_id={second}')
+    assert [item['content'] for item in changes.json['items']] == ['third']
+
+
+def test_history_trimmed_to_limit(tmp_path, engine):
+    server = load_app(tmp_path, STORAGE_ENGINE=engine, CLIPBOARD_HISTORY_LIMIT=3)
+    client = server.app.test_client()
+    login(client)
+    ids = [add_clip(client, f'clip {n}') for n in range(5)]
+    response = client.get('/api/clipboard')
+    assert [clip['id'] for clip in response.json] == ids[:1:-1]
+    assert client.get('/api/clipboard/changes').json['ids'] == ids[:1:-1]
+
+
+def test_batch_insert_and_delete(client):
+    ids = [add_clip(client, f'clip {n}') for n in range(2)]
+    response = client.post('/api/clipboard/batch', json={
+        'inserts': [{'content': 'a'}, {'content': 'b'}],
+        'deletes': [ids[0]]
+    })
+    assert response.status_code == 201
+    assert response.json['deleted'] == [ids[0]]
+    new_ids = response.json['ids']
+    listing = client.get('/api/clipboard')
+    assert [clip['id'] for clip in listing.json] == new_ids[::-1] + [ids[1]]
+    assert listing.headers['ETag'] == f'"{response.json["version"]}"'
+
+
+def test_users_cannot_see_each_other(server, client):
+    clip_id = add_clip(client, 'private')
+    other = server.app.test_client()
+    login(other, username='bob', client_id='bob-client')
+    assert other.get('/api/clipboard').json == []
+    assert other.get('/api/clipboard/latest').status_code == 404
+    assert other.delete(f'/api/clipboard/{clip_id}').status_code == 404
+    assert client.get('/api/clipboard/latest').json['content'] == 'private'
+
+
+def test_requires_login(server):
+    client = server.app.test_client()
+    assert client.get('/api/clipboard/latest').status_code == 401
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer invalid'
+    assert client.get('/api/clipboard').status_code == 401
+
+
+def test_revoked_token_rejected(client):
+    add_clip(client, 'hello')
+    assert client.delete('/api/tokens').status_code == 200
+    assert client.get('/api/clipboard/latest').status_code == 401
+
+
+def test_refreshed_token_works(client):
+    response = client.post('/api/tokens/refresh')
+    assert response.status_code in (200, 201)
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.json['token']}"
+    add_clip(client, 'hello')
+    assert client.get('/api/clipboard/latest').json['content'] == 'hello'
@@ -0,0 +1,69 @@
+from clip_cache import ClipCache
+
+
+def make_clip(clip_id, minute):
+    return {'id': clip_id, 'content': f'clip {clip_id}', 'timestamp': f'2024-01-01T00:{minute:02d}:00+00:00'}
+
+
+def load(cache, user_id, clips):
+    token = cache.begin_load(user_id)
+    cache.store(user_id, clips, token)
+    cache.end_load(user_id)
+
+
+def ids(cache, user_id):
+    clips, _ = cache.get(user_id)
+    return [clip['id'] for clip in clips]
+
+
+def test_add_keeps_newest_first_and_window():
+    cache = ClipCache(window=3)
+    load(cache, 1, [make_clip(2, 2), make_clip(1, 1)])
+    assert cache.get(1)[1] is True
+    cache.add(1, make_clip(4, 4))
+    # 并发写入的事件晚到时插入到对应位置
+    cache.add(1, make_clip(3, 3))
+    assert ids(cache, 1) == [4, 3, 2]
+    assert cache.get(1)[1] is False
+
+
+def test_add_and_remove_are_idempotent():
+    cache = ClipCache()
+    load(cache, 1, [make_clip(1, 1)])
+    cache.add(1, make_clip(2, 2))
+    cache.add(1, make_clip(2, 2))
+    assert ids(cache, 1) == [2, 1]
+    cache.remove(1, [2])
+    cache.remove(1, [2])
+    assert ids(cache, 1) == [1]
+
+
+def test_load_discarded_after_concurrent_write():
+    cache = ClipCache()
+    token = cache.begin_load(1)
+    cache.add(1, make_clip(2, 2))
+    cache.store(1, [make_clip(1, 1)], token)
+    cache.end_load(1)
+    assert cache.get(1) is None
+
+
+def test_clear_discards_loads_in_progress():
+    cache = ClipCache()
+    load(cache, 1, [make_clip(1, 1)])
+    token = cache.begin_load(2)
+    cache.clear()
+    cache.store(2, [make_clip(2, 2)], token)
+    cache.end_load(2)
+    assert cache.get(1) is None
+    assert cache.get(2) is None
+
+
+def test_evicts_least_recently_used_user():
+    cache = ClipCache(max_users=2)
+    load(cache, 1, [make_clip(1, 1)])
+    load(cache, 2, [make_clip(2, 2)])
+    cache.get(1)
+    load(cache, 3, [make_clip(3, 3)])
+    assert cache.get(2) is None
+    assert ids(cache, 1) == [1]
+    assert cache.stats()['evictions'] == 1
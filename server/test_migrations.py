@@ -0,0 +1,97 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect
+from werkzeug.security import generate_password_hash
+
+from conftest import load_app, login
+from migrations import get_version, head_version, upgrade
+
+# 版本0（引入迁移之前）的表结构
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(128) NOT NULL,
+    PRIMARY KEY (id), UNIQUE (username)
+);
+CREATE TABLE clipboard_item (
+    id INTEGER NOT NULL, content TEXT NOT NULL, content_type VARCHAR(20), timestamp DATETIME,
+    user_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE client_connection (
+    id INTEGER NOT NULL, client_id VARCHAR(100) NOT NULL, user_id INTEGER NOT NULL,
+    last_seen DATETIME, is_online BOOLEAN, name VARCHAR(100),
+    PRIMARY KEY (id), UNIQUE (client_id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+"""
+
+CLIPS = [
+    ('first', 'text'),
+    ('shared', 'text'),
+    ('{"content": "abc"}', 'typing_command'),  # 迁移4删除旧的模拟输入指令
+    ('shared', 'text'),
+    ('latest', 'text'),
+]
+
+
+def build_baseline(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute(
+        'INSERT INTO user (id, username, password_hash) VALUES (1, ?, ?)',
+        ('alice', generate_password_hash('secret'))
+    )
+    conn.execute(
+        "INSERT INTO client_connection (client_id, user_id, last_seen, is_online) VALUES ('old-client', 1, ?, 1)",
+        (str(datetime.now()),)
+    )
+    start = datetime.now() - timedelta(hours=1)
+    conn.executemany(
+        'INSERT INTO clipboard_item (content, content_type, timestamp, user_id) VALUES (?, ?, ?, 1)',
+        ((content, content_type, str(start + timedelta(minutes=n))) for n, (content, content_type) in enumerate(CLIPS))
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_stops_at_target(tmp_path):
+    build_baseline(tmp_path / 'clipboard.db')
+    engine = create_engine(f'sqlite:///{tmp_path}/clipboard.db')
+    assert upgrade(engine, target=1) == [1]
+    with engine.begin() as conn:
+        assert get_version(conn) == 1
+    assert not inspect(engine).has_table('clipboard_blob')
+    assert upgrade(engine) == list(range(2, head_version() + 1))
+    assert upgrade(engine) == []
+    engine.dispose()
+
+
+def test_startup_upgrades_baseline_database(tmp_path):
+    build_baseline(tmp_path / 'clipboard.db')
+    server = load_app(tmp_path)
+    with server.app.app_context():
+        with server.db.engine.begin() as conn:
+            assert get_version(conn) == head_version()
+            # 相同内容只保存一份
+            assert conn.exec_driver_sql('SELECT COUNT(*) FROM clipboard_blob').scalar() == 3
+
+    client = server.app.test_client()
+    login(client)
+    clips = client.get('/api/clipboard').json
+    assert [clip['content'] for clip in clips] == ['latest', 'shared', 'shared', 'first']
+    assert [clip['id'] for clip in clips] == [5, 4, 2, 1]
+    assert all(clip['content_hash'] for clip in clips)
+
+    # 删除最新记录后新记录的ID不会重用
+    assert client.delete('/api/clipboard/5').status_code == 200
+    response = client.post('/api/clipboard', json={'content': 'new'})
+    assert response.json['id'] == 6
+    changes = client.get('/api/clipboard/changes?since_id=4').json
+    assert [item['content'] for item in changes['items']] == ['new']
+    assert changes['ids'] == [6, 4, 2, 1]
+
+
+def test_new_database_is_stamped_at_head(tmp_path):
+    server = load_app(tmp_path)
+    with server.app.app_context():
+        with server.db.engine.begin() as conn:
+            assert get_version(conn) == head_version()
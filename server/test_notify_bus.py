@@ -0,0 +1,56 @@
+import fcntl
+import queue
+import time
+
+from notify_bus import UnixSocketBus, create_bus
+
+
+def collector():
+    events = queue.Queue()
+    return events, lambda user_id, event, data: events.put((user_id, event, data))
+
+
+def test_local_bus_delivers_in_process():
+    events, deliver = collector()
+    bus = create_bus('local', deliver)
+    bus.publish(1, 'clip', {'id': 1})
+    assert events.get_nowait() == (1, 'clip', {'id': 1})
+
+
+def test_unix_bus_forwards_between_buses(tmp_path):
+    path = str(tmp_path / 'notify.sock')
+    first_events, first_deliver = collector()
+    second_events, second_deliver = collector()
+    first = UnixSocketBus(first_deliver, path)
+    second = UnixSocketBus(second_deliver, path)
+    try:
+        first.start()
+        second.start()
+        assert first.ready() and second.ready()
+        first.publish(1, 'delete', {'ids': [3]})
+        # 本进程直接分发，其他进程经代理收到，代理不回传给发送方
+        assert first_events.get(timeout=2) == (1, 'delete', {'ids': [3]})
+        assert second_events.get(timeout=2) == (1, 'delete', {'ids': [3]})
+        second.publish(2, 'clip', {'id': 4})
+        assert first_events.get(timeout=2) == (2, 'clip', {'id': 4})
+        assert first_events.empty()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_publish_does_not_wait_for_broker(tmp_path):
+    path = str(tmp_path / 'notify.sock')
+    # 其他进程持有代理锁但没有监听套接字，总线无法连接
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        events, deliver = collector()
+        bus = UnixSocketBus(deliver, path)
+        try:
+            started = time.monotonic()
+            bus.publish(1, 'clip', {'id': 1})
+            assert time.monotonic() - started < 0.5
+            assert events.get_nowait() == (1, 'clip', {'id': 1})
+            assert not bus.ready()
+        finally:
+            bus.close()
@@ -0,0 +1,6 @@
+# WSGI入口，供外部服务器直接加载，例如:
+#   gunicorn -w 4 -k gevent --worker-connections 1000 -e CLIPSYNC_MULTIPROCESS=true -e CLIPSYNC_STREAM_MAX_CONNECTIONS=750 wsgi:app
+# 使用gthread时每个推送连接占用一个线程，CLIPSYNC_STREAM_MAX_CONNECTIONS需小于--threads
+from app import create_app
+
+app = create_app()